@@ -0,0 +1,187 @@
+import json
+import os
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Optional
+from records import Trace, from_dict
+from store import TraceStore
+
+# Diario de autoguardado: un archivo de texto con una operación JSON por línea.
+#   {"journal": 1}                                 cabecera
+#   {"op": "add", "seq": 12, "trace": {...}}       trazo terminado (mismo formato que dibujo.txt)
+#   {"op": "remove", "seqs": [3, 7]}               borrador o deshacer
+#   {"op": "clear"}
+#   {"op": "layers", "layers": {...}}             capas (layers.Layers.to_dict), vale la última
+# Las operaciones se refieren a números de secuencia del TraceStore y son idempotentes,
+# así que reaplicar un tramo ya aplicado no cambia el resultado.
+HEADER = {"journal": 1}
+FSYNC_EVERY = 0.5
+COMPACT_MIN = 1000
+YIELD_EVERY = 256
+
+_STOP = object()
+
+
+def is_journal(path: str) -> bool:
+    with open(path, "rb") as f:
+        # Con tope: un dibujo.txt es una sola línea
+        return f.readline(64).startswith(b'{"journal"')
+
+
+def recover(path: str) -> TraceStore:
+    # Reconstruye el último estado guardado. Una última línea cortada por un cierre
+    # abrupto se descarta.
+    store = TraceStore()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                op = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            kind = op.get("op")
+            if kind == "add":
+                if store.get(op["seq"]) is None:
+                    store.insert_seq(op["seq"], from_dict(op["trace"]))
+            elif kind == "remove":
+                for seq in op["seqs"]:
+                    tr = store.get(seq)
+                    if tr is not None:
+                        store.remove(tr)
+            elif kind == "clear":
+                store.clear()
+    store.take_dirty()
+    return store
+
+
+class Journal:
+    # Escribe el diario desde un hilo aparte: la vista solo encola operaciones.
+    # El hilo agrupa lo que encuentra en la cola, hace fsync como mucho cada FSYNC_EVERY
+    # segundos y, cuando el diario ya tiene más operaciones que trazos vivos, lo
+    # reemplaza por una instantánea (una línea "add" por trazo).
+    # Los trazos encolados se comparten con el TraceStore: una vez terminados no se modifican.
+    def __init__(self, path: str, traces: Iterable[tuple[int, Trace]] = (), layers: Optional[dict] = None):
+        self.path = path
+        self._queue: queue.Queue = queue.Queue()
+        self._live: dict[int, Trace] = dict(traces)
+        self._layers = layers
+        self._ops = 0
+        self._file = None
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+
+    def added(self, seq: int, trace: Trace):
+        self._queue.put(("add", seq, trace))
+
+    def removed(self, seqs: list[int]):
+        if seqs:
+            self._queue.put(("remove", seqs))
+
+    def cleared(self):
+        self._queue.put(("clear",))
+
+    def layers(self, layers: dict):
+        self._queue.put(("layers", layers))
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _apply(self, op: tuple) -> dict:
+        kind = op[0]
+        if kind == "add":
+            self._live[op[1]] = op[2]
+            return {"op": "add", "seq": op[1], "trace": op[2].to_dict()}
+        if kind == "remove":
+            for seq in op[1]:
+                self._live.pop(seq, None)
+            return {"op": "remove", "seqs": op[1]}
+        if kind == "layers":
+            self._layers = op[1]
+            return {"op": "layers", "layers": op[1]}
+        self._live.clear()
+        return {"op": "clear"}
+
+    def _compact(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps(HEADER) + "\n")
+            if self._layers:
+                f.write(json.dumps({"op": "layers", "layers": self._layers}) + "\n")
+            for i, seq in enumerate(sorted(self._live)):
+                f.write(json.dumps({"op": "add", "seq": seq, "trace": self._live[seq].to_dict()}) + "\n")
+                if i % YIELD_EVERY == 0:
+                    # Cede el GIL para no trabar los cuadros mientras se escribe la instantánea
+                    time.sleep(0)
+            f.flush()
+            os.fsync(f.fileno())
+        if self._file is not None:
+            self._file.close()
+        os.replace(tmp, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._ops = 0
+
+    def _run(self):
+        try:
+            self._compact()
+        except OSError as e:
+            print("Error de autoguardado:", e)
+        pending = False
+        last_sync = time.monotonic()
+        while True:
+            timeout = max(0.0, last_sync + FSYNC_EVERY - time.monotonic()) if pending else None
+            try:
+                batch = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in batch
+            try:
+                lines = [json.dumps(self._apply(op)) + "\n" for op in batch if op is not _STOP]
+                if lines and self._file is not None:
+                    self._file.writelines(lines)
+                    self._ops += len(lines)
+                    pending = True
+                if pending and self._file is not None and (stop or time.monotonic() - last_sync >= FSYNC_EVERY):
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    pending = False
+                    last_sync = time.monotonic()
+                if self._ops >= max(COMPACT_MIN, len(self._live)):
+                    self._compact()
+            except OSError as e:
+                print("Error de autoguardado:", e)
+            if stop:
+                if self._file is not None:
+                    self._file.close()
+                return
+
+
+def save_async(path: str, traces: list[Trace], write: Callable[[str, list[Trace]], None]) -> threading.Thread:
+    # Guardado manual fuera del hilo de la interfaz. Escribe a un temporal y lo renombra,
+    # así un cierre a mitad de camino no deja el archivo a medias.
+    def run():
+        tmp = path + ".tmp"
+        try:
+            write(tmp, traces)
+            os.replace(tmp, path)
+            print("Guardado en", path)
+        except Exception as e:
+            print("Error al guardar:", e)
+
+    thread = threading.Thread(target=run, name="guardar", daemon=True)
+    thread.start()
+    return thread
+
+
+def backup(path: str) -> Optional[str]:
+    # Un diario viejo que no se pidió recuperar se aparta en lugar de pisarlo
+    if not os.path.exists(path):
+        return None
+    old = path + ".bak"
+    os.replace(path, old)
+    return old
@@ -0,0 +1,85 @@
+# Sesión de pixel art con la herramienta Celdas: clics al azar sobre una cuadrícula chica
+# con pocos colores. Compara apilar un trazo por clic (como antes) contra pintar encima con
+# cells.paint_cells: trazos vivos, tamaño del .pntb, cuadro con ViewCache y borrador.
+# Después mide la cubeta (cells.flood_fill + paint_cells) sobre una zona vacía.
+# Uso: python benchmarks/bench_cells.py [--clics 20000] [--lado 64]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from array import array
+
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import arcade
+from bench_draw import W, H, frame_time
+from binformat import write_binary
+from cells import flood_fill, paint_cells
+from records import CellTrace
+from render import ViewCache
+from store import TraceStore
+from tool import CellTool, EraserTool
+
+SIZE = 5
+COLORS = [arcade.color.BLACK, arcade.color.RED, arcade.color.BLUE, arcade.color.YELLOW]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clics", type=int, default=20000)
+    parser.add_argument("--lado", type=int, default=64, help="celdas por lado de la zona pintada")
+    args = parser.parse_args()
+    window = arcade.Window(W, H, "bench", visible=False)
+    rnd = random.Random(4)
+    clicks = [(rnd.randrange(args.lado) * SIZE, rnd.randrange(args.lado) * SIZE, rnd.choice(COLORS))
+              for _ in range(args.clics)]
+    used = {"CELL": CellTool()}
+    tmp = tempfile.mkdtemp()
+    eraser = EraserTool(radius=10)
+    spots = [(rnd.randrange(args.lado * SIZE), rnd.randrange(args.lado * SIZE)) for _ in range(200)]
+
+    print(f"{'modo':>10} {'clic µs':>8} {'trazos':>7} {'pntb KB':>8} {'cuadro ms':>10} {'borrar µs':>10}")
+    for mode in ("apilar", "pisar"):
+        store = TraceStore()
+        t0 = time.perf_counter()
+        for x, y, color in clicks:
+            if mode == "apilar":
+                store.append(CellTrace(color, array("i", (x, y)), SIZE))
+            else:
+                paint_cells(store, color, SIZE, array("i", (x, y)))
+        click = (time.perf_counter() - t0) / len(clicks) * 1e6
+        live = len(store)
+        path = os.path.join(tmp, mode + ".pntb")
+        write_binary(path, store)
+        cache = ViewCache()
+
+        def draw():
+            cache.sync(store, used, len(store))
+            cache.draw()
+        frame = frame_time(window, draw)
+        t0 = time.perf_counter()
+        for x, y in spots:
+            eraser.erase_at(store, x, y)
+        erase = (time.perf_counter() - t0) / len(spots) * 1e6
+        print(f"{mode:>10} {click:>8.1f} {live:>7} {os.path.getsize(path) / 1024:>8.1f} {frame:>10.2f} {erase:>10.1f}")
+
+    store = TraceStore()
+    t0 = time.perf_counter()
+    cells = flood_fill(store, SIZE, 0, 0, (0, 0, W, H))
+    fill = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    paint_cells(store, arcade.color.RED, SIZE, cells)
+    paint = (time.perf_counter() - t0) * 1000
+    path = os.path.join(tmp, "cubeta.pntb")
+    write_binary(path, store)
+    print(f"cubeta: {len(cells) // 2} celdas, relleno {fill:.1f} ms, pintado {paint:.1f} ms, "
+          f"{os.path.getsize(path)} bytes en .pntb")
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
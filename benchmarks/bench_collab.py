@@ -0,0 +1,145 @@
+# Prueba de carga de collab.py por loopback: un Server y muchos clientes simulados en el
+# mismo bucle asyncio. Cada cliente manda una tanda por cuadro (a --hz) con los puntos
+# nuevos de su trazo en curso y cada segundo lo termina (ADD) y empieza otro; de vez en
+# cuando borra uno de los suyos. Mide la latencia de punta a punta de cada punto (desde la
+# tanda que lo mandó hasta que lo recibe cada uno de los demás clientes) y los mensajes y
+# bytes por segundo que entran y salen del servidor. Con carga, las tandas que esperan al
+# socket se coalescen: salen menos mensajes que los que haría falta reenviar.
+# El servidor y los clientes comparten un solo proceso y un solo núcleo, así que con
+# muchos clientes la latencia incluye el tiempo de simularlos.
+# Uso: python benchmarks/bench_collab.py [--clientes 2 10 50 100] [--segundos 5]
+import argparse
+import asyncio
+import bisect
+import os
+import random
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from collab import ADD, APPEND, COUNT, Outbox, Server, add, append, read_batch, remove
+from records import StrokeTrace
+
+
+class Sent:
+    # Por trazo: puntos acumulados después de cada tanda y cuándo salió
+    def __init__(self):
+        self.counts: list[int] = []
+        self.times: list[float] = []
+
+
+async def client(me: int, port: int, secs: float, hz: int, points: int, sent: dict, latencies: list,
+                 start: asyncio.Event, stop: asyncio.Event):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    out = Outbox(writer)
+    writer_task = asyncio.create_task(out.run())
+    got: dict[tuple[int, int], int] = {}
+
+    async def receive():
+        while True:
+            msgs = await read_batch(reader)
+            if msgs is None:
+                return
+            now = time.perf_counter()
+            for kind, c, i, body in msgs:
+                gid = (c, i)
+                if kind == ADD:
+                    got.setdefault(gid, 1)
+                elif kind == APPEND and gid in sent:
+                    before = got.get(gid, 1)
+                    got[gid] = before + COUNT.unpack_from(body)[0]
+                    # El punto más viejo de la tanda (pudo juntarse con otras)
+                    s = sent[gid]
+                    k = bisect.bisect_right(s.counts, before)
+                    if k < len(s.times):
+                        latencies.append(now - s.times[k])
+
+    reader_task = asyncio.create_task(receive())
+    await start.wait()
+    rnd = random.Random(me)
+    x, y = rnd.randrange(2000), rnd.randrange(2000)
+    ident = 0
+    stroke = None
+    mine: list[int] = []
+    frame = 1 / hz
+    t_next = time.perf_counter()
+    end = t_next + secs
+    while time.perf_counter() < end:
+        msgs = []
+        if stroke is None or len(stroke) >= hz * points:
+            if stroke is not None:
+                msgs.append(add((me, ident), stroke))
+                mine.append(ident)
+                if len(mine) > 5 and rnd.random() < 0.3:
+                    msgs.append(remove((me, mine.pop(0))))
+            ident += 1
+            stroke = StrokeTrace("PENCIL", (0, 0, 0), array("i", (x, y)))
+            msgs.append(add((me, ident), stroke))
+            sent[(me, ident)] = Sent()
+        new = array("i")
+        for _ in range(points):
+            x += rnd.randint(-4, 4)
+            y += rnd.randint(-4, 4)
+            new.extend((x, y))
+        stroke.coords.extend(new)
+        msgs.append(append((me, ident), new))
+        s = sent[(me, ident)]
+        s.counts.append(len(stroke))
+        s.times.append(time.perf_counter())
+        out.put(msgs)
+        t_next += frame
+        await asyncio.sleep(max(0.0, t_next - time.perf_counter()))
+    await stop.wait()
+    writer_task.cancel()
+    reader_task.cancel()
+    writer.close()
+
+
+async def run(n: int, secs: float, hz: int, points: int) -> dict:
+    server = Server()
+    srv = await server.serve("127.0.0.1", 0)
+    port = srv.sockets[0].getsockname()[1]
+    sent: dict = {}
+    latencies: list[float] = []
+    start, stop = asyncio.Event(), asyncio.Event()
+    tasks = [asyncio.create_task(client(i + 1, port, secs, hz, points, sent, latencies, start, stop))
+             for i in range(n)]
+    while len(server.clients) < n:
+        await asyncio.sleep(0.01)
+    t0 = time.perf_counter()
+    start.set()
+    # Tiempo extra para que se vacíen las colas
+    await asyncio.sleep(secs + 1.0)
+    elapsed = time.perf_counter() - t0
+    out_msgs = sum(box.sent for box in server.clients.values())
+    out_bytes = sum(box.bytes for box in server.clients.values())
+    stop.set()
+    await asyncio.gather(*tasks)
+    srv.close()
+    await srv.wait_closed()
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+    return {"in": server.received / elapsed, "out": out_msgs / elapsed, "fanout": server.received * (n - 1) / elapsed,
+            "kb": out_bytes / elapsed / 1024, "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99),
+            "max": latencies[-1] * 1000 if latencies else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clientes", type=int, nargs="+", default=[2, 10, 50, 100])
+    parser.add_argument("--segundos", type=float, default=5.0)
+    parser.add_argument("--hz", type=int, default=60, help="tandas por segundo de cada cliente")
+    parser.add_argument("--puntos", type=int, default=4, help="puntos nuevos por tanda")
+    args = parser.parse_args()
+    print(f"{'clientes':>8} {'entran/s':>9} {'sin juntar/s':>12} {'salen/s':>9} {'KB/s':>8} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'máx ms':>7}")
+    for n in args.clientes:
+        r = asyncio.run(run(n, args.segundos, args.hz, args.puntos))
+        print(f"{n:>8} {r['in']:>9.0f} {r['fanout']:>12.0f} {r['out']:>9.0f} {r['kb']:>8.0f} "
+              f"{r['p50']:>7.1f} {r['p95']:>7.1f} {r['p99']:>7.1f} {r['max']:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Compara el tiempo por cuadro de dibujar los trazos en modo inmediato (una pasada por
+# herramienta, o una sola pasada por tramos del TraceStore) contra la caché de ShapeElementList.
+# Uso: python benchmarks/bench_draw.py [1000 10000 50000]
+import os
+import random
+import sys
+import time
+from typing import Optional
+
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import arcade
+from records import Trace, from_dict
+from render import TraceCache
+from store import TraceStore
+from tool import PencilTool, MarkerTool, SprayTool, LineTool, RectTool, CircleTool, CellTool
+
+W, H = 980, 470
+FRAMES = 5
+
+
+KINDS = ["PENCIL", "MARKER", "SPRAY", "LINE", "RECT", "CIRCLE", "CELL"]
+
+
+def make_traces(n: int, seed: int = 1, w: int = W, h: int = H, mix: Optional[dict[str, float]] = None) -> list[Trace]:
+    # mix: peso relativo de cada herramienta (por defecto todas por igual)
+    rnd = random.Random(seed)
+    colors = [arcade.color.BLACK, arcade.color.RED, arcade.color.BLUE, arcade.color.GREEN]
+    kinds, weights = (list(mix), list(mix.values())) if mix else (KINDS, None)
+    traces = []
+    for _ in range(n):
+        kind = rnd.choices(kinds, weights)[0] if weights else rnd.choice(kinds)
+        color = rnd.choice(colors)
+        x, y = rnd.randrange(w), rnd.randrange(h)
+        if kind in ("PENCIL", "MARKER"):
+            pts = [(x, y)]
+            for _ in range(20):
+                x += rnd.randint(-6, 6)
+                y += rnd.randint(-6, 6)
+                pts.append((x, y))
+            tr = {"tool": kind, "color": color, "trace": pts}
+            if kind == "MARKER":
+                tr["width"] = 8
+        elif kind == "SPRAY":
+            pts = [(x + rnd.randint(-7, 7), y + rnd.randint(-7, 7)) for _ in range(16)]
+            tr = {"tool": kind, "color": color, "points": pts}
+        elif kind == "CELL":
+            tr = {"tool": kind, "color": color, "xy": (x // 20 * 20, y // 20 * 20), "size": 20}
+        else:
+            end = (x + rnd.randint(-60, 60), y + rnd.randint(-60, 60))
+            tr = {"tool": kind, "color": color, "start": (x, y), "end": end, "width": 2}
+        traces.append(from_dict(tr))
+    return traces
+
+
+def tools() -> dict:
+    ts = [PencilTool(), MarkerTool(), SprayTool(), LineTool(), RectTool(), CircleTool(), CellTool()]
+    return {t.name: t for t in ts}
+
+
+def frame_time(window: arcade.Window, draw) -> float:
+    draw()
+    window.ctx.finish()
+    t0 = time.perf_counter()
+    for _ in range(FRAMES):
+        window.clear()
+        draw()
+        window.ctx.finish()
+    return (time.perf_counter() - t0) / FRAMES * 1000
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [1000, 10000, 50000]
+    window = arcade.Window(W, H, "bench", visible=False)
+    used = tools()
+    print(f"{'trazos':>8} {'inmediato ms':>14} {'tramos ms':>10} {'caché ms':>10} {'compilar ms':>12}")
+    for n in sizes:
+        traces = make_traces(n)
+        store = TraceStore(traces)
+
+        def immediate():
+            for t in used.values():
+                t.draw_traces(traces)
+
+        def by_runs():
+            for name, run in store.runs():
+                used[name].draw_traces(run)
+
+        cache = TraceCache()
+        t0 = time.perf_counter()
+        cache.sync(store, used, len(store))
+        for seg in cache.segments:
+            seg.shapes.update()
+        build = (time.perf_counter() - t0) * 1000
+        imm = frame_time(window, immediate)
+        runs = frame_time(window, by_runs)
+        cached = frame_time(window, lambda: (cache.sync(store, used, len(store)), cache.draw()))
+        print(f"{n:>8} {imm:>14.2f} {runs:>10.2f} {cached:>10.2f} {build:>12.1f}")
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# Latencia de EraserTool.erase_at con la cuadrícula espacial contra el recorrido lineal anterior.
+# La densidad de trazos es constante: el lienzo crece con la cantidad de trazos.
+# Uso: python benchmarks/bench_erase.py [1000 10000 100000]
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_draw import W, H, make_traces
+from store import TraceStore
+from tool import EraserTool
+
+EVENTS = 200
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [1000, 10000, 100000]
+    eraser = EraserTool(radius=10)
+    print(f"{'trazos':>8} {'lineal µs':>12} {'índice µs':>12} {'borrados':>9}")
+    for n in sizes:
+        scale = math.sqrt(n / 1000)
+        w, h = int(W * scale), int(H * scale)
+        rnd = random.Random(2)
+        events = [(rnd.randrange(w), rnd.randrange(h)) for _ in range(EVENTS)]
+
+        traces = make_traces(n, w=w, h=h)
+        store = TraceStore(list(traces))
+        t0 = time.perf_counter()
+        linear = 0
+        for (x, y) in events:
+            hits = [tr for tr in traces if eraser._hits(tr, x, y)]
+            linear += len(hits)
+            for tr in hits:
+                traces.remove(tr)
+        lin = (time.perf_counter() - t0) / EVENTS * 1e6
+
+        t0 = time.perf_counter()
+        indexed = 0
+        for (x, y) in events:
+            indexed += len(eraser.erase_at(store, x, y).removed)
+        idx = (time.perf_counter() - t0) / EVENTS * 1e6
+        assert linear == indexed
+        print(f"{n:>8} {lin:>12.1f} {idx:>12.1f} {indexed:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# Núcleos de geometry.py contra las pruebas escalares de EraserTool. Primero verifica que
+# den exactamente lo mismo: hits_at (todos los candidatos juntos y de a uno) contra _hits,
+# hits_along contra _hits_segment tramo por tramo y coord_bounds / bounds contra min y max
+# de Python, con puntos al azar y puntos justo sobre el borde del radio. Después mide
+# trazos de 1k a 100k puntos en el peor caso (el borrador no toca nada y hay que mirar
+# todos los tramos): clic, arrastre de 16 tramos y caja del trazo.
+# Uso: python benchmarks/bench_geometry.py [--puntos 1000 10000 100000] [--muestras 3000]
+import argparse
+import os
+import random
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+from bench_draw import make_traces
+from geometry import bounds, coord_bounds, pack
+from records import CellTrace, SprayTrace, StrokeTrace
+from tool import EraserTool, hits_along, hits_at
+
+RADII = (0, 3, 5, 10)
+
+
+def long_traces(rnd: random.Random, n: int) -> list:
+    # Trazos largos de cada tipo con coordenadas, alrededor del origen
+    out = []
+    for tool in ("PENCIL", "MARKER", "SPRAY", "CELL"):
+        x, y = 0, 0
+        c = array("i")
+        for _ in range(n):
+            x += rnd.randint(-6, 6)
+            y += rnd.randint(-6, 6)
+            c.extend((x, y) if tool != "CELL" else (x // 5 * 5, y // 5 * 5))
+        if tool == "SPRAY":
+            out.append(SprayTrace((0, 0, 0), c))
+        elif tool == "CELL":
+            out.append(CellTrace((0, 0, 0), c, 5))
+        else:
+            out.append(StrokeTrace(tool, (0, 0, 0), c, 8 if tool == "MARKER" else None))
+    return out
+
+
+def probes(rnd: random.Random, tr, k: int) -> list[tuple[int, int]]:
+    # Puntos cerca de los del trazo, incluidos algunos a distancia entera exacta (3-4-5)
+    c = getattr(tr, "coords", None) or array("i", (tr.x1, tr.y1, tr.x2, tr.y2))
+    out = []
+    for _ in range(k):
+        i = rnd.randrange(len(c) // 2) * 2
+        if rnd.random() < 0.3:
+            dx, dy = rnd.choice(((3, 4), (4, 3), (5, 0), (0, 5), (6, 8), (-3, 4), (4, -3)))
+        else:
+            dx, dy = rnd.randint(-25, 25), rnd.randint(-25, 25)
+        out.append((c[i] + dx, c[i + 1] + dy))
+    return out
+
+
+def verify(samples: int) -> int:
+    rnd = random.Random(7)
+    traces = make_traces(400, seed=3, w=300, h=300) + long_traces(rnd, 300)
+    bad = 0
+    for r in RADII:
+        eraser = EraserTool(radius=r)
+        for _ in range(samples // len(RADII)):
+            x, y = probes(rnd, rnd.choice(traces), 1)[0]
+            cands = rnd.sample(traces, 20)
+            ref = [eraser._hits(tr, x, y) for tr in cands]
+            bad += ref != hits_at(cands, x, y, r).tolist()
+            bad += ref != [bool(hits_at([tr], x, y, r)[0]) for tr in cands]
+        for tr in traces:
+            if not isinstance(tr, (StrokeTrace, SprayTrace, CellTrace)):
+                continue
+            for _ in range(3):
+                pts = probes(rnd, tr, 4)
+                segs = [(*a, *b) for a, b in zip(pts, pts[1:])]
+                ref = any(eraser._hits_segment(tr, *seg) for seg in segs)
+                bad += ref != hits_along(tr, segs, r)
+    for tr in traces:
+        c = getattr(tr, "coords", None)
+        if c:
+            bad += coord_bounds(c) != (min(c[0::2]), min(c[1::2]), max(c[0::2]), max(c[1::2]))
+    coords = [tr.coords for tr in traces if getattr(tr, "coords", None)]
+    pts, starts = pack(coords)
+    bad += not np.array_equal(bounds(pts, starts), [coord_bounds(c) for c in coords])
+    return bad
+
+
+def timed(fn, reps: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - t0) / reps * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--puntos", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--muestras", type=int, default=3000)
+    args = parser.parse_args()
+    bad = verify(args.muestras)
+    print(f"verificación: {args.muestras} clics y barridos al azar por radio: {'ok' if not bad else f'{bad} distintos'}")
+
+    eraser = EraserTool(radius=10)
+    rnd = random.Random(1)
+    print(f"{'trazo':>7} {'puntos':>7} {'clic esc. ms':>13} {'clic np ms':>11} {'x':>6} "
+          f"{'barrido esc. ms':>16} {'barrido np ms':>14} {'x':>6} {'caja esc. ms':>13} {'caja np ms':>11}")
+    for n in args.puntos:
+        for tr in long_traces(rnd, n):
+            reps = max(1, 20000 // n)
+            # Lejos de todo: se recorren todos los tramos
+            x, y = 10 ** 6, 10 ** 6
+            segs = [(x + 5 * i, y, x + 5 * i + 5, y + 5) for i in range(16)]
+            c = tr.coords
+            t_click = timed(lambda: eraser._hits(tr, x, y), reps)
+            n_click = timed(lambda: hits_at([tr], x, y, 10), reps)
+            t_sweep = timed(lambda: any(eraser._hits_segment(tr, *s) for s in segs), max(1, reps // 4))
+            n_sweep = timed(lambda: hits_along(tr, segs, 10), reps)
+            t_box = timed(lambda: (min(c[0::2]), min(c[1::2]), max(c[0::2]), max(c[1::2])), reps)
+            n_box = timed(lambda: coord_bounds(c), reps)
+            print(f"{tr.tool:>7} {n:>7} {t_click:>13.3f} {n_click:>11.3f} {t_click / n_click:>6.1f} "
+                  f"{t_sweep:>16.3f} {n_sweep:>14.3f} {t_sweep / n_sweep:>6.1f} {t_box:>13.3f} {n_box:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Historial de deshacer/rehacer: costo por operación según el tamaño del lienzo y una
+# verificación con secuencias largas de ediciones al azar (trazos, borrados, limpiar,
+# deshacer, rehacer) contra copias completas del documento, con presupuesto chico
+# para forzar el volcado a disco.
+# Uso: python benchmarks/bench_history.py [1000 10000 100000]
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_draw import W, H, make_traces
+from history import Change, History
+from store import TraceStore
+from tool import EraserTool
+
+EVENTS = 200
+STEPS = 5000
+
+
+def timing(sizes: list[int]):
+    eraser = EraserTool(radius=10)
+    print(f"{'trazos':>8} {'borrar µs':>10} {'deshacer µs':>12} {'rehacer µs':>11}")
+    for n in sizes:
+        scale = math.sqrt(n / 1000)
+        w, h = int(W * scale), int(H * scale)
+        rnd = random.Random(2)
+        store = TraceStore(make_traces(n, w=w, h=h))
+        history = History()
+        t0 = time.perf_counter()
+        for _ in range(EVENTS):
+            history.push(eraser.erase_at(store, rnd.randrange(w), rnd.randrange(h)))
+        erase = (time.perf_counter() - t0) / EVENTS * 1e6
+        t0 = time.perf_counter()
+        while history.undo(store):
+            pass
+        undo = (time.perf_counter() - t0) / EVENTS * 1e6
+        assert len(store) == n
+        t0 = time.perf_counter()
+        while history.redo(store):
+            pass
+        redo = (time.perf_counter() - t0) / EVENTS * 1e6
+        print(f"{n:>8} {erase:>10.1f} {undo:>12.1f} {redo:>11.1f}")
+
+
+def snapshot(store: TraceStore) -> list:
+    return [(seq, tr.to_dict()) for seq, tr in store.items()]
+
+
+def verify(seed: int, spill: bool):
+    rnd = random.Random(seed)
+    pool = make_traces(STEPS, seed=seed)
+    eraser = EraserTool(radius=15)
+    store = TraceStore()
+    history = History(budget=4096, spill=spill)
+    states = [snapshot(store)]
+    pos = 0
+    for i in range(STEPS):
+        action = rnd.random()
+        if action < 0.45:
+            store.append(pool[i])
+            change = Change(added=[(store.seq_at(-1), pool[i])])
+        elif action < 0.6:
+            change = eraser.erase_at(store, rnd.randrange(W), rnd.randrange(H))
+        elif action < 0.62 and store:
+            change = Change(removed=list(store.items()))
+            store.clear()
+        elif action < 0.82:
+            if history.undo(store):
+                pos -= 1
+                assert snapshot(store) == states[pos], (seed, i, "deshacer")
+            continue
+        else:
+            if history.redo(store):
+                pos += 1
+                assert snapshot(store) == states[pos], (seed, i, "rehacer")
+            continue
+        history.push(change)
+        del states[pos + 1:]
+        states.append(snapshot(store))
+        pos += 1
+    # Sin volcado se pierde lo más viejo; con volcado se puede volver hasta el principio
+    while history.undo(store):
+        pos -= 1
+        assert snapshot(store) == states[pos], (seed, "final")
+    assert not spill or pos == 0
+    return history
+
+
+def main():
+    timing([int(a) for a in sys.argv[1:]] or [1000, 10000, 100000])
+    for seed in range(3):
+        for spill in (True, False):
+            verify(seed, spill)
+    print(f"verificación: {STEPS} pasos x 3 semillas, con y sin volcado a disco: ok")
+
+
+if __name__ == "__main__":
+    main()
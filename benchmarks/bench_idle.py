@@ -0,0 +1,72 @@
+# Uso de CPU con la ventana quieta: corre el bucle de eventos de pyglet unos segundos con
+# un dibujo cargado y cuenta los cuadros dibujados y el tiempo de CPU del proceso, en modo
+# continuo (on_draw en cada cuadro, como antes) y en modo por eventos (PaintWindow solo
+# dibuja si la vista está sucia). El caso "ratón" mueve el cursor sobre el lienzo sin
+# tocar ningún botón, que tampoco debería pedir cuadros.
+# Uso: python benchmarks/bench_idle.py [--trazos 2000] [--segundos 3]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pyglet
+from bench_draw import make_traces, tools
+from main import Paint, PaintWindow, WIDTH, HEIGHT, TOOLBAR_H
+from store import TraceStore
+
+
+def run(window: PaintWindow, app: Paint, secs: float, motion: bool) -> tuple[int, float]:
+    # Se cuentan los cuadros presentados
+    frames = [0]
+    flip = window.flip
+
+    def counted():
+        frames[0] += 1
+        flip()
+    window.flip = counted
+    app.dirty = True
+    if motion:
+        step = [0]
+
+        def move(dt):
+            step[0] += 1
+            window.dispatch_event("on_mouse_motion", 100 + step[0] % 400, 100, 1, 0)
+        pyglet.clock.schedule_interval(move, 1 / 120)
+    pyglet.clock.schedule_once(lambda dt: pyglet.app.exit(), secs)
+    cpu = time.process_time()
+    pyglet.app.run(None)
+    cpu = time.process_time() - cpu
+    if motion:
+        pyglet.clock.unschedule(move)
+    del window.flip
+    return frames[0], cpu
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trazos", type=int, default=2000)
+    parser.add_argument("--segundos", type=float, default=3.0)
+    args = parser.parse_args()
+    window = PaintWindow(WIDTH, HEIGHT, "bench", visible=False)
+    app = Paint(autosave_path=os.path.join(tempfile.mkdtemp(), "autosave.journal"))
+    app.traces = TraceStore(make_traces(args.trazos, w=WIDTH, h=HEIGHT - TOOLBAR_H))
+    app.used_tools.update(tools())
+    window.show_view(app)
+    print(f"{'modo':>10} {'entrada':>8} {'cuadros':>8} {'CPU s':>7} {'CPU %':>6}")
+    for continuous in (True, False):
+        for motion in (False, True):
+            app.continuous = continuous
+            frames, cpu = run(window, app, args.segundos, motion)
+            mode = "continuo" if continuous else "eventos"
+            print(f"{mode:>10} {'ratón' if motion else 'nada':>8} {frames:>8} {cpu:>7.2f} {cpu / args.segundos:>6.0%}")
+    app.journal.close()
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
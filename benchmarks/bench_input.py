@@ -0,0 +1,76 @@
+# Arrastres rápidos del borrador con un mouse de alta frecuencia (varios eventos por
+# cuadro): erase_at en cada evento, como antes, contra erase_along una vez por cuadro con
+# las posiciones juntas. Cuenta también los trazos borrados: probar solo los extremos de
+# cada evento deja huecos que la cápsula barrida cubre.
+# Uso: python benchmarks/bench_input.py [--trazos 10000] [--hz 1000] [--px-cuadro 120]
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_draw import W, H, make_traces
+from store import TraceStore
+from tool import EraserTool
+
+FPS = 60
+FRAMES = 120
+
+
+def drag(w: int, h: int, per_frame: int, speed: float, seed: int) -> list[list[tuple[int, int]]]:
+    # Recorrido en zigzag por el lienzo: por cuadro, las posiciones de sus eventos
+    rnd = random.Random(seed)
+    x, y = w / 2, h / 2
+    angle = rnd.uniform(0, 2 * math.pi)
+    frames = []
+    for _ in range(FRAMES):
+        angle += rnd.uniform(-0.5, 0.5)
+        events = []
+        for _ in range(per_frame):
+            x = min(max(x + math.cos(angle) * speed / per_frame, 0), w)
+            y = min(max(y + math.sin(angle) * speed / per_frame, 0), h)
+            events.append((int(x), int(y)))
+        frames.append(events)
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trazos", type=int, default=10000)
+    parser.add_argument("--hz", type=int, default=1000, help="eventos del mouse por segundo")
+    parser.add_argument("--px-cuadro", type=float, default=120, help="velocidad del arrastre en px por cuadro")
+    args = parser.parse_args()
+    scale = math.sqrt(args.trazos / 1000)
+    w, h = int(W * scale), int(H * scale)
+    traces = make_traces(args.trazos, w=w, h=h)
+    per_frame = max(1, args.hz // FPS)
+    frames = drag(w, h, per_frame, args.px_cuadro, 3)
+    eraser = EraserTool(radius=10)
+
+    print(f"{'modo':>10} {'eventos':>8} {'ms/cuadro':>10} {'borrados':>9}")
+    store = TraceStore(list(traces))
+    t0 = time.perf_counter()
+    erased = 0
+    for events in frames:
+        for x, y in events:
+            erased += len(eraser.erase_at(store, x, y).removed)
+    ms = (time.perf_counter() - t0) / FRAMES * 1000
+    print(f"{'por evento':>10} {per_frame:>8} {ms:>10.3f} {erased:>9}")
+
+    store = TraceStore(list(traces))
+    t0 = time.perf_counter()
+    erased = 0
+    last: list[int] = []
+    for events in frames:
+        path = last + [c for xy in events for c in xy]
+        erased += len(eraser.erase_along(store, path).removed)
+        last = path[-2:]
+    ms = (time.perf_counter() - t0) / FRAMES * 1000
+    print(f"{'por cuadro':>10} {per_frame:>8} {ms:>10.3f} {erased:>9}")
+
+
+if __name__ == "__main__":
+    main()
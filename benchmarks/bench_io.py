@@ -0,0 +1,97 @@
+# Guardado y carga: JSON (dibujo.txt) contra el formato binario (.pntb) con y sin zlib.
+# Con 600000 trazos el JSON ronda los 100 MB. Antes de medir verifica que un .pntb con capas
+# se relea igual (también si el último trazo tiene color sin alfa).
+# Uso: python benchmarks/bench_io.py [10000 100000 600000]
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_draw import make_traces
+from array import array
+from binformat import BinaryDrawing, write_binary
+from layers import Layers
+from records import StrokeTrace, from_dict
+
+
+def timed(fn) -> float:
+    t = time.perf_counter()
+    fn()
+    return time.perf_counter() - t
+
+
+def check_layers(tmp: str):
+    # Ida y vuelta por el .pntb: capas con sus propiedades y cada trazo con su capa
+    layers = Layers()
+    top = layers.add()
+    top.opacity = 0.9
+    top.locked = True
+    layers.order[0].visible = False
+    traces = make_traces(200)
+    for i, tr in enumerate(traces):
+        tr.layer = top.id if i % 2 else 0
+    for rgb_last in (False, True):
+        path = os.path.join(tmp, "capas.pntb")
+        last = [StrokeTrace("PENCIL", (10, 20, 30) if rgb_last else (10, 20, 30, 255), array("i", [0, 0, 5, 5]), 3)]
+        last[0].layer = top.id
+        write_binary(path, traces + last, layers=layers.to_dict())
+        with BinaryDrawing(path) as d:
+            assert d.layers == layers.to_dict(), d.layers
+            assert [tr.to_dict() for tr in d] == [tr.to_dict() for tr in traces + last]
+        os.remove(path)
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 100000, 600000]
+    tmp = tempfile.mkdtemp()
+    path_json = os.path.join(tmp, "dibujo.txt")
+    path_bin = os.path.join(tmp, "dibujo.pntb")
+    path_raw = os.path.join(tmp, "dibujo_raw.pntb")
+    check_layers(tmp)
+    print("Capas en .pntb: ida y vuelta correcta")
+    print(f"{'trazos':>8} {'formato':>10} {'MB':>8} {'guardar s':>10} {'abrir s':>9} {'cargar s':>9}")
+    for n in sizes:
+        traces = make_traces(n)
+
+        def save_json():
+            with open(path_json, "w", encoding="utf-8") as f:
+                json.dump([tr.to_dict() for tr in traces], f)
+
+        def load_json():
+            with open(path_json, "r", encoding="utf-8") as f:
+                loaded = [from_dict(d) for d in json.load(f)]
+            assert len(loaded) == n
+
+        def opener(path):
+            def open_only():
+                with BinaryDrawing(path) as d:
+                    assert len(d) == n
+            return open_only
+
+        def loader(path):
+            def load_all():
+                with BinaryDrawing(path) as d:
+                    assert len(list(d)) == n
+            return load_all
+
+        rows = [
+            ("json", path_json, timed(save_json), None, timed(load_json)),
+            ("pntb", path_bin, timed(lambda: write_binary(path_bin, traces)), timed(opener(path_bin)), timed(loader(path_bin))),
+            ("pntb-raw", path_raw, timed(lambda: write_binary(path_raw, traces, compress=False)),
+             timed(opener(path_raw)), timed(loader(path_raw))),
+        ]
+        for name, path, save, open_s, load in rows:
+            mb = os.path.getsize(path) / 1024 / 1024
+            open_txt = f"{open_s:>9.4f}" if open_s is not None else f"{'-':>9}"
+            print(f"{n:>8} {name:>10} {mb:>8.1f} {save:>10.2f} {open_txt} {load:>9.2f}")
+        for path in (path_json, path_bin, path_raw):
+            os.remove(path)
+    os.rmdir(tmp)
+
+
+if __name__ == "__main__":
+    main()
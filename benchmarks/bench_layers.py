@@ -0,0 +1,94 @@
+# Capas: costo por cuadro de layers.LayerCache (una textura por capa, el cuadro solo las
+# mezcla) contra dibujar todo el dibujo con una sola ViewCache en cada cuadro, con los
+# trazos repartidos al azar entre --capas capas. Mide un cuadro sin cambios, uno con un
+# trazo en curso (crece en cada cuadro), uno después de terminar un trazo en una capa (se
+# vuelve a dibujar solo esa) y uno con la vista movida (se vuelven a dibujar todas).
+# También mide armar el TraceStore con y sin los TraceStore por capa.
+# Sin GPU (llvmpipe) dibujar los trazos es lo caro, así que la diferencia se exagera.
+# Uso: python benchmarks/bench_layers.py [1000 10000 50000] [--capas 4]
+import argparse
+import os
+import random
+import sys
+import time
+from array import array
+
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import arcade
+from bench_draw import FRAMES, W, H, make_traces, tools
+from layers import LayerCache, Layers
+from records import StrokeTrace
+from render import ViewCache
+from store import TraceStore
+from viewport import Viewport
+
+
+def timed(window: arcade.Window, view: Viewport, draw, before=None) -> float:
+    # ms por cuadro; before se llama antes de cada cuadro, fuera de la medición
+    total = 0.0
+    for _ in range(FRAMES):
+        if before:
+            before()
+        t0 = time.perf_counter()
+        window.clear()
+        with view.camera.activate():
+            draw()
+        window.ctx.finish()
+        total += time.perf_counter() - t0
+    return total / FRAMES * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("trazos", type=int, nargs="*", default=[1000, 10000, 50000])
+    parser.add_argument("--capas", type=int, default=4)
+    args = parser.parse_args()
+    window = arcade.Window(W, H, "bench", visible=False)
+    used = tools()
+    print(f"{'trazos':>8} {'armar ms':>9} {'con capas ms':>13} {'directo ms/c':>13} {'quieto ms/c':>12} "
+          f"{'en curso ms/c':>14} {'trazo nuevo ms/c':>17} {'vista ms/c':>11}")
+    for n in args.trazos:
+        rnd = random.Random(n)
+        traces = make_traces(n)
+        for tr in traces:
+            tr.layer = rnd.randrange(args.capas)
+        t0 = time.perf_counter()
+        TraceStore(traces, layered=False)
+        flat = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        store = TraceStore(traces)
+        build = (time.perf_counter() - t0) * 1000
+        view = Viewport(W, H)
+
+        single = ViewCache()
+        direct = timed(window, view, lambda: (single.sync(store, used, len(store), view.box(), view.zoom), single.draw()))
+
+        layers = Layers()
+        layers.ensure(range(args.capas))
+        cache = LayerCache(layers, W, H, ViewCache)
+        sync = lambda committed: cache.sync(store, used, committed, view.box(), view.zoom)
+        sync(len(store))
+        still = timed(window, view, lambda: (sync(len(store)), cache.draw()))
+
+        stroke = StrokeTrace("PENCIL", (0, 0, 0), array("i", (10, 10)))
+        store.append(stroke)
+        grow = lambda: stroke.add(stroke.coords[-2] + 3, stroke.coords[-1] + 2)
+        active = lambda: cache.draw_active(used["PENCIL"], stroke)
+        drawing = timed(window, view, lambda: (sync(len(store) - 1), cache.draw(active)), grow)
+
+        def commit():
+            tr = StrokeTrace("PENCIL", (0, 0, 0), array("i", (rnd.randrange(W), rnd.randrange(H), 5, 5)))
+            tr.layer = rnd.randrange(args.capas)
+            store.append(tr)
+        added = timed(window, view, lambda: (sync(len(store)), cache.draw()), commit)
+        moved = timed(window, view, lambda: (sync(len(store)), cache.draw()), lambda: view.pan(3, 2))
+        print(f"{n:>8} {flat:>9.0f} {build:>13.0f} {direct:>13.1f} {still:>12.2f} "
+              f"{drawing:>14.2f} {added:>17.1f} {moved:>11.1f}")
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Abrir un dibujo grande: carga directa (Paint lee todo el archivo antes del primer cuadro,
+# como antes) contra carga en segundo plano (loader.Loader lee en un hilo y on_draw agrega
+# tandas con un tope de tiempo por cuadro). Mide el tiempo hasta el primer cuadro, hasta
+# tener todo cargado y los cuadros durante la carga, en JSON y en .pntb, y verifica que
+# entren todos los trazos y que no se pueda editar mientras tanto.
+# Uso: python benchmarks/bench_load.py [--trazos 100000]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import arcade
+from bench_draw import make_traces
+from binformat import write_binary
+from main import Paint, PaintWindow, WIDTH, HEIGHT, TOOLBAR_H, _write_json
+
+
+def frame(window: PaintWindow, app: Paint) -> float:
+    t0 = time.perf_counter()
+    app.on_draw()
+    window.ctx.finish()
+    return time.perf_counter() - t0
+
+
+def run(window: PaintWindow, path: str, progressive: bool, journal: str) -> tuple[float, float, list[float], Paint]:
+    t0 = time.perf_counter()
+    app = Paint(path, autosave_path=journal, progressive=progressive)
+    window.show_view(app)
+    frames = [frame(window, app)]
+    first = time.perf_counter() - t0
+    if progressive:
+        # Un clic en el lienzo a mitad de la carga no dibuja nada
+        if app.loader is not None:
+            app.on_mouse_press(WIDTH // 2, (HEIGHT - TOOLBAR_H) // 2, arcade.MOUSE_BUTTON_LEFT, 0)
+            app.on_mouse_release(WIDTH // 2, (HEIGHT - TOOLBAR_H) // 2, arcade.MOUSE_BUTTON_LEFT, 0)
+            assert not len(app.history), "se editó durante la carga"
+    while app.loader is not None:
+        frames.append(frame(window, app))
+    total = time.perf_counter() - t0
+    return first, total, frames, app
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trazos", type=int, default=100000)
+    args = parser.parse_args()
+    tmp = tempfile.mkdtemp()
+    traces = make_traces(args.trazos, w=WIDTH * 10, h=(HEIGHT - TOOLBAR_H) * 10)
+    paths = {"JSON": os.path.join(tmp, "dibujo.txt"), "pntb": os.path.join(tmp, "dibujo.pntb")}
+    _write_json(paths["JSON"], traces)
+    write_binary(paths["pntb"], traces)
+    window = PaintWindow(WIDTH, HEIGHT, "bench", visible=False)
+
+    print(f"{'archivo':>8} {'modo':>12} {'1er cuadro ms':>14} {'total s':>8} {'cuadros':>8} "
+          f"{'cuadro p50 ms':>14} {'cuadro máx ms':>14}")
+    for kind, path in paths.items():
+        for progressive in (False, True):
+            first, total, frames, app = run(window, path, progressive, os.path.join(tmp, "autosave.journal"))
+            assert len(app.traces) == len(traces), (len(app.traces), len(traces))
+            assert app.journal is not None
+            app.journal.close()
+            frames.sort()
+            mode = "segundo plano" if progressive else "directa"
+            print(f"{kind:>8} {mode:>12} {first * 1000:>14.1f} {total:>8.2f} {len(frames):>8} "
+                  f"{frames[len(frames) // 2] * 1000:>14.1f} {frames[-1] * 1000:>14.1f}")
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
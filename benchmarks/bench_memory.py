@@ -0,0 +1,72 @@
+# Memoria por millón de puntos: diccionarios con listas de tuplas (formato anterior)
+# contra registros con __slots__ y array('i'). Uso: python benchmarks/bench_memory.py
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from records import StrokeTrace, SprayTrace
+
+POINTS = 1_000_000
+PER_TRACE = 500
+COLOR = (0, 0, 255, 255)
+
+
+def measure(build) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    data = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del data
+    return (after - before) / 1024 / 1024
+
+
+def main():
+    rnd = random.Random(0)
+    xs = [rnd.randrange(2000) for _ in range(POINTS)]
+    ys = [rnd.randrange(2000) for _ in range(POINTS)]
+    n = POINTS // PER_TRACE
+
+    def dict_strokes():
+        out = []
+        for t in range(n):
+            pts = []
+            for i in range(t * PER_TRACE, (t + 1) * PER_TRACE):
+                pts.append((xs[i], ys[i]))
+            out.append({"tool": "PENCIL", "color": COLOR, "trace": pts})
+        return out
+
+    def record_strokes():
+        out = []
+        for t in range(n):
+            tr = StrokeTrace("PENCIL", COLOR)
+            for i in range(t * PER_TRACE, (t + 1) * PER_TRACE):
+                tr.add(xs[i], ys[i])
+            out.append(tr)
+        return out
+
+    def dict_spray():
+        return [{"tool": "SPRAY", "color": COLOR,
+                 "points": [(xs[i], ys[i]) for i in range(t * PER_TRACE, (t + 1) * PER_TRACE)]}
+                for t in range(n)]
+
+    def record_spray():
+        out = []
+        for t in range(n):
+            tr = SprayTrace(COLOR)
+            for i in range(t * PER_TRACE, (t + 1) * PER_TRACE):
+                tr.coords.append(xs[i])
+                tr.coords.append(ys[i])
+            out.append(tr)
+        return out
+
+    print(f"{'':>10} {'dict MB':>9} {'registro MB':>12}")
+    print(f"{'PENCIL':>10} {measure(dict_strokes):>9.1f} {measure(record_strokes):>12.1f}")
+    print(f"{'SPRAY':>10} {measure(dict_spray):>9.1f} {measure(record_spray):>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
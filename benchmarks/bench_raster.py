@@ -0,0 +1,57 @@
+# Rasterizador por CPU (raster.py) contra lo que dibuja arcade: tiempo por dibujo y
+# porcentaje de píxeles del lienzo que difieren, por herramienta y con todas mezcladas.
+# Sale con código 1 si algún caso supera el umbral.
+# Uso: python benchmarks/bench_raster.py [--trazos 300] [--umbral 0.005]
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import arcade
+import numpy as np
+from bench_draw import W, H, KINDS, make_traces, tools
+from raster import rasterize
+from render import TraceCache
+from store import TraceStore
+
+
+def gl_image(window: arcade.Window, traces) -> np.ndarray:
+    store = TraceStore(traces)
+    cache = TraceCache()
+    window.clear(color=(255, 255, 255, 255))
+    cache.sync(store, tools(), len(store))
+    cache.draw()
+    return np.asarray(arcade.get_image(0, 0, W, H).convert("RGB"))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trazos", type=int, default=300, help="trazos por herramienta")
+    parser.add_argument("--umbral", type=float, default=0.005, help="fracción de píxeles distintos tolerada")
+    args = parser.parse_args()
+    window = arcade.Window(W, H, "bench", visible=False, antialiasing=False)
+    cases = [(kind, make_traces(args.trazos, mix={kind: 1})) for kind in KINDS]
+    cases.append(("todas", make_traces(args.trazos * len(KINDS))))
+    failed = 0
+    print(f"{'caso':>8} {'trazos':>7} {'raster ms':>10} {'píxeles distintos':>18}")
+    for name, traces in cases:
+        ref = gl_image(window, traces)
+        t0 = time.perf_counter()
+        img = rasterize(traces, W, H)
+        ms = (time.perf_counter() - t0) * 1000
+        diff = (ref != img[:, :, :3]).any(axis=2).mean()
+        flag = ""
+        if diff > args.umbral:
+            flag = "  SUPERA EL UMBRAL"
+            failed += 1
+        print(f"{name:>8} {len(traces):>7} {ms:>10.1f} {diff:>17.3%}{flag}")
+    window.close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
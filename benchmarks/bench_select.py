@@ -0,0 +1,95 @@
+# Herramienta de selección: costo por cuadro de arrastrar muchos trazos seleccionados.
+# "reescribir" mueve cada trazo reescribiendo sus coordenadas en cada cuadro (registro nuevo
+# en el TraceStore y celdas de la caché recompiladas); "matriz" es SelectTool: los trazos se
+# levantan una vez a un ShapeElementList y por cuadro solo cambia la matriz. También mide
+# levantar la selección, soltarla (el cambio que va al historial) y el primer cuadro después,
+# y un cuadro sin arrastre como referencia: sin GPU (llvmpipe) dibujar los trazos ya cuesta.
+# Uso: python benchmarks/bench_select.py [1000 10000 50000] [--cuadros 10]
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import arcade
+from bench_draw import W, H, make_traces, tools
+from geometry import translation
+from records import flatten, transformed
+from render import ViewCache
+from store import TraceStore
+from tool import SelectTool
+
+
+def frame(window: arcade.Window, cache: ViewCache, store: TraceStore, used: dict, tool: SelectTool = None) -> float:
+    t0 = time.perf_counter()
+    window.clear()
+    cache.sync(store, used, len(store))
+    cache.draw()
+    if tool is not None:
+        tool.draw_overlay(store, 1.0)
+    window.ctx.finish()
+    return (time.perf_counter() - t0) * 1000
+
+
+def rewrite(window: arcade.Window, traces: list, used: dict, frames: int) -> float:
+    store = TraceStore(traces)
+    cache = ViewCache()
+    frame(window, cache, store, used)
+    t0 = time.perf_counter()
+    step = translation(3, 2)
+    for _ in range(frames):
+        for seq, tr in list(store.items()):
+            store.remove_seq(seq)
+            store.insert_seq(seq, flatten(transformed(tr, step)))
+        frame(window, cache, store, used)
+    return (time.perf_counter() - t0) / frames * 1000
+
+
+def lifted(window: arcade.Window, traces: list, used: dict, frames: int) -> tuple[float, float, float, float, float]:
+    store = TraceStore(traces)
+    cache = ViewCache()
+    frame(window, cache, store, used)
+    still = sum(frame(window, cache, store, used) for _ in range(frames)) / frames
+    tool = SelectTool()
+    tool.selected = [seq for seq, _tr in store.items()]
+    box = tool.bounds(store)
+    x, y = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+    tool.press(store, x, y, 1.0)
+    t0 = time.perf_counter()
+    tool.drag(store, used, [x + 3, y + 2])
+    frame(window, cache, store, used, tool)
+    lift = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    for i in range(2, frames + 2):
+        tool.drag(store, used, [x + 3 * i, y + 2 * i])
+        frame(window, cache, store, used, tool)
+    per_frame = (time.perf_counter() - t0) / frames * 1000
+    t0 = time.perf_counter()
+    change = tool.finish(store)
+    drop = (time.perf_counter() - t0) * 1000
+    after = frame(window, cache, store, used, tool)
+    assert len(change.added) == len(traces)
+    return still, lift, per_frame, drop, after
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("trazos", type=int, nargs="*", default=[1000, 10000, 50000])
+    parser.add_argument("--cuadros", type=int, default=10)
+    args = parser.parse_args()
+    window = arcade.Window(W, H, "bench", visible=False)
+    used = tools()
+    print(f"{'trazos':>8} {'quieto ms/cuadro':>17} {'reescribir ms/cuadro':>21} {'matriz ms/cuadro':>17} "
+          f"{'levantar ms':>12} {'soltar ms':>10} {'cuadro después ms':>18}")
+    for n in args.trazos:
+        traces = make_traces(n)
+        naive = rewrite(window, traces, used, args.cuadros)
+        still, lift, per_frame, drop, after = lifted(window, traces, used, args.cuadros)
+        print(f"{n:>8} {still:>17.1f} {naive:>21.1f} {per_frame:>17.1f} {lift:>12.1f} {drop:>10.1f} {after:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Simplificación de trazos: puntos quitados y efecto en dibujo y borrador.
+# Sin argumentos usa trazos de mouse simulados (eventos a 125 Hz sobre curvas suaves,
+# con pausas que repiten posiciones); con un archivo (dibujo.txt o .pntb) usa sus trazos.
+# Uso: python benchmarks/bench_simplify.py [dibujo.txt] [--trazos 2000]
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import arcade
+from bench_draw import W, H, tools, frame_time
+from binformat import BinaryDrawing, is_binary
+from records import Trace, StrokeTrace, from_dict
+from render import TraceCache
+from simplify import far_enough, simplify_items
+from store import TraceStore
+from tool import EraserTool
+
+TOLERANCES = (0.5, 1.0, 2.0)
+EVENTS = 500
+
+
+def mouse_strokes(n: int, seed: int = 3) -> list[Trace]:
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        tool = rnd.choice(["PENCIL", "MARKER"])
+        tr = StrokeTrace(tool, arcade.color.BLACK, width=8 if tool == "MARKER" else None)
+        x, y = rnd.uniform(0, W), rnd.uniform(0, H)
+        heading = rnd.uniform(0, 2 * math.pi)
+        for _ in range(rnd.randint(60, 240)):
+            # Velocidad variable en px por evento; a veces el mouse casi no se mueve
+            speed = rnd.choice([0.0, 0.3, 1.0, 3.0, 6.0])
+            heading += rnd.gauss(0, 0.15)
+            x = min(max(x + speed * math.cos(heading), 0), W)
+            y = min(max(y + speed * math.sin(heading), 0), H)
+            tr.add(round(x), round(y))
+        out.append(tr)
+    return out
+
+
+def filtered(traces: list[Trace], tol: float) -> list[Trace]:
+    # Lo que guarda on_mouse_drag con el filtro de distancia mínima
+    out = []
+    for tr in traces:
+        f = StrokeTrace(tr.tool, tr.color, width=tr.width)
+        for x, y in tr.points():
+            if far_enough(f.coords, x, y, tol):
+                f.add(x, y)
+        out.append(f)
+    return out
+
+
+def costs(window: arcade.Window, traces: list[Trace], events: list[tuple[int, int]]) -> tuple[float, float, float]:
+    used = tools()
+    store = TraceStore(traces)
+    cache = TraceCache()
+    t0 = time.perf_counter()
+    cache.sync(store, used, len(store))
+    for seg in cache.segments:
+        seg.shapes.update()
+    build = (time.perf_counter() - t0) * 1000
+    frame = frame_time(window, cache.draw)
+    eraser = EraserTool(radius=10)
+    t0 = time.perf_counter()
+    for (x, y) in events:
+        eraser.erase_at(store, x, y)
+    erase = (time.perf_counter() - t0) / len(events) * 1e6
+    return build, frame, erase
+
+
+def load(path: str) -> list[Trace]:
+    if is_binary(path):
+        with BinaryDrawing(path) as drawing:
+            return list(drawing)
+    with open(path, "r", encoding="utf-8") as f:
+        return [from_dict(d) for d in json.load(f)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("archivo", nargs="?")
+    parser.add_argument("--trazos", type=int, default=2000)
+    args = parser.parse_args()
+    raw = load(args.archivo) if args.archivo else mouse_strokes(args.trazos)
+    window = arcade.Window(W, H, "bench", visible=False)
+    rnd = random.Random(4)
+    events = [(rnd.randrange(W), rnd.randrange(H)) for _ in range(EVENTS)]
+    base = costs(window, raw, events)
+    total = sum(len(tr) for tr in raw if tr.tool in ("PENCIL", "MARKER"))
+    print(f"{'tolerancia':>10} {'puntos':>9} {'quitados':>9} {'compilar ms':>12} {'cuadro ms':>10} {'borrar µs':>10}")
+    print(f"{'-':>10} {total:>9} {0:>9} {base[0]:>12.1f} {base[1]:>10.2f} {base[2]:>10.1f}")
+    for tol in TOLERANCES:
+        # Sobre un archivo se aplica solo la pasada por documento; sobre trazos simulados,
+        # el filtro del arrastre y luego RDP al soltar, como en la aplicación
+        traces = list(raw) if args.archivo else filtered(raw, tol)
+        new, _old, _before, after = simplify_items(enumerate(traces), tol)
+        for i, tr in new:
+            traces[i] = tr
+        build, frame, erase = costs(window, traces, events)
+        print(f"{tol:>10g} {after:>9} {total - after:>9} {build:>12.1f} {frame:>10.2f} {erase:>10.1f}"
+              f"   x{base[0] / build:.1f} compilar, x{base[2] / erase:.1f} borrar")
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Spray: costo de make_spray según la densidad y tiempo por cuadro de un spray en curso
+# que crece (modo inmediato con draw_points contra el ShapeElementList incremental),
+# midiendo el tiempo de CPU de la llamada de dibujo.
+# Uso: python benchmarks/bench_spray.py [100 300 1000]
+import os
+import sys
+import time
+
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import arcade
+from bench_draw import W, H
+from records import SprayTrace
+from render import TraceCache
+from tool import SprayTool
+
+CALLS = 2000
+
+
+def per_frame(window: arcade.Window, events: int, draw) -> float:
+    # Un evento de arrastre por cuadro, como con el mouse: extiende el spray y dibuja
+    SprayTool.seed(1)
+    tool = SprayTool(radius=30, density=200)
+    trace = SprayTrace(arcade.color.RED)
+    total = 0.0
+    for i in range(events):
+        trace.extend(tool.make_spray(100 + i % (W - 200), 100 + (i * 7) % (H - 200)))
+        window.clear()
+        # Solo el lado de la CPU (armar y subir datos); el rasterizado queda fuera
+        t0 = time.perf_counter()
+        draw(tool, trace)
+        total += time.perf_counter() - t0
+        window.ctx.finish()
+    return total / events * 1000
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [100, 300, 1000]
+    print(f"{'densidad':>9} {'make_spray µs':>14}")
+    for density in (20, 200, 2000):
+        tool = SprayTool(radius=30, density=density)
+        t0 = time.perf_counter()
+        for _ in range(CALLS):
+            tool.make_spray(100, 100)
+        print(f"{density:>9} {(time.perf_counter() - t0) / CALLS * 1e6:>14.1f}")
+
+    window = arcade.Window(W, H, "bench", visible=False)
+    print(f"{'eventos':>9} {'puntos':>8} {'inmediato ms':>13} {'incremental ms':>15}")
+    for events in sizes:
+        immediate = per_frame(window, events, lambda tool, tr: tool.draw_traces([tr]))
+        cache = TraceCache()
+        incremental = per_frame(window, events, cache.draw_active)
+        points = events * round(200 * 3.14159 / 4)
+        print(f"{events:>9} {points:>8} {immediate:>13.2f} {incremental:>15.2f}")
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Exportación a SVG: por partes (svg.export: lee el archivo de a un trazo y escribe cada
+# pedazo apenas sale de svg_parts) contra cargar el dibujo entero y armar el texto completo
+# antes de escribirlo. Para cada tamaño arma un dibujo.txt y un .pntb con la mezcla de
+# bench_draw (unos 9 puntos por trazo contando 2 por figura: 300000 trazos son casi 3
+# millones de puntos) y mide segundos, puntos por segundo, MB del SVG y el pico de memoria
+# de Python (tracemalloc, en otra corrida para no inflar los tiempos).
+# Uso: python benchmarks/bench_svg.py [30000 100000 300000]
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_draw import make_traces
+from binformat import write_binary
+from raster import load
+from svg import export, scan, svg_parts
+
+
+def whole(path: str, dst: str):
+    traces, layers = load(path)
+    text = "".join(svg_parts(traces, scan(traces), layers))
+    with open(dst, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def measure(fn) -> tuple[float, float]:
+    # (segundos, pico en MB)
+    t0 = time.perf_counter()
+    fn()
+    secs = time.perf_counter() - t0
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return secs, peak / 2 ** 20
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [30000, 100000, 300000]
+    tmp = tempfile.mkdtemp()
+    # La primera exportación del proceso paga la preparación de NumPy y las cachés
+    warm = os.path.join(tmp, "warm.pntb")
+    write_binary(warm, make_traces(1000))
+    export(warm, tmp)
+    whole(warm, os.path.join(tmp, "entero.svg"))
+    print(f"{'trazos':>8} {'puntos':>9} {'origen':>6} {'modo':>10} {'s':>7} {'Mpuntos/s':>10} {'MB svg':>8} {'pico MB':>8}")
+    for n in sizes:
+        traces = make_traces(n)
+        points = sum(len(tr) if hasattr(tr, "coords") else 2 for tr in traces)
+        src_json = os.path.join(tmp, f"d{n}.txt")
+        src_bin = os.path.join(tmp, f"d{n}.pntb")
+        with open(src_json, "w", encoding="utf-8") as f:
+            json.dump([tr.to_dict() for tr in traces], f)
+        write_binary(src_bin, traces)
+        del traces
+        for name, src in (("json", src_json), ("pntb", src_bin)):
+            for mode, fn in (("por partes", lambda: export(src, tmp)),
+                             ("entero", lambda: whole(src, os.path.join(tmp, "entero.svg")))):
+                secs, peak = measure(fn)
+                out = os.path.join(tmp, f"d{n}.svg" if mode == "por partes" else "entero.svg")
+                mb = os.path.getsize(out) / 2 ** 20
+                print(f"{n:>8} {points:>9} {name:>6} {mode:>10} {secs:>7.2f} {points / secs / 1e6:>10.2f} "
+                      f"{mb:>8.1f} {peak:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
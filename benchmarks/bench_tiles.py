@@ -0,0 +1,67 @@
+# Mosaicos: tiempo por cuadro de la caché de ShapeElementList contra los mosaicos
+# rasterizados, y costo de un trazo nuevo y de un borrado (mosaicos que se vuelven a dibujar).
+# Uso: python benchmarks/bench_tiles.py [1000 5000 20000] [--mosaico 256]
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import arcade
+from bench_draw import W, H, make_traces, tools, frame_time
+from render import TraceCache
+from store import TraceStore
+from tiles import TileCache
+from tool import EraserTool
+
+EDITS = 20
+
+
+def edit_time(window: arcade.Window, cache, store: TraceStore, used: dict, edit) -> tuple[float, int]:
+    # Promedio de una edición seguida de sync y un cuadro; cuenta los mosaicos redibujados
+    renders = getattr(cache, "renders", 0)
+    t0 = time.perf_counter()
+    for i in range(EDITS):
+        edit(i)
+        window.clear()
+        cache.sync(store, used, len(store))
+        cache.draw()
+        window.ctx.finish()
+    return (time.perf_counter() - t0) / EDITS * 1000, getattr(cache, "renders", 0) - renders
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("trazos", type=int, nargs="*", default=[1000, 5000, 20000])
+    parser.add_argument("--mosaico", type=int, default=256)
+    args = parser.parse_args()
+    window = arcade.Window(W, H, "bench", visible=False)
+    used = tools()
+    print(f"{'trazos':>8} {'caché':>8} {'cuadro ms':>10} {'armar ms':>9} {'agregar ms':>11} {'borrar ms':>10} {'redibujos':>10}")
+    for n in args.trazos:
+        traces = make_traces(n)
+        extra = make_traces(EDITS, seed=7)
+        rnd = random.Random(5)
+        spots = [(rnd.randrange(W), rnd.randrange(H)) for _ in range(EDITS)]
+        eraser = EraserTool(radius=10)
+        for name in ("tramos", "mosaicos"):
+            store = TraceStore(traces)
+            cache = TileCache(W, H, args.mosaico) if name == "mosaicos" else TraceCache()
+            t0 = time.perf_counter()
+            cache.sync(store, used, len(store))
+            cache.draw()
+            window.ctx.finish()
+            build = (time.perf_counter() - t0) * 1000
+            frame = frame_time(window, lambda: (cache.sync(store, used, len(store)), cache.draw()))
+            add, _ = edit_time(window, cache, store, used, lambda i: store.append(extra[i]))
+            erase, renders = edit_time(window, cache, store, used, lambda i: eraser.erase_at(store, *spots[i]))
+            print(f"{n:>8} {name:>8} {frame:>10.2f} {build:>9.1f} {add:>11.2f} {erase:>10.2f} {renders:>10}")
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
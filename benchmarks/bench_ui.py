@@ -0,0 +1,107 @@
+# Costo por cuadro de la interfaz fija (barra superior y cuadrícula), sin trazos:
+# modo inmediato con draw_text y un draw_line por línea de la grilla (como dibujaba
+# on_draw antes) contra las capas retenidas de ui.py que usa Paint.
+# Uso: python benchmarks/bench_ui.py
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import arcade
+from bench_draw import frame_time
+from main import (Paint, ToolButton, WIDTH, HEIGHT, TOOLBAR_H, MARGIN,
+                  UI_BG, UI_SHADOW, UI_BORDER, UI_TEXT, UI_MUTED, CANVAS_BORDER)
+from tool import CellTool
+
+CALLS = 50
+
+
+def immediate_ui(app: Paint):
+    arcade.draw_lrbt_rectangle_filled(0, WIDTH, HEIGHT - TOOLBAR_H + 4, HEIGHT + 4, UI_SHADOW)
+    arcade.draw_lrbt_rectangle_filled(0, WIDTH, HEIGHT - TOOLBAR_H, HEIGHT, UI_BG)
+    arcade.draw_lrbt_rectangle_outline(0, WIDTH, HEIGHT - TOOLBAR_H, HEIGHT, UI_BORDER, 2)
+    for b in app.buttons:
+        fill = (232, 236, 239) if b.active else (230, 230, 230) if b.hover else (224, 224, 224)
+        arcade.draw_lrbt_rectangle_filled(b.x + 2, b.x + b.w + 2, b.y, b.y + b.h, UI_SHADOW)
+        arcade.draw_lrbt_rectangle_filled(b.x, b.x + b.w, b.y, b.y + b.h, fill)
+        arcade.draw_lrbt_rectangle_outline(b.x, b.x + b.w, b.y, b.y + b.h, UI_BORDER, 3 if b.active else 2)
+        arcade.draw_text(b.text, b.x + 12, b.y + b.h/2 - 8, UI_TEXT, 12)
+        if isinstance(b, ToolButton) and b.kind in ("pencil", "marker"):
+            mid_y = b.y + b.h / 2
+            arcade.draw_line(b.x + b.w - 40, mid_y, b.x + b.w - 12, mid_y, UI_MUTED, 2 if b.kind == "pencil" else 8)
+    for cb in app.color_buttons:
+        arcade.draw_circle_filled(cb.cx, cb.cy, cb.r, cb.color)
+        arcade.draw_circle_outline(cb.cx, cb.cy, cb.r, UI_BORDER, 3 if cb.active else 1)
+        arcade.draw_text(cb.name, cb.cx - cb.r, cb.cy - cb.r - 16, UI_MUTED, 11)
+    arcade.draw_text("Actual:", MARGIN, HEIGHT - TOOLBAR_H + 12, UI_TEXT, 14)
+    arcade.draw_lrbt_rectangle_filled(MARGIN + 60, MARGIN + 94, HEIGHT - TOOLBAR_H + 10, HEIGHT - TOOLBAR_H + 44, app.color)
+    arcade.draw_lrbt_rectangle_outline(MARGIN + 60, MARGIN + 94, HEIGHT - TOOLBAR_H + 10, HEIGHT - TOOLBAR_H + 44, UI_BORDER, 2)
+    arcade.draw_text(app.tool.name.title(), MARGIN + 102, HEIGHT - TOOLBAR_H + 16, UI_MUTED, 14)
+    arcade.draw_lrbt_rectangle_outline(0, WIDTH, 0, HEIGHT - TOOLBAR_H, CANVAS_BORDER, 2)
+    if app.show_grid or app.tool.name == "CELL":
+        c = app.grid_cell if app.tool.name != "CELL" else app.tool.cell
+        for gx in range(0, WIDTH, c):
+            arcade.draw_line(gx, 0, gx, HEIGHT - TOOLBAR_H, arcade.color.LIGHT_GRAY, 1)
+        for gy in range(0, HEIGHT - TOOLBAR_H, c):
+            arcade.draw_line(0, gy, WIDTH, gy, arcade.color.LIGHT_GRAY, 1)
+
+
+def retained_ui(app: Paint):
+    # La cuadrícula ahora va con la cámara del lienzo, debajo de los trazos
+    with app.view.camera.activate():
+        app._draw_grid()
+    app._draw_ui()
+
+
+def cpu_time(window: arcade.Window, draw) -> float:
+    # Solo la llamada de dibujo (armar texto y geometría, subir datos), sin esperar a la GPU
+    draw()
+    window.ctx.finish()
+    total = 0.0
+    for _ in range(CALLS):
+        window.clear()
+        t0 = time.perf_counter()
+        draw()
+        total += time.perf_counter() - t0
+        window.ctx.finish()
+    return total / CALLS * 1000
+
+
+def main():
+    window = arcade.Window(WIDTH, HEIGHT, "bench", visible=False)
+    app = Paint(autosave_path=os.path.join(tempfile.mkdtemp(), "autosave.journal"))
+    window.show_view(app)
+    cases = [
+        ("sin cuadrícula", lambda: None),
+        ("cuadrícula 20 px", app._toggle_grid),
+        ("celdas 5 px", lambda: app._set_tool(CellTool(cell=5))),
+    ]
+    print(f"{'caso':>17} {'inmediato cpu ms':>17} {'retenido cpu ms':>16} {'inmediato ms':>13} {'retenido ms':>12}")
+    for name, setup in cases:
+        setup()
+        imm_cpu = cpu_time(window, lambda: immediate_ui(app))
+        ret_cpu = cpu_time(window, lambda: retained_ui(app))
+        imm = frame_time(window, lambda: immediate_ui(app))
+        ret = frame_time(window, lambda: retained_ui(app))
+        print(f"{name:>17} {imm_cpu:>17.2f} {ret_cpu:>16.2f} {imm:>13.2f} {ret:>12.2f}")
+    # Pasar el mouse por encima rearma la geometría de la barra una vez por cambio de hover
+    moves = itertools.count()
+
+    def hover():
+        b = app.buttons[next(moves) % len(app.buttons)]
+        app.on_mouse_motion(b.x + 1, b.y + 1, 0, 0)
+        app._draw_ui()
+
+    builds = app.toolbar.builds
+    print(f"hover en cada cuadro: {cpu_time(window, hover):.2f} ms cpu, {app.toolbar.builds - builds} rearmados")
+    app.journal.close()
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
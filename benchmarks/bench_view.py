@@ -0,0 +1,56 @@
+# Lienzo infinito: dibujos cada vez más grandes con la misma densidad. Con zoom 1 compara
+# la caché de tramos (dibuja todo) contra ViewCache (solo las celdas visibles); alejado
+# hasta ver el dibujo entero compara la geometría completa contra el nivel de detalle.
+# Uso: python benchmarks/bench_view.py [10000 40000 160000]
+import math
+import os
+import sys
+import time
+
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import arcade
+from bench_draw import W, H, make_traces, tools, frame_time
+from render import TraceCache, ViewCache
+from store import TraceStore
+from viewport import Viewport
+
+
+def cached_frame(window: arcade.Window, view: Viewport, cache, store: TraceStore, used: dict) -> tuple[float, float]:
+    # (primer cuadro con la compilación, cuadro siguiente) en ms
+    def draw():
+        with view.camera.activate():
+            cache.sync(store, used, len(store), view.box(), view.zoom)
+            cache.draw()
+    t0 = time.perf_counter()
+    draw()
+    window.ctx.finish()
+    first = (time.perf_counter() - t0) * 1000
+    return first, frame_time(window, draw)
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 40000, 160000]
+    window = arcade.Window(W, H, "bench", visible=False)
+    used = tools()
+    print(f"{'trazos':>8} {'zoom':>6} {'caché':>9} {'primer ms':>10} {'cuadro ms':>10} {'celdas':>7}")
+    for n in sizes:
+        scale = math.sqrt(n / 1000)
+        store = TraceStore(make_traces(n, w=int(W * scale), h=int(H * scale)))
+        view = Viewport(W, H)
+        # Zoom 1 en el medio del dibujo, y luego todo el dibujo en pantalla
+        view.pan(-W * (scale - 1) / 2, -H * (scale - 1) / 2)
+        for zoom in (1, 1 / scale):
+            view.zoom_at(W / 2, H / 2, zoom / view.zoom)
+            for name, cache in (("tramos", TraceCache()), ("celdas", ViewCache())):
+                store.take_dirty()
+                first, frame = cached_frame(window, view, cache, store, used)
+                cells = len(getattr(cache, "visible", ()))
+                print(f"{n:>8} {view.zoom:>6.3f} {name:>9} {first:>10.1f} {frame:>10.2f} {cells:>7}")
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# Suite de rendimiento sin ventana: genera dibujos sintéticos (mezcla de herramientas
+# configurable, de 1000 a 1 millón de trazos, densidad constante) y mide borrador, spray,
+# deshacer/rehacer, guardar/cargar y on_draw de Paint con un contexto de arcade fuera
+# de pantalla (Mesa/llvmpipe sirve). Los resultados se guardan en JSON; `comparar`
+# marca las medidas que empeoraron entre dos corridas (sale con código 1 si hay alguna).
+# Uso:
+#   python benchmarks/suite.py correr [--trazos 1000 10000 100000] [--mezcla PENCIL=3,SPRAY=1]
+#                                     [--salida resultados.json] [--sin-dibujo]
+#   python benchmarks/suite.py comparar base.json nuevo.json [--umbral 0.2]
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import arcade
+from bench_draw import W, H, KINDS, make_traces
+from main import Paint, WIDTH, HEIGHT, TOOLBAR_H
+from store import TraceStore
+from tool import EraserTool, SprayTool
+
+EVENTS = 200
+SPRAYS = 2000
+FRAMES = 3
+# Debajo de esto (ms) una diferencia se considera ruido aunque supere el umbral relativo
+FLOOR = 0.01
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip().upper()
+        if name not in KINDS:
+            raise argparse.ArgumentTypeError(f"herramienta desconocida: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def per_call(fn, calls: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - t0) / calls * 1000
+
+
+def canvas_events(seed: int) -> list[tuple[int, int]]:
+    rnd = random.Random(seed)
+    return [(rnd.randrange(WIDTH), rnd.randrange(HEIGHT - TOOLBAR_H)) for _ in range(EVENTS)]
+
+
+def measure(window: arcade.Window, n: int, mix: dict, seed: int, draw: bool, tmp: str) -> dict[str, float]:
+    out = {}
+    # Densidad constante: el lienzo sintético crece con la cantidad de trazos
+    scale = math.sqrt(n / 1000)
+    w, h = int(W * scale), int(H * scale)
+    traces = make_traces(n, seed=seed, w=w, h=h, mix=mix)
+
+    rnd = random.Random(seed)
+    spots = [(rnd.randrange(w), rnd.randrange(h)) for _ in range(EVENTS)]
+    store = TraceStore(traces)
+    eraser = EraserTool(radius=10)
+    out["erase_at_ms"] = per_call(lambda i: eraser.erase_at(store, *spots[i]), EVENTS)
+    for density in (20, 200):
+        spray = SprayTool(radius=30, density=density)
+        out[f"make_spray_{density}_ms"] = per_call(lambda i: spray.make_spray(100, 100), SPRAYS)
+
+    # Guardado con los métodos de Paint (hilo aparte: se espera a que termine)
+    app = Paint(autosave_path=os.path.join(tmp, "autosave.journal"))
+    window.show_view(app)
+    app.traces = TraceStore(traces)
+    cwd = os.getcwd()
+    os.chdir(tmp)
+    try:
+        t0 = time.perf_counter()
+        app._save().join()
+        out["guardar_json_ms"] = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        app._save_binary().join()
+        out["guardar_pntb_ms"] = (time.perf_counter() - t0) * 1000
+    finally:
+        os.chdir(cwd)
+    app.journal.close()
+
+    # Carga por Paint.__init__ (incluye índices y el diario de autoguardado)
+    for name, path in (("json", "dibujo.txt"), ("pntb", "dibujo.pntb")):
+        t0 = time.perf_counter()
+        app = Paint(os.path.join(tmp, path), autosave_path=os.path.join(tmp, "autosave.journal"))
+        out[f"cargar_{name}_ms"] = (time.perf_counter() - t0) * 1000
+        assert len(app.traces) == n
+        app.journal.close()
+    window.show_view(app)
+
+    # Borrados con el mouse dentro del lienzo de la ventana, luego deshacer y rehacer
+    app.tool = EraserTool(radius=10)
+    events = canvas_events(seed)
+    for x, y in events:
+        app.on_mouse_press(x, y, arcade.MOUSE_BUTTON_LEFT, 0)
+        app.on_mouse_release(x, y, arcade.MOUSE_BUTTON_LEFT, 0)
+    steps = len(app.history.undo_stack)
+    out["deshacer_ms"] = per_call(lambda i: app._undo(), steps)
+    assert len(app.traces) == n
+    out["rehacer_ms"] = per_call(lambda i: app._redo(), steps)
+
+    if draw:
+        app.history.clear()
+        t0 = time.perf_counter()
+        app.on_draw()
+        window.ctx.finish()
+        out["primer_cuadro_ms"] = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        for _ in range(FRAMES):
+            app.on_draw()
+            window.ctx.finish()
+        out["cuadro_ms"] = (time.perf_counter() - t0) / FRAMES * 1000
+    app.journal.close()
+    return out
+
+
+def run(args):
+    window = arcade.Window(WIDTH, HEIGHT, "bench", visible=False)
+    tmp = tempfile.mkdtemp()
+    mix = args.mezcla or {k: 1.0 for k in KINDS}
+    results = {}
+    print(f"{'trazos':>8} {'medida':>18} {'ms':>12}")
+    for n in args.trazos:
+        results[str(n)] = measure(window, n, mix, args.semilla, not args.sin_dibujo, tmp)
+        for name, value in results[str(n)].items():
+            print(f"{n:>8} {name:>18} {value:>12.4f}")
+    info = window.ctx.info
+    report = {
+        "meta": {
+            "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "arcade": arcade.version.VERSION,
+            "gl": f"{info.VENDOR} {info.RENDERER}",
+            "mezcla": mix,
+            "semilla": args.semilla,
+        },
+        "resultados": results,
+    }
+    window.close()
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print("Resultados en", args.salida)
+
+
+def compare(args) -> int:
+    with open(args.base, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.nuevo, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    if base["meta"]["mezcla"] != new["meta"]["mezcla"] or base["meta"]["gl"] != new["meta"]["gl"]:
+        print("Aviso: las corridas usan distinta mezcla o distinto GL")
+    worse = 0
+    print(f"{'trazos':>8} {'medida':>18} {'base ms':>12} {'nuevo ms':>12} {'cambio':>8}")
+    for n, old_row in base["resultados"].items():
+        new_row = new["resultados"].get(n, {})
+        for name, old in old_row.items():
+            if name not in new_row:
+                continue
+            value = new_row[name]
+            ratio = value / old if old else math.inf
+            flag = ""
+            if ratio > 1 + args.umbral and value - old > FLOOR:
+                flag = "  REGRESIÓN"
+                worse += 1
+            elif ratio < 1 - args.umbral and old - value > FLOOR:
+                flag = "  mejora"
+            print(f"{n:>8} {name:>18} {old:>12.4f} {value:>12.4f} {ratio - 1:>+8.0%}{flag}")
+    print(f"{worse} regresiones (umbral {args.umbral:.0%})")
+    return 1 if worse else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite de rendimiento del motor de dibujo")
+    sub = parser.add_subparsers(dest="modo", required=True)
+    p = sub.add_parser("correr")
+    p.add_argument("--trazos", type=int, nargs="+", default=[1000, 10000, 100000])
+    p.add_argument("--mezcla", type=parse_mix, help="pesos por herramienta, p. ej. PENCIL=3,SPRAY=1 (por defecto todas iguales)")
+    p.add_argument("--semilla", type=int, default=1)
+    p.add_argument("--salida", default="resultados.json")
+    p.add_argument("--sin-dibujo", action="store_true", help="no medir on_draw (lento con GL por software)")
+    p = sub.add_parser("comparar")
+    p.add_argument("base")
+    p.add_argument("nuevo")
+    p.add_argument("--umbral", type=float, default=0.2, help="aumento relativo que cuenta como regresión")
+    args = parser.parse_args()
+    if args.modo == "correr":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
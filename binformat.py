@@ -0,0 +1,308 @@
+import json
+import math
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from itertools import accumulate
+from operator import sub
+from typing import Iterable, Iterator, Optional
+from records import Trace, StrokeTrace, SprayTrace, ShapeTrace, CellTrace, from_dict, split_header
+from spatial import trace_bounds
+
+# Formato binario de dibujos (.pntb), todo en little-endian:
+#   cabecera   MAGIC, versión u16, flags u16, cantidad de trazos u32, offset de la tabla u64
+#   bloques    coordenadas de cada trazo (ver _encode), opcionalmente comprimidas con zlib
+#   tabla      una entrada ENTRY por trazo: herramienta, flags, grosor, color, caja,
+#              offset y largo del bloque, cantidad de puntos
+# Versión 2: un trazo CELL guarda todas sus celdas como los puntos de un trazo (esquinas
+# con diferencias) y el tamaño de celda en el campo del grosor; en la versión 1 el bloque
+# era x, y, tamaño sin comprimir.
+# Un trazo con transformación (TRANSFORMED) lleva antes del bloque sus seis coeficientes en
+# float64, sin comprimir. Al guardar desde Paint las transformaciones ya vienen aplicadas;
+# solo las mandan los mensajes de colaboración.
+# Versión 3: un trazo fuera de la capa 0 (LAYERED) lleva antes del bloque (y de la
+# transformación) el id de su capa en u32. Con FILE_LAYERS, después de la tabla va la
+# cabecera de capas (layers.Layers.to_dict) en JSON, precedida por su largo en u32.
+MAGIC = b"PNTB"
+VERSION = 3
+HEADER = struct.Struct("<4sHHIQ")
+ENTRY = struct.Struct("<BBH4B4iQII")
+# Un trazo suelto (mensajes de colaboración): herramienta, flags, grosor, color y largo del
+# bloque, seguido del bloque
+PACKED = struct.Struct("<BBH4BI")
+AFFINE = struct.Struct("<6d")
+LAYER = struct.Struct("<I")
+
+FILE_ZLIB = 1
+FILE_LAYERS = 2
+
+HAS_WIDTH = 1
+RGB_ONLY = 2
+ZLIB = 4
+TRANSFORMED = 8
+LAYERED = 16
+
+TOOLS = ("PENCIL", "MARKER", "SPRAY", "LINE", "RECT", "CIRCLE", "CELL")
+TOOL_CODES = {name: i for i, name in enumerate(TOOLS)}
+
+RAW = 0
+DELTAS = {1: "b", 2: "h", 3: "i"}
+_LITTLE = sys.byteorder == "little"
+
+
+def _raw(values: array) -> bytes:
+    if not _LITTLE:
+        values = array("i", values)
+        values.byteswap()
+    return bytes([RAW]) + values.tobytes()
+
+
+def _encode(coords: array) -> bytes:
+    # Primer punto absoluto y luego diferencias dx, dy con el tipo entero más chico que alcance
+    if len(coords) < 4:
+        return _raw(coords)
+    xs = coords[0::2]
+    ys = coords[1::2]
+    d = array("i", bytes(4 * (len(coords) - 2)))
+    d[0::2] = array("i", map(sub, xs[1:], xs[:-1]))
+    d[1::2] = array("i", map(sub, ys[1:], ys[:-1]))
+    lo, hi = min(d), max(d)
+    if -128 <= lo and hi <= 127:
+        code = 1
+    elif -32768 <= lo and hi <= 32767:
+        code = 2
+    else:
+        code = 3
+    payload = array(DELTAS[code], d)
+    if not _LITTLE:
+        payload.byteswap()
+    return struct.pack("<Bii", code, coords[0], coords[1]) + payload.tobytes()
+
+
+def _decode(block) -> array:
+    code = block[0]
+    if code == RAW:
+        out = array("i")
+        out.frombytes(bytes(block[1:]))
+        if not _LITTLE:
+            out.byteswap()
+        return out
+    x0, y0 = struct.unpack_from("<ii", block, 1)
+    d = array(DELTAS[code])
+    d.frombytes(bytes(block[9:]))
+    if not _LITTLE:
+        d.byteswap()
+    xs = array("i", accumulate(d[0::2], initial=x0))
+    ys = array("i", accumulate(d[1::2], initial=y0))
+    out = array("i", bytes(8 * len(xs)))
+    out[0::2] = xs
+    out[1::2] = ys
+    return out
+
+
+def _payload(tr: Trace) -> tuple[array, int]:
+    if isinstance(tr, (StrokeTrace, SprayTrace, CellTrace)):
+        return tr.coords, len(tr)
+    return array("i", (tr.x1, tr.y1, tr.x2, tr.y2)), 2
+
+
+def _fields(tr: Trace, compress: bool) -> tuple[bytes, int, int, tuple]:
+    # Bloque de coordenadas, flags, grosor y color RGBA de un trazo
+    coords, _n = _payload(tr)
+    block = _raw(coords) if isinstance(tr, ShapeTrace) else _encode(coords)
+    flags = 0
+    if compress and len(block) > 64:
+        packed = zlib.compress(block, 6)
+        if len(packed) < len(block):
+            block = packed
+            flags |= ZLIB
+    if tr.transform is not None:
+        block = AFFINE.pack(*tr.transform) + block
+        flags |= TRANSFORMED
+    if tr.layer:
+        block = LAYER.pack(tr.layer) + block
+        flags |= LAYERED
+    width = tr.size if isinstance(tr, CellTrace) else getattr(tr, "width", None)
+    if width is not None:
+        flags |= HAS_WIDTH
+    color = tuple(tr.color)
+    if len(color) == 3:
+        flags |= RGB_ONLY
+        color = color + (255,)
+    return block, flags, width or 0, color
+
+
+def _trace(code: int, flags: int, width: int, color: tuple, block, version: int = VERSION) -> Trace:
+    layer, transform = 0, None
+    if flags & LAYERED:
+        layer = LAYER.unpack_from(block)[0]
+        block = block[LAYER.size:]
+    if flags & TRANSFORMED:
+        transform = AFFINE.unpack_from(block)
+        block = block[AFFINE.size:]
+    data = zlib.decompress(block) if flags & ZLIB else bytes(block)
+    tr = _make(TOOLS[code], _decode(data), width if flags & HAS_WIDTH else None,
+               color[:3] if flags & RGB_ONLY else color, version)
+    tr.transform = transform
+    tr.layer = layer
+    return tr
+
+
+def _make(tool: str, coords: array, w, color: tuple, version: int) -> Trace:
+    if tool in ("PENCIL", "MARKER"):
+        return StrokeTrace(tool, color, coords, w)
+    if tool == "SPRAY":
+        return SprayTrace(color, coords)
+    if tool == "CELL":
+        if version < 2:
+            return CellTrace(color, coords[:2], coords[2])
+        return CellTrace(color, coords, w)
+    return ShapeTrace(tool, color, *coords, w if w is not None else 2)
+
+
+def pack_trace(tr: Trace, compress: bool = True) -> bytes:
+    block, flags, width, color = _fields(tr, compress)
+    return PACKED.pack(TOOL_CODES[tr.tool], flags, width, *color, len(block)) + block
+
+
+def unpack_trace(buf, offset: int = 0) -> tuple[Trace, int]:
+    # Trazo empaquetado con pack_trace en buf[offset:] y offset siguiente
+    code, flags, width, r, g, b, a, length = PACKED.unpack_from(buf, offset)
+    start = offset + PACKED.size
+    return _trace(code, flags, width, (r, g, b, a), buf[start:start + length]), start + length
+
+
+def write_binary(path: str, traces: Iterable[Trace], compress: bool = True, layers: Optional[dict] = None):
+    # Escribe los bloques en el orden en que llegan; la tabla va al final y la
+    # cabecera se completa al cerrar, así no hace falta tener todo el archivo en memoria.
+    entries = bytearray()
+    count = 0
+    file_flags = (FILE_ZLIB if compress else 0) | (FILE_LAYERS if layers else 0)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, file_flags, 0, 0))
+        for tr in traces:
+            block, flags, width, color = _fields(tr, compress)
+            box = trace_bounds(tr) or (0, 0, 0, 0)
+            ibox = (math.floor(box[0]), math.floor(box[1]), math.ceil(box[2]), math.ceil(box[3]))
+            entries += ENTRY.pack(TOOL_CODES[tr.tool], flags, width, *color, *ibox,
+                                  f.tell(), len(block), _payload(tr)[1])
+            f.write(block)
+            count += 1
+        table = f.tell()
+        f.write(entries)
+        if layers:
+            meta = json.dumps(layers).encode("utf-8")
+            f.write(LAYER.pack(len(meta)) + meta)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, file_flags, count, table))
+
+
+class BinaryDrawing:
+    # Dibujo binario abierto con mmap: la cabecera y la tabla se leen al abrir y cada
+    # trazo se decodifica recién cuando se lo pide.
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version, self.flags, self.count, self._table = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("No es un dibujo binario")
+        if self.version > VERSION:
+            self.close()
+            raise ValueError(f"Versión de formato no soportada: {self.version}")
+        self.layers: Optional[dict] = None
+        if self.flags & FILE_LAYERS:
+            start = self._table + self.count * ENTRY.size
+            n = LAYER.unpack_from(self._mm, start)[0]
+            self.layers = json.loads(self._mm[start + LAYER.size:start + LAYER.size + n])
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def entry(self, i: int) -> tuple:
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return ENTRY.unpack_from(self._mm, self._table + i * ENTRY.size)
+
+    def tool(self, i: int) -> str:
+        return TOOLS[self.entry(i)[0]]
+
+    def bounds(self, i: int) -> tuple[int, int, int, int]:
+        return self.entry(i)[7:11]
+
+    def box(self) -> Optional[tuple[int, int, int, int]]:
+        # Caja de todo el dibujo desde la tabla, sin decodificar ni desempaquetar entradas:
+        # cada entrada son 10 enteros de 32 bits y la caja va del tercero al sexto
+        if not self.count:
+            return None
+        end = self._table + self.count * ENTRY.size
+        if not _LITTLE:
+            boxes = [self.bounds(i) for i in range(self.count)]
+            return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                    max(b[2] for b in boxes), max(b[3] for b in boxes))
+        with memoryview(self._mm)[self._table:end] as raw, raw.cast("i") as v:
+            return min(v[2::10]), min(v[3::10]), max(v[4::10]), max(v[5::10])
+
+    def __getitem__(self, i: int) -> Trace:
+        code, flags, width, r, g, b, a, _l, _b, _r, _t, offset, length, _n = self.entry(i)
+        block = memoryview(self._mm)[offset:offset + length]
+        try:
+            return _trace(code, flags, width, (r, g, b, a), block, self.version)
+        finally:
+            block.release()
+
+    def __iter__(self) -> Iterator[Trace]:
+        for i in range(self.count):
+            yield self[i]
+
+
+def is_binary(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def json_to_binary(src: str, dst: str, compress: bool = True):
+    with open(src, "r", encoding="utf-8") as f:
+        header, traces = split_header(json.load(f))
+    write_binary(dst, (from_dict(d) for d in traces), compress, header)
+
+
+def binary_to_json(src: str, dst: str):
+    with BinaryDrawing(src) as drawing, open(dst, "w", encoding="utf-8") as f:
+        f.write("[")
+        if drawing.layers:
+            json.dump(drawing.layers, f)
+        for i, tr in enumerate(drawing):
+            if i or drawing.layers:
+                f.write(", ")
+            json.dump(tr.to_dict(), f)
+        f.write("]")
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Convierte dibujos entre JSON (dibujo.txt) y binario (.pntb)")
+    parser.add_argument("src")
+    parser.add_argument("dst")
+    parser.add_argument("--sin-zlib", action="store_true", help="no comprimir los bloques")
+    args = parser.parse_args()
+    if is_binary(args.src):
+        binary_to_json(args.src, args.dst)
+    else:
+        json_to_binary(args.src, args.dst, compress=not args.sin_zlib)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import numpy as np
+from array import array
+from typing import Optional
+from history import Change
+from records import CellTrace, Trace
+from spatial import Box
+from store import TraceStore
+
+# Relleno de la cubeta: tope de celdas por clic (con la vista muy alejada y celdas chicas
+# el área visible puede tener millones)
+FILL_MAX = 250_000
+# Lado en celdas de los tramos en que se guarda lo pintado: pisar o borrar una celda
+# reemplaza solo el tramo que la tiene (hasta CHUNK * CHUNK celdas), no todo el relleno
+CHUNK = 16
+
+
+def _rgba(color) -> tuple:
+    color = tuple(color)
+    return color if len(color) == 4 else (*color, 255)
+
+
+def _owners(store: TraceStore, size: int, x: int, y: int, layer: int) -> list[int]:
+    # Trazos de la capa que pintan la celda; las celdas de otras capas no se tocan
+    owners = store.cells.owners(size, x, y)
+    if owners and any(store.get(seq).layer != layer for seq in owners):
+        return [seq for seq in owners if store.get(seq).layer == layer]
+    return owners
+
+
+def _top(store: TraceStore, size: int, x: int, y: int, layer: int) -> Optional[Trace]:
+    owners = _owners(store, size, x, y, layer)
+    return store.get(owners[-1]) if owners else None
+
+
+def cell_color(store: TraceStore, size: int, x: int, y: int, layer: int = 0) -> Optional[tuple]:
+    # Color visible de la celda en la capa (None si está vacía)
+    top = _top(store, size, x, y, layer)
+    return _rgba(top.color) if top else None
+
+
+def trim_cells(store: TraceStore, seq: int, rest: array,
+               size: Optional[int] = None) -> tuple[tuple[int, Trace], Optional[tuple[int, Trace]]]:
+    # Quita el trazo de celdas de la secuencia y, si le quedan celdas (rest), pone en su
+    # lugar una copia solo con ellas con la misma secuencia. Devuelve (quitado, copia o None).
+    old = store.remove_seq(seq)
+    if not rest:
+        return (seq, old), None
+    trimmed = CellTrace(old.color, rest, size or old.size)
+    trimmed.layer = old.layer
+    store.insert_seq(seq, trimmed)
+    return (seq, old), (seq, trimmed)
+
+
+def chunks(cells: array, size: int) -> list[array]:
+    # Las celdas agrupadas por tramo de CHUNK x CHUNK celdas (dentro de cada tramo, en el
+    # orden en que llegaron). Las celdas de una capa no se superponen, así que el orden
+    # entre tramos no cambia el dibujo.
+    xy = np.frombuffer(cells, dtype=np.int32).reshape(-1, 2)
+    tiles = xy // (size * CHUNK)
+    order = np.lexsort((tiles[:, 1], tiles[:, 0]))
+    tiles, xy = tiles[order], xy[order]
+    cuts = np.flatnonzero((tiles[1:] != tiles[:-1]).any(axis=1)) + 1
+    out = []
+    for part in np.split(xy, cuts):
+        coords = array("i")
+        coords.frombytes(part.tobytes())
+        out.append(coords)
+    return out
+
+
+def paint_cells(store: TraceStore, color, size: int, cells: array, layer: int = 0) -> Optional[Change]:
+    # Pinta las celdas (x0, y0, x1, y1, ...) de la capa con un trazo nuevo por tramo
+    # (chunks). Las que ya tienen ese color se saltean; las que tenían otro se quitan del
+    # trazo que las pintaba (trim_cells), así no se apilan. Devuelve el cambio para el
+    # historial, o None si no había nada que pintar.
+    rgba = _rgba(color)
+    keep = array("i")
+    gone: dict[int, set[tuple[int, int]]] = {}
+    for i in range(0, len(cells), 2):
+        x, y = cells[i], cells[i + 1]
+        owners = _owners(store, size, x, y, layer)
+        if owners and _rgba(store.get(owners[-1]).color) == rgba:
+            continue
+        keep.extend((x, y))
+        for seq in owners:
+            gone.setdefault(seq, set()).add((x, y))
+    if not keep:
+        return None
+    added, removed = [], []
+    for seq in sorted(gone):
+        c, drop = store.get(seq).coords, gone[seq]
+        rest = array("i")
+        for i in range(0, len(c), 2):
+            if (c[i], c[i + 1]) not in drop:
+                rest.extend((c[i], c[i + 1]))
+        old, trimmed = trim_cells(store, seq, rest)
+        removed.append(old)
+        if trimmed:
+            added.append(trimmed)
+    for part in chunks(keep, size):
+        trace = CellTrace(color, part, size)
+        trace.layer = layer
+        store.append(trace)
+        added.append((store.seq_of(trace), trace))
+    return Change(added=added, removed=removed)
+
+
+def flood_fill(store: TraceStore, size: int, x: int, y: int, bounds: Box, limit: int = FILL_MAX,
+               layer: int = 0) -> Optional[array]:
+    # Relleno por líneas (scanline) sobre la cuadrícula dispersa: las celdas conectadas en
+    # cruz con (x, y) que tienen su mismo color visible en la capa (o que están vacías como
+    # ella), dentro de las celdas que tocan bounds. Devuelve None si pasan de `limit`.
+    target = cell_color(store, size, x, y, layer)
+    i0, j0 = int(bounds[0] // size), int(bounds[1] // size)
+    i1, j1 = int(-(-bounds[2] // size)) - 1, int(-(-bounds[3] // size)) - 1
+
+    def same(i: int, j: int) -> bool:
+        top = _top(store, size, i * size, j * size, layer)
+        return (_rgba(top.color) if top else None) == target
+
+    seen: set[tuple[int, int]] = set()
+    out = array("i")
+    stack = [(x // size, y // size)]
+    while stack:
+        i, j = stack.pop()
+        if (i, j) in seen or not same(i, j):
+            continue
+        left = i
+        while left > i0 and (left - 1, j) not in seen and same(left - 1, j):
+            left -= 1
+        right = i
+        while right < i1 and (right + 1, j) not in seen and same(right + 1, j):
+            right += 1
+        for k in range(left, right + 1):
+            seen.add((k, j))
+            out.extend((k * size, j * size))
+        if len(seen) > limit:
+            return None
+        # Una semilla por tramo del mismo color en las filas de arriba y de abajo
+        for nj in (j - 1, j + 1):
+            if not j0 <= nj <= j1:
+                continue
+            inside = False
+            for k in range(left, right + 1):
+                ok = (k, nj) not in seen and same(k, nj)
+                if ok and not inside:
+                    stack.append((k, nj))
+                inside = ok
+    return out
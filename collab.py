@@ -0,0 +1,292 @@
+import asyncio
+import random
+import struct
+import threading
+from array import array
+from collections import deque
+from typing import Callable, Optional
+from binformat import PACKED, pack_trace, unpack_trace
+from records import Trace
+
+# Colaboración en la red local: un servidor asyncio reenvía a cada cliente los cambios de
+# los demás. Cada trazo se identifica en todos los clientes con (cliente, id): el id es la
+# secuencia del TraceStore donde se creó. Los cambios viajan en tandas binarias, una por
+# cuadro: largo u32 y luego mensajes MSG (tipo, cliente, id) seguidos de su cuerpo:
+#   ADD     trazo empaquetado (binformat.pack_trace); trazo nuevo, terminado o que vuelve
+#           (deshacer), o reemplazo de uno que ya estaba con ese id
+#   APPEND  cantidad de puntos u32 y coordenadas i32: puntos nuevos del trazo en curso
+#   SHAPE   x2, y2 i32: nuevo extremo de la figura en curso
+#   REMOVE  sin cuerpo: borrador, deshacer o celdas pisadas
+#   CLEAR   sin cuerpo
+# Aplicar un mensaje dos veces no cambia el resultado.
+ADD, APPEND, SHAPE, REMOVE, CLEAR = range(1, 6)
+MSG = struct.Struct("<BII")
+LENGTH = struct.Struct("<I")
+COUNT = struct.Struct("<I")
+POINT = struct.Struct("<ii")
+PORT = 8765
+# Tope de una tanda recibida (una instantánea grande al conectarse entra de sobra)
+BATCH_MAX = 256 * 1024 * 1024
+
+Gid = tuple[int, int]
+Message = tuple[int, int, int, bytes]
+
+
+def add(gid: Gid, trace: Trace) -> Message:
+    return (ADD, *gid, pack_trace(trace))
+
+
+def append(gid: Gid, coords: array) -> Message:
+    return (APPEND, *gid, COUNT.pack(len(coords) // 2) + array("i", coords).tobytes())
+
+
+def shape(gid: Gid, x2: int, y2: int) -> Message:
+    return (SHAPE, *gid, POINT.pack(x2, y2))
+
+
+def remove(gid: Gid) -> Message:
+    return (REMOVE, *gid, b"")
+
+
+def clear() -> Message:
+    return (CLEAR, 0, 0, b"")
+
+
+def trace_of(msg: Message) -> Trace:
+    return unpack_trace(msg[3])[0]
+
+
+def coords_of(msg: Message) -> array:
+    out = array("i")
+    out.frombytes(msg[3][COUNT.size:])
+    return out
+
+
+def coalesce(msgs: list[Message]) -> list[Message]:
+    # Junta los mensajes pendientes de varias tandas: los APPEND de un mismo trazo se suman,
+    # de sus SHAPE queda el último y un ADD descarta lo pendiente de ese trazo (el trazo
+    # completo ya lo trae). Un trazo es siempre de un solo tipo: o crece o mueve su extremo.
+    out: list[Optional[Message]] = []
+    live: dict[Gid, int] = {}
+    for msg in msgs:
+        kind, gid = msg[0], msg[1:3]
+        i = live.get(gid)
+        if kind == ADD and i is not None:
+            out[i] = None
+            del live[gid]
+        elif kind == APPEND and i is not None:
+            prev = out[i]
+            n = COUNT.unpack_from(prev[3])[0] + COUNT.unpack_from(msg[3])[0]
+            out[i] = (APPEND, *gid, COUNT.pack(n) + prev[3][COUNT.size:] + msg[3][COUNT.size:])
+            continue
+        elif kind == SHAPE and i is not None:
+            out[i] = msg
+            continue
+        elif kind in (APPEND, SHAPE):
+            live[gid] = len(out)
+        out.append(msg)
+    return [m for m in out if m is not None]
+
+
+def encode(msgs: list[Message]) -> bytes:
+    parts = []
+    for kind, client, ident, body in msgs:
+        parts.append(MSG.pack(kind, client, ident))
+        parts.append(body)
+    data = b"".join(parts)
+    return LENGTH.pack(len(data)) + data
+
+
+def decode(data: bytes) -> list[Message]:
+    # Solo separa los mensajes: los trazos se desempaquetan al aplicarlos (trace_of)
+    out = []
+    pos = 0
+    view = memoryview(data)
+    while pos < len(data):
+        kind, client, ident = MSG.unpack_from(data, pos)
+        pos += MSG.size
+        if kind == ADD:
+            end = pos + PACKED.size + PACKED.unpack_from(data, pos)[-1]
+        elif kind == APPEND:
+            end = pos + COUNT.size + 8 * COUNT.unpack_from(data, pos)[0]
+        elif kind == SHAPE:
+            end = pos + POINT.size
+        elif kind in (REMOVE, CLEAR):
+            end = pos
+        else:
+            raise ValueError(f"Mensaje desconocido: {kind}")
+        if end > len(data):
+            raise ValueError("Mensaje cortado")
+        out.append((kind, client, ident, bytes(view[pos:end])))
+        pos = end
+    return out
+
+
+async def read_batch(reader: asyncio.StreamReader) -> Optional[list[Message]]:
+    # None cuando el otro lado cerró la conexión
+    try:
+        head = await reader.readexactly(LENGTH.size)
+        n = LENGTH.unpack(head)[0]
+        if n > BATCH_MAX:
+            raise ValueError(f"Tanda demasiado grande: {n} bytes")
+        return decode(await reader.readexactly(n))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+
+
+class Outbox:
+    # Mensajes que esperan a que se libere el socket: mientras se escribe una tanda
+    # las siguientes se acumulan y salen juntas, coalescidas
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.pending: list[Message] = []
+        self.sent = 0
+        self.bytes = 0
+        self._wake = asyncio.Event()
+
+    def put(self, msgs: list[Message]):
+        self.pending += msgs
+        self._wake.set()
+
+    async def run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            msgs, self.pending = coalesce(self.pending), []
+            if not msgs:
+                continue
+            data = encode(msgs)
+            self.writer.write(data)
+            self.sent += len(msgs)
+            self.bytes += len(data)
+            await self.writer.drain()
+
+
+class Server:
+    # Reenvía lo que manda cada cliente a todos los demás, en el orden en que llega, y
+    # guarda el último ADD de cada trazo vivo para mandárselos a quien se conecta después
+    def __init__(self):
+        self.clients: dict[asyncio.StreamWriter, Outbox] = {}
+        self.traces: dict[Gid, Message] = {}
+        self.received = 0
+
+    def apply(self, msgs: list[Message]):
+        for msg in msgs:
+            kind, gid = msg[0], msg[1:3]
+            if kind == ADD:
+                self.traces[gid] = msg
+            elif kind == REMOVE:
+                self.traces.pop(gid, None)
+            elif kind == CLEAR:
+                self.traces.clear()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        out = Outbox(writer)
+        out.put(list(self.traces.values()))
+        self.clients[writer] = out
+        task = asyncio.create_task(out.run())
+        try:
+            while True:
+                msgs = await read_batch(reader)
+                if msgs is None:
+                    break
+                self.received += len(msgs)
+                self.apply(msgs)
+                for other, box in self.clients.items():
+                    if other is not writer:
+                        box.put(msgs)
+        except (ValueError, struct.error) as e:
+            print("Tanda inválida:", e)
+        finally:
+            del self.clients[writer]
+            task.cancel()
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = PORT) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle, host, port)
+
+
+class Client:
+    # Conexión de Paint con el servidor desde un hilo con su propio bucle asyncio. La vista
+    # junta los mensajes de un cuadro (add, append, ...) y los manda con flush; los recibidos
+    # quedan en inbox hasta que la vista los aplica.
+    def __init__(self, host: str, port: int = PORT, on_receive: Callable[[], None] = lambda: None):
+        self.me = random.getrandbits(31) + 1
+        self.inbox: deque[Message] = deque()
+        self.closed = False
+        self.error: Optional[Exception] = None
+        self._frame: list[Message] = []
+        self._on_receive = on_receive
+        self._loop = asyncio.new_event_loop()
+        self._out: Optional[Outbox] = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(host, port), name="colaboración", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self.error is not None:
+            raise self.error
+
+    def send(self, msg: Message):
+        self._frame.append(msg)
+
+    def flush(self):
+        # Una tanda por cuadro
+        if self._frame and not self.closed:
+            msgs, self._frame = self._frame, []
+            self._loop.call_soon_threadsafe(self._out.put, msgs)
+
+    def close(self):
+        if not self.closed:
+            self._loop.call_soon_threadsafe(self._out.writer.close)
+        self._thread.join(timeout=1)
+
+    def _run(self, host: str, port: int):
+        try:
+            self._loop.run_until_complete(self._main(host, port))
+        except Exception as e:
+            self.error = e
+        finally:
+            self.closed = True
+            self._ready.set()
+            self._on_receive()
+
+    async def _main(self, host: str, port: int):
+        reader, writer = await asyncio.open_connection(host, port)
+        self._out = Outbox(writer)
+        task = asyncio.create_task(self._out.run())
+        self._ready.set()
+        try:
+            while True:
+                msgs = await read_batch(reader)
+                if msgs is None:
+                    return
+                self.inbox.extend(msgs)
+                self._on_receive()
+        finally:
+            task.cancel()
+            writer.close()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Servidor de colaboración de paint")
+    # Solo local por defecto: el servidor no autentica y acepta tandas de hasta BATCH_MAX
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="dirección donde escuchar (por defecto solo local; 0.0.0.0 para toda la red)")
+    parser.add_argument("--puerto", type=int, default=PORT)
+    args = parser.parse_args()
+
+    async def run():
+        server = Server()
+        srv = await server.serve(args.host, args.puerto)
+        print(f"Escuchando en {args.host}:{args.puerto}")
+        async with srv:
+            await srv.serve_forever()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import math
+from array import array
+import numpy as np
+
+# Núcleos geométricos por lotes: cada función trabaja sobre arreglos enteros de
+# coordenadas (y de varios trazos a la vez con pack) en lugar de un punto o tramo por
+# llamada. Hacen en float64 las mismas operaciones, en el mismo orden, que las versiones
+# escalares de tool.EraserTool, así que los resultados son idénticos
+# (benchmarks/bench_geometry.py lo verifica).
+
+# Desde cuántos puntos conviene NumPy: con menos, el costo fijo de armar los arreglos
+# supera al del recorrido escalar
+VECTOR_MIN = 32
+
+
+def points(coords: array) -> np.ndarray:
+    # (n, 2) float64 copiado de x0, y0, x1, y1, ...; la copia no retiene el búfer del
+    # array('i'), que tiene que poder seguir creciendo
+    return np.frombuffer(coords, dtype=np.int32).astype(np.float64).reshape(-1, 2)
+
+
+def coord_bounds(coords: array) -> tuple[int, int, int, int]:
+    # (left, bottom, right, top) de x0, y0, x1, y1, ... (no vacío)
+    if len(coords) < 2 * VECTOR_MIN:
+        xs, ys = coords[0::2], coords[1::2]
+        return min(xs), min(ys), max(xs), max(ys)
+    # Reducir por columnas salteadas es mucho más rápido que por el eje 0 de (n, 2)
+    v = np.frombuffer(coords, dtype=np.int32)
+    xs, ys = v[0::2], v[1::2]
+    return int(xs.min()), int(ys.min()), int(xs.max()), int(ys.max())
+
+
+def pack(coords: list[array]) -> tuple[np.ndarray, np.ndarray]:
+    # Puntos de varios trazos (ninguno vacío) juntos y el índice del primero de cada uno
+    flat = array("i")
+    starts = []
+    for c in coords:
+        starts.append(len(flat) // 2)
+        flat.extend(c)
+    return points(flat), np.array(starts, dtype=np.intp)
+
+
+def seg_dist(px, py, x1, y1, x2, y2) -> np.ndarray:
+    # Distancia de cada punto a cada tramo (con broadcasting), como _dist_point_to_segment
+    dx = x2 - x1
+    dy = y2 - y1
+    den = dx * dx + dy * dy
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = ((px - x1) * dx + (py - y1) * dy) / den
+    # Un tramo de largo cero mide hasta su primer punto
+    t = np.where(den == 0, 0.0, t)
+    ex = np.where(t < 0, x1, np.where(t > 1, x2, x1 + t * dx))
+    ey = np.where(t < 0, y1, np.where(t > 1, y2, y1 + t * dy))
+    return np.sqrt((px - ex) ** 2 + (py - ey) ** 2)
+
+
+def polyline_dist(pts: np.ndarray, starts: np.ndarray, px: float, py: float) -> np.ndarray:
+    # Distancia de (px, py) a cada polilínea de pack (inf si tiene un solo punto: sin tramos)
+    x, y = pts[:, 0], pts[:, 1]
+    d = np.full(len(pts), np.inf)
+    d[:-1] = seg_dist(px, py, x[:-1], y[:-1], x[1:], y[1:])
+    # Los tramos que unen el último punto de un trazo con el primero del siguiente
+    d[starts[1:] - 1] = np.inf
+    return np.minimum.reduceat(d, starts)
+
+
+def disk_count(pts: np.ndarray, starts: np.ndarray, px: float, py: float, r: float) -> np.ndarray:
+    # Puntos de cada trazo de pack a distancia <= r de (px, py)
+    inside = np.sqrt((pts[:, 0] - px) ** 2 + (pts[:, 1] - py) ** 2) <= r
+    return np.add.reduceat(inside, starts)
+
+
+def ring_dist(cx, cy, ex, ey, px, py) -> np.ndarray:
+    # Distancia de (px, py) a cada circunferencia de centro (cx, cy) que pasa por (ex, ey)
+    r = np.sqrt((ex - cx) ** 2 + (ey - cy) ** 2)
+    return np.abs(np.sqrt((px - cx) ** 2 + (py - cy) ** 2) - r)
+
+
+def rect_dist(px, py, left, right, bottom, top) -> np.ndarray:
+    # Distancia de (px, py) a cada rectángulo (0 adentro); el contorno de un RECT de grosor
+    # w es la zona a menos de w del rectángulo exterior y fuera del interior
+    cx = np.minimum(np.maximum(px, left), right)
+    cy = np.minimum(np.maximum(py, bottom), top)
+    return np.sqrt((px - cx) ** 2 + (py - cy) ** 2)
+
+
+def bounds(pts: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    # (left, bottom, right, top) de los puntos de cada trazo de pack
+    x, y = pts[:, 0], pts[:, 1]
+    return np.column_stack((np.minimum.reduceat(x, starts), np.minimum.reduceat(y, starts),
+                            np.maximum.reduceat(x, starts), np.maximum.reduceat(y, starts)))
+
+
+def segs_dist(ax, ay, bx, by, cx, cy, dx, dy) -> np.ndarray:
+    # Distancia entre los tramos ab y cd (con broadcasting), como _dist_segments
+    d1 = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    d2 = (bx - ax) * (dy - ay) - (by - ay) * (dx - ax)
+    d3 = (dx - cx) * (ay - cy) - (dy - cy) * (ax - cx)
+    d4 = (dx - cx) * (by - cy) - (dy - cy) * (bx - cx)
+    cross = (((d1 > 0) & (d2 < 0)) | ((d1 < 0) & (d2 > 0))) & (((d3 > 0) & (d4 < 0)) | ((d3 < 0) & (d4 > 0)))
+    d = np.minimum(np.minimum(seg_dist(ax, ay, cx, cy, dx, dy), seg_dist(bx, by, cx, cy, dx, dy)),
+                   np.minimum(seg_dist(cx, cy, ax, ay, bx, by), seg_dist(dx, dy, ax, ay, bx, by)))
+    return np.where(cross, 0.0, d)
+
+
+def seg_rect_dist(ax, ay, bx, by, left, right, bottom, top) -> np.ndarray:
+    # Distancia del tramo ab a cada rectángulo (0 si lo atraviesa), como _dist_segment_rect
+    vx, vy = bx - ax, by - ay
+    t0 = np.zeros(np.broadcast(ax, left).shape)
+    t1 = np.ones_like(t0)
+    out = np.zeros(t0.shape, dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for p, q in ((-vx, ax - left), (vx, right - ax), (-vy, ay - bottom), (vy, top - ay)):
+            out |= (p == 0) & (q < 0)
+            t0 = np.where(p < 0, np.maximum(t0, q / p), t0)
+            t1 = np.where(p > 0, np.minimum(t1, q / p), t1)
+    inside = ~out & (t0 <= t1)
+    ends = [rect_dist(px, py, left, right, bottom, top) for px, py in ((ax, ay), (bx, by))]
+    corners = [seg_dist(px, py, ax, ay, bx, by) for px, py in ((left, bottom), (left, top), (right, bottom), (right, top))]
+    d = np.minimum.reduce(np.broadcast_arrays(*ends, *corners))
+    return np.where(inside, 0.0, d)
+
+
+# Transformaciones afines (a, b, c, d, e, f): x' = a·x + c·y + e, y' = b·x + d·y + f
+Affine = tuple[float, float, float, float, float, float]
+IDENTITY: Affine = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+
+def compose(m: Affine, n: Affine) -> Affine:
+    # Primero n y después m
+    a, b, c, d, e, f = m
+    p, q, r, s, t, u = n
+    return (a * p + c * q, b * p + d * q, a * r + c * s, b * r + d * s, a * t + c * u + e, b * t + d * u + f)
+
+
+def translation(dx: float, dy: float) -> Affine:
+    return (1.0, 0.0, 0.0, 1.0, float(dx), float(dy))
+
+
+def around(cx: float, cy: float, scale: float = 1.0, angle: float = 0.0) -> Affine:
+    # Escala uniforme y rotación (en radianes, antihoraria) alrededor de (cx, cy)
+    cos, sin = scale * math.cos(angle), scale * math.sin(angle)
+    return (cos, sin, -sin, cos, cx - cos * cx + sin * cy, cy - sin * cx - cos * cy)
+
+
+def scale_of(m: Affine) -> float:
+    # Factor de escala de una semejanza (las que arma SelectTool)
+    return math.sqrt(abs(m[0] * m[3] - m[1] * m[2]))
+
+
+def apply(m: Affine, x: float, y: float) -> tuple[float, float]:
+    return m[0] * x + m[2] * y + m[4], m[1] * x + m[3] * y + m[5]
+
+
+def affine_coords(coords: array, m: Affine) -> array:
+    # x0, y0, x1, y1, ... transformados y redondeados al entero más cercano
+    p = points(coords)
+    out = np.empty(p.shape, dtype=np.int32)
+    out[:, 0] = np.rint(m[0] * p[:, 0] + m[2] * p[:, 1] + m[4])
+    out[:, 1] = np.rint(m[1] * p[:, 0] + m[3] * p[:, 1] + m[5])
+    res = array("i")
+    res.frombytes(out.tobytes())
+    return res
+
+
+def inside_polygon(pts: np.ndarray, poly: np.ndarray) -> np.ndarray:
+    # Qué puntos (n, 2) caen dentro del polígono (k, 2), con la regla par-impar: se cuentan
+    # los lados que cruza una semirrecta horizontal hacia la derecha de cada punto
+    x, y = pts[:, 0], pts[:, 1]
+    inside = np.zeros(len(pts), dtype=bool)
+    for (x1, y1), (x2, y2) in zip(poly, np.roll(poly, -1, axis=0)):
+        if y1 == y2:
+            continue
+        crosses = (y1 > y) != (y2 > y)
+        inside ^= crosses & (x < x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+    return inside
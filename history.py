@@ -0,0 +1,174 @@
+import pickle
+import tempfile
+from collections import deque
+from typing import Optional, Union
+from records import Trace, StrokeTrace, SprayTrace, CellTrace
+from store import TraceStore
+
+BUDGET = 64 * 1024 * 1024
+DISK_BUDGET = 512 * 1024 * 1024
+RECORD_BYTES = 120
+
+Items = list[tuple[int, Trace]]
+
+
+def _trace_bytes(tr: Trace) -> int:
+    # Estimación gruesa: registro + arreglo de coordenadas
+    if isinstance(tr, (StrokeTrace, SprayTrace, CellTrace)):
+        return RECORD_BYTES + tr.coords.itemsize * len(tr.coords)
+    return RECORD_BYTES
+
+
+class Change:
+    # Una entrada del historial: solo los trazos que entraron y salieron del TraceStore,
+    # con su número de secuencia para volver a su lugar cronológico.
+    # Deshacer y rehacer cuestan O(tamaño del cambio), sin importar el tamaño del lienzo.
+    __slots__ = ("added", "removed", "size")
+
+    def __init__(self, added: Items = (), removed: Items = ()):
+        self.added = list(added)
+        self.removed = list(removed)
+        self.size = sum(_trace_bytes(tr) for _seq, tr in self.added) + \
+            sum(_trace_bytes(tr) for _seq, tr in self.removed)
+
+    # Con colaboración otro cliente pudo haber borrado o repuesto algún trazo del cambio:
+    # esos se saltean
+    def revert(self, store: TraceStore):
+        for seq, _tr in self.added:
+            if store.get(seq) is not None:
+                store.remove_seq(seq)
+        for seq, tr in self.removed:
+            if store.get(seq) is None:
+                store.insert_seq(seq, tr)
+
+    @classmethod
+    def merge(cls, changes: list["Change"]) -> "Change":
+        # Un solo cambio equivalente a varios seguidos (p. ej. los de un arrastre del
+        # borrador): de cada secuencia, el trazo que había antes del primero y el que queda
+        # después del último
+        before: dict[int, Trace] = {}
+        after: dict[int, Optional[Trace]] = {}
+        for change in changes:
+            for seq, tr in change.removed:
+                if seq not in after:
+                    before[seq] = tr
+                after[seq] = None
+            for seq, tr in change.added:
+                after[seq] = tr
+        return cls(added=[(seq, tr) for seq, tr in after.items() if tr is not None], removed=list(before.items()))
+
+    def apply(self, store: TraceStore):
+        for seq, _tr in self.removed:
+            if store.get(seq) is not None:
+                store.remove_seq(seq)
+        for seq, tr in self.added:
+            if store.get(seq) is None:
+                store.insert_seq(seq, tr)
+
+
+class _Spilled:
+    # Entrada vieja bajada al archivo temporal
+    __slots__ = ("offset", "length")
+
+    def __init__(self, offset: int, length: int):
+        self.offset = offset
+        self.length = length
+
+
+class History:
+    # Pilas de deshacer/rehacer con presupuesto de memoria. Cuando las entradas en memoria
+    # superan `budget` bytes, las más viejas se bajan a un archivo temporal (o se descartan
+    # si spill=False). El archivo se recorta a DISK_BUDGET descartando lo más viejo.
+    def __init__(self, budget: int = BUDGET, spill: bool = True, disk_budget: int = DISK_BUDGET):
+        self.budget = budget
+        self.spill = spill
+        self.disk_budget = disk_budget
+        self.undo_stack: deque[Union[Change, _Spilled]] = deque()
+        self.redo_stack: list[Change] = []
+        self.memory = 0
+        self._spilled = 0
+        self._disk = 0
+        self._file = None
+
+    def __len__(self) -> int:
+        return len(self.undo_stack)
+
+    def push(self, change: Change):
+        self.undo_stack.append(change)
+        self.memory += change.size
+        self._drop_redo()
+        self._enforce()
+
+    def undo(self, store: TraceStore) -> Optional[Change]:
+        if not self.undo_stack:
+            return None
+        change = self._load(self.undo_stack.pop())
+        change.revert(store)
+        self.redo_stack.append(change)
+        return change
+
+    def redo(self, store: TraceStore) -> Optional[Change]:
+        if not self.redo_stack:
+            return None
+        change = self.redo_stack.pop()
+        change.apply(store)
+        self.undo_stack.append(change)
+        self._enforce()
+        return change
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.memory = 0
+        self._reset_disk()
+
+    def _drop_redo(self):
+        for change in self.redo_stack:
+            self.memory -= change.size
+        self.redo_stack.clear()
+
+    def _load(self, entry: Union[Change, _Spilled]) -> Change:
+        if isinstance(entry, Change):
+            return entry
+        self._spilled -= 1
+        self._file.seek(entry.offset)
+        change = pickle.loads(self._file.read(entry.length))
+        self.memory += change.size
+        if not self._spilled:
+            self._reset_disk()
+        return change
+
+    def _enforce(self):
+        stack = self.undo_stack
+        i = self._spilled
+        while self.memory > self.budget and i < len(stack) - 1:
+            change = stack[i]
+            self.memory -= change.size
+            if self.spill:
+                stack[i] = self._write(change)
+                self._spilled += 1
+                i += 1
+            else:
+                del stack[i]
+        while self._disk > self.disk_budget and self._spilled:
+            # Lo más viejo del disco se pierde; el espacio se recupera al vaciarse
+            entry = stack.popleft()
+            self._spilled -= 1
+            self._disk -= entry.length
+
+    def _write(self, change: Change) -> _Spilled:
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix="paint-historial-")
+        data = pickle.dumps(change, pickle.HIGHEST_PROTOCOL)
+        self._file.seek(0, 2)
+        entry = _Spilled(self._file.tell(), len(data))
+        self._file.write(data)
+        self._disk += len(data)
+        return entry
+
+    def _reset_disk(self):
+        self._spilled = 0
+        self._disk = 0
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,221 @@
+from typing import Callable, Iterable, Optional
+import arcade
+from arcade.gl import geometry
+from records import Trace
+from render import ActiveTrace
+from spatial import Box
+from store import TraceStore
+from tiles import BLEND_INTO_TILE, BLEND_TILE
+
+# Muestras por píxel al dibujar una capa en su textura: las mismas que la ventana
+# (arcade.Window pide 4), así el resultado se ve igual que dibujar directo en pantalla
+SAMPLES = 4
+OPACITY_STEP = 0.1
+
+# Mezcla de la textura de una capa (color premultiplicado) con su opacidad
+_VERTEX = """
+#version 330
+in vec2 in_vert;
+in vec2 in_uv;
+out vec2 uv;
+void main() {
+    gl_Position = vec4(in_vert, 0.0, 1.0);
+    uv = in_uv;
+}
+"""
+_FRAGMENT = """
+#version 330
+uniform sampler2D layer;
+uniform float opacity;
+in vec2 uv;
+out vec4 color;
+void main() {
+    color = texture(layer, uv) * opacity;
+}
+"""
+
+
+class Layer:
+    __slots__ = ("id", "name", "visible", "locked", "opacity")
+
+    def __init__(self, id: int, name: str, visible: bool = True, locked: bool = False, opacity: float = 1.0):
+        self.id = id
+        self.name = name
+        self.visible = visible
+        self.locked = locked
+        self.opacity = opacity
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "name": self.name, "visible": self.visible, "locked": self.locked,
+                "opacity": self.opacity}
+
+    @staticmethod
+    def from_dict(d: dict) -> "Layer":
+        return Layer(d["id"], d.get("name", f"Capa {d['id'] + 1}"), d.get("visible", True), d.get("locked", False),
+                     d.get("opacity", 1.0))
+
+
+class Layers:
+    # Capas del dibujo, de abajo hacia arriba, y la activa (donde van los trazos nuevos).
+    # Los trazos guardan el id de su capa (Trace.layer), que no cambia al reordenar.
+    # Ocultar, bloquear, reordenar y la opacidad no pasan por el historial.
+    def __init__(self):
+        self.order: list[Layer] = [Layer(0, "Capa 1")]
+        self.active = 0
+
+    def get(self, lid: int) -> Layer:
+        return next(layer for layer in self.order if layer.id == lid)
+
+    def current(self) -> Layer:
+        return self.get(self.active)
+
+    def editable(self) -> set[int]:
+        # Capas que el borrador y la selección pueden tocar
+        return {layer.id for layer in self.order if layer.visible and not layer.locked}
+
+    def add(self) -> Layer:
+        # Capa nueva encima de la activa, que pasa a ser la activa
+        lid = max(layer.id for layer in self.order) + 1
+        layer = Layer(lid, f"Capa {lid + 1}")
+        self.order.insert(self.order.index(self.current()) + 1, layer)
+        self.active = lid
+        return layer
+
+    def ensure(self, ids: Iterable[int]):
+        # Trazos de capas que no están en la lista (de un colaborador o de un archivo sin
+        # cabecera): la capa se agrega arriba de todo
+        known = {layer.id for layer in self.order}
+        for lid in sorted(set(ids) - known):
+            self.order.append(Layer(lid, f"Capa {lid + 1}"))
+
+    def select(self, step: int):
+        # Activa la capa de arriba (step 1) o de abajo (-1)
+        i = self.order.index(self.current()) + step
+        if 0 <= i < len(self.order):
+            self.active = self.order[i].id
+
+    def move(self, step: int):
+        # Sube o baja la capa activa un lugar
+        i = self.order.index(self.current())
+        j = i + step
+        if 0 <= j < len(self.order):
+            self.order[i], self.order[j] = self.order[j], self.order[i]
+
+    def key(self) -> tuple:
+        return (self.active, tuple((layer.id, layer.name, layer.visible, layer.locked, layer.opacity)
+                                   for layer in self.order))
+
+    def to_dict(self) -> dict:
+        # Cabecera de capas de dibujo.txt, del .pntb y del diario
+        return {"layers": [layer.to_dict() for layer in self.order], "active": self.active}
+
+    def header(self) -> Optional[dict]:
+        # Como to_dict, pero None si sigue la única capa de partida tal cual: así un dibujo
+        # sin capas se guarda sin cabecera, igual que antes de las capas
+        if self.key() == Layers().key():
+            return None
+        return self.to_dict()
+
+    def load(self, d: Optional[dict]):
+        # En el lugar: la caché de capas comparte este objeto
+        order = [Layer.from_dict(item) for item in (d or {}).get("layers", [])]
+        self.order = order or [Layer(0, "Capa 1")]
+        ids = {layer.id for layer in self.order}
+        self.active = d.get("active", self.order[0].id) if d else 0
+        if self.active not in ids:
+            self.active = self.order[-1].id
+
+
+class _Target:
+    __slots__ = ("cache", "fbo", "key")
+
+    def __init__(self, cache, fbo):
+        self.cache = cache
+        self.fbo = fbo
+        # Último trazo terminado, vista y zoom con los que se dibujó la textura
+        self.key: Optional[tuple] = None
+
+
+class LayerCache:
+    # Una caché de trazos por capa (ViewCache o TileCache, la que arme `make`) sobre el
+    # TraceStore de esa capa, dibujada en una textura del tamaño del lienzo. Una capa se
+    # vuelve a dibujar en su textura solo si cambiaron sus trazos (rangos sucios o trazos
+    # nuevos en su TraceStore) o la vista; si no, el cuadro solo mezcla las texturas de las
+    # capas visibles, de abajo hacia arriba, con su opacidad, más el trazo en curso encima
+    # de su capa. Reordenar, ocultar o cambiar la opacidad solo cambia la mezcla.
+    def __init__(self, layers: Layers, width: int, height: int, make: Callable[[], object], samples: int = SAMPLES):
+        self.ctx = arcade.get_window().ctx
+        self.layers = layers
+        self.width = width
+        self.height = height
+        self.make = make
+        self.targets: dict[int, _Target] = {}
+        self.active = ActiveTrace()
+        self.renders = 0
+        self._active_layer: Optional[int] = None
+        self._quad = geometry.quad_2d_fs()
+        self._program = self.ctx.program(vertex_shader=_VERTEX, fragment_shader=_FRAGMENT)
+        samples = min(samples, self.ctx.info.MAX_SAMPLES)
+        self._scratch = None
+        if samples > 1:
+            self._scratch = self.ctx.framebuffer(
+                color_attachments=[self.ctx.texture((width, height), samples=samples)])
+
+    def memory(self) -> int:
+        return len(self.targets) * self.width * self.height * 4
+
+    def sync(self, store: TraceStore, tools: dict, committed: int, view: Optional[Box] = None, zoom: float = 1.0):
+        # Con la cámara del lienzo activa. Los rangos sucios del TraceStore principal no se
+        # usan: cada capa lleva los suyos
+        store.take_dirty()
+        self._active_layer = store[-1].layer if committed < len(store) else None
+        for layer in self.layers.order:
+            sub = store.layers.get(layer.id)
+            if not layer.visible or sub is None:
+                continue
+            target = self.targets.get(layer.id)
+            if target is None:
+                fbo = self.ctx.framebuffer(color_attachments=[self.ctx.texture((self.width, self.height))])
+                target = self.targets[layer.id] = _Target(self.make(), fbo)
+            # El trazo en curso es el último de su capa y se dibuja aparte
+            n = len(sub) - (layer.id == self._active_layer)
+            key = (sub.seq_at(n - 1) if n else -1, view, zoom)
+            if key == target.key and not sub.dirty:
+                continue
+            target.cache.sync(sub, tools, n, view, zoom)
+            self._render(target)
+            target.key = key
+
+    def _render(self, target: _Target):
+        ctx = self.ctx
+        fbo = self._scratch or target.fbo
+        blend = ctx.blend_func
+        with fbo.activate():
+            fbo.clear(color=(0, 0, 0, 0))
+            ctx.enable(ctx.BLEND)
+            ctx.blend_func = BLEND_INTO_TILE
+            target.cache.draw()
+        ctx.blend_func = blend
+        if fbo is not target.fbo:
+            with target.fbo.activate():
+                ctx.copy_framebuffer(fbo, target.fbo)
+        self.renders += 1
+
+    def draw(self, active: Optional[Callable[[], None]] = None):
+        # active dibuja el trazo en curso, justo encima de su capa
+        ctx = self.ctx
+        blend = ctx.blend_func
+        for layer in self.layers.order:
+            target = self.targets.get(layer.id)
+            if layer.visible and target is not None and target.key is not None:
+                ctx.enable(ctx.BLEND)
+                ctx.blend_func = BLEND_TILE
+                target.fbo.color_attachments[0].use(0)
+                self._program["opacity"] = layer.opacity
+                self._quad.render(self._program)
+                ctx.blend_func = blend
+            if layer.id == self._active_layer and active is not None:
+                active()
+
+    def draw_active(self, tool, trace: Trace):
+        self.active.draw(tool, trace)
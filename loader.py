@@ -0,0 +1,158 @@
+import json
+import os
+import queue
+import threading
+from typing import Iterator, Optional, TextIO
+from autosave import is_journal, recover
+from binformat import BinaryDrawing, is_binary
+from records import Trace, from_dict
+
+# Trazos por tanda que pasa del hilo de carga a la vista
+CHUNK = 200
+# Tandas listas esperando a la vista; con la cola llena el hilo espera
+QUEUE_MAX = 128
+# Caracteres leídos por vez del JSON
+READ = 1 << 20
+# Para la cabecera de capas alcanza con el principio del archivo (o el final del diario)
+HEADER_READ = 1 << 12
+TAIL_READ = 1 << 16
+
+Chunk = list[tuple[int, Trace]]
+
+
+def iter_json(f: TextIO, size: int = READ) -> Iterator[dict]:
+    # Lee una lista JSON de objetos de a pedazos y devuelve cada objeto apenas se completa,
+    # sin tener el archivo entero en memoria. Un objeto cortado al final del pedazo no se
+    # puede decodificar: se lee el pedazo siguiente y se vuelve a intentar.
+    decoder = json.JSONDecoder()
+    buf = f.read(size)
+    pos = len(buf) - len(buf.lstrip())
+    if buf[pos:pos + 1] != "[":
+        raise ValueError("Se esperaba una lista de trazos")
+    pos += 1
+    eof = False
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buf) and buf[pos] == "]":
+            return
+        try:
+            obj, pos = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            more = f.read(size)
+            eof = not more
+            buf = buf[pos:] + more
+            pos = 0
+            continue
+        yield obj
+
+
+def _journal_layers(path: str) -> Optional[dict]:
+    # La última operación "layers" del diario, leyendo de atrás para adelante de a
+    # TAIL_READ bytes. Después de compactar está en la segunda línea y las que se agregan
+    # van al final, así que casi siempre alcanza con la cola del archivo.
+    prefix = b'{"op": "layers"'
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        rest = b""
+        while end > 0:
+            start = max(0, end - TAIL_READ)
+            f.seek(start)
+            lines = (f.read(end - start) + rest).split(b"\n")
+            # La primera puede estar incompleta: se completa con el bloque anterior
+            rest = lines.pop(0) if start else b""
+            for line in reversed(lines):
+                if line.startswith(prefix):
+                    try:
+                        return json.loads(line)["layers"]
+                    except json.JSONDecodeError:
+                        # Última línea cortada por un cierre abrupto
+                        continue
+            end = start
+    return None
+
+
+def read_layers(path: str) -> Optional[dict]:
+    # Cabecera de capas (layers.Layers.to_dict) del dibujo, sin leer los trazos; None si
+    # no tiene. En el diario vale la última operación "layers".
+    if is_journal(path):
+        return _journal_layers(path)
+    if is_binary(path):
+        with BinaryDrawing(path) as drawing:
+            return drawing.layers
+    with open(path, "r", encoding="utf-8") as f:
+        for d in iter_json(f, HEADER_READ):
+            return None if "tool" in d else d
+    return None
+
+
+def read_chunks(path: str, chunk: int = CHUNK) -> Iterator[tuple[float, Chunk]]:
+    # Tandas de (secuencia, trazo) en orden cronológico con la fracción leída del archivo.
+    # El diario se recupera entero primero (puede borrar trazos ya agregados).
+    if is_journal(path):
+        store = recover(path)
+        items = list(store.items())
+        for i in range(0, len(items), chunk):
+            yield min(1.0, (i + chunk) / len(items)), items[i:i + chunk]
+        return
+    if is_binary(path):
+        with BinaryDrawing(path) as drawing:
+            n = len(drawing)
+            for i in range(0, n, chunk):
+                yield min(1.0, (i + chunk) / n), [(k, drawing[k]) for k in range(i, min(n, i + chunk))]
+        return
+    total = os.path.getsize(path) or 1
+    with open(path, "r", encoding="utf-8") as f:
+        # Posición en bytes del archivo (lo ya leído por los búferes)
+        raw = f.buffer.raw
+        out: Chunk = []
+        seq = 0
+        for d in iter_json(f):
+            if "tool" not in d:
+                # Cabecera de capas (read_layers)
+                continue
+            out.append((seq, from_dict(d)))
+            seq += 1
+            if len(out) == chunk:
+                yield min(1.0, raw.tell() / total), out
+                out = []
+        yield 1.0, out
+
+
+class Loader:
+    # Carga un dibujo en un hilo aparte y lo entrega de a tandas: la vista toma las que
+    # estén listas en cada cuadro (take) y las agrega al TraceStore, así el lienzo se va
+    # llenando mientras la ventana sigue respondiendo. La cabecera de capas también se lee en
+    # el hilo y llega antes que la primera tanda.
+    def __init__(self, path: str, chunk: int = CHUNK):
+        self.path = path
+        self.progress = 0.0
+        self.count = 0
+        self.error: Optional[Exception] = None
+        self._queue: queue.Queue = queue.Queue(QUEUE_MAX)
+        self._thread = threading.Thread(target=self._run, args=(chunk,), name="carga", daemon=True)
+        self._thread.start()
+
+    def _run(self, chunk: int):
+        try:
+            self._queue.put((0.0, read_layers(self.path), []))
+            for progress, items in read_chunks(self.path, chunk):
+                self._queue.put((progress, None, items))
+        except Exception as e:
+            self.error = e
+
+    def take(self) -> Iterator[tuple[Optional[dict], Chunk]]:
+        # (cabecera de capas o None, tanda) ya leídas, sin esperar
+        while True:
+            try:
+                progress, layers, items = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self.progress = progress
+            self.count += len(items)
+            yield layers, items
+
+    def done(self) -> bool:
+        return not self._thread.is_alive() and self._queue.empty()
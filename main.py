@@ -1,11 +1,41 @@
 import arcade
 import json
+import os
+import random
+import time
+from array import array
+from functools import partial
 from typing import Callable, Optional
-from tool import PencilTool, MarkerTool, SprayTool, EraserTool, LineTool, RectTool, CircleTool, CellTool
+from arcade import shape_list
+from arcade.shape_list import Shape
+from tool import PencilTool, MarkerTool, SprayTool, EraserTool, LineTool, RectTool, CircleTool, CellTool, SelectTool, \
+    ring_shape
+from autosave import Journal, backup, is_journal, save_async
+from cells import flood_fill, paint_cells
+from binformat import write_binary
+from svg import write_svg
+from layers import OPACITY_STEP, LayerCache, Layers
+from loader import Chunk, Loader, read_chunks, read_layers
+from collab import ADD, APPEND, SHAPE, REMOVE, CLEAR, PORT, POINT, Client, Gid, Message, add, append, clear, \
+    coords_of, remove, shape, trace_of
+from render import ViewCache
+from tiles import TILE, BUDGET as TILE_BUDGET, TileCache
+from store import TraceStore
+from history import Change, History
+from records import Trace, StrokeTrace, SprayTrace, ShapeTrace, flatten
+from simplify import TOLERANCE, far_enough, rdp, simplify_items
+from ui import GridLayer, RetainedShapes, TextLayer
+from profiler import Profiler, ProfilerHUD, timed
+from session import DRAG, FRAME, KEY, PRESS, RELEASE, SCROLL, Recorder, fingerprint, recorded
+from viewport import Viewport, ZOOM_STEP
 
 WIDTH = 980
 HEIGHT = 640
 TITLE = "paint :]"
+AUTOSAVE = "autosave.journal"
+PROFILE = "perfil.json"
+# Tiempo por cuadro para agregar tandas de la carga en segundo plano
+LOAD_BUDGET = 0.008
 MARGIN = 14
 TOOLBAR_H = 170
 TOOL_BTN_W = 140
@@ -18,6 +48,9 @@ UI_BORDER = arcade.color.DARK_SLATE_GRAY
 UI_TEXT = arcade.color.BLACK
 UI_MUTED = (70, 70, 70)
 CANVAS_BORDER = arcade.color.LIGHT_STEEL_BLUE
+# Lista de capas sobre el lienzo
+LAYERS_W = 210
+LAYERS_BG = (245, 245, 245, 220)
 
 PALETTE = [
     ("Negro (Q)", arcade.color.BLACK, arcade.key.Q),
@@ -32,47 +65,57 @@ PALETTE = [
     ("Gris (L)", arcade.color.GRAY, arcade.key.L),
 ]
 
+# Herramienta que dibuja los trazos de cada tipo al cargar un dibujo
+TOOLS = {"PENCIL": PencilTool, "MARKER": MarkerTool, "SPRAY": SprayTool, "ERASER": EraserTool,
+         "LINE": LineTool, "RECT": RectTool, "CIRCLE": CircleTool, "CELL": CellTool}
+
+
+def _rect(left: float, right: float, bottom: float, top: float, color) -> Shape:
+    return shape_list.create_rectangle_filled((left + right) / 2, (bottom + top) / 2, right - left, top - bottom, color)
+
+
+def _rect_outline(left: float, right: float, bottom: float, top: float, color, border: float) -> Shape:
+    return shape_list.create_rectangle_outline((left + right) / 2, (bottom + top) / 2, right - left, top - bottom, color, border)
+
 
 class Button:
-    def __init__(self, x: float, y: float, w: float, h: float, text: str, on_click: Callable[[], None]):
+    def __init__(self, x: float, y: float, w: float, h: float, text: str, on_click: Callable[[], None], texts: TextLayer):
         self.x, self.y, self.w, self.h = x, y, w, h
         self.text = text
         self.on_click = on_click
         self.hover = False
         self.active = False
+        self.label = texts.text(text, x + 12, y + h/2 - 8, UI_TEXT, 12)
 
     def contains(self, px: float, py: float) -> bool:
         return self.x <= px <= self.x + self.w and self.y <= py <= self.y + self.h
 
-    def draw_base(self):
-        arcade.draw_lrbt_rectangle_filled(self.x + 2, self.x + self.w + 2, self.y, self.y + self.h, UI_SHADOW)
+    def shapes(self) -> list[Shape]:
         fill = (232, 236, 239) if self.active else (230, 230, 230) if self.hover else (224, 224, 224)
-        arcade.draw_lrbt_rectangle_filled(self.x, self.x + self.w, self.y, self.y + self.h, fill)
         thick = 3 if self.active else 2
-        arcade.draw_lrbt_rectangle_outline(self.x, self.x + self.w, self.y, self.y + self.h, UI_BORDER, thick)
-
-    def draw(self):
-        self.draw_base()
-        arcade.draw_text(self.text, self.x + 12, self.y + self.h/2 - 8, UI_TEXT, 12)
+        return [
+            _rect(self.x + 2, self.x + self.w + 2, self.y, self.y + self.h, UI_SHADOW),
+            _rect(self.x, self.x + self.w, self.y, self.y + self.h, fill),
+            _rect_outline(self.x, self.x + self.w, self.y, self.y + self.h, UI_BORDER, thick),
+        ]
 
 
 class ToolButton(Button):
-    def __init__(self, x, y, w, h, text, on_click, kind: str):
-        super().__init__(x, y, w, h, text, on_click)
+    def __init__(self, x, y, w, h, text, on_click, texts, kind: str):
+        super().__init__(x, y, w, h, text, on_click, texts)
         self.kind = kind
 
-    def draw(self):
-        self.draw_base()
-        arcade.draw_text(self.text, self.x + 12, self.y + self.h/2 - 8, UI_TEXT, 12)
+    def shapes(self) -> list[Shape]:
+        out = super().shapes()
         pad = 6
         icon_w = 40
         left = self.x + self.w - icon_w - pad
         right = self.x + self.w - pad
         mid_y = self.y + self.h / 2
         if self.kind == "pencil":
-            arcade.draw_line(left + 6, mid_y, right - 6, mid_y, UI_MUTED, 2)
+            out.append(shape_list.create_line(left + 6, mid_y, right - 6, mid_y, UI_MUTED, 2))
         elif self.kind == "marker":
-            arcade.draw_line(left + 6, mid_y, right - 6, mid_y, UI_MUTED, 8)
+            out.append(shape_list.create_line(left + 6, mid_y, right - 6, mid_y, UI_MUTED, 8))
         elif self.kind == "spray":
             cx = (left + right) / 2
             cy = mid_y
@@ -80,76 +123,280 @@ class ToolButton(Button):
             for i in range(12):
                 dx = (i % 4) * 4
                 dy = (i // 4) * 4
-                arcade.draw_point(sx + dx, sy + dy, UI_MUTED, 2)
+                out.append(shape_list.create_rectangle_filled(sx + dx, sy + dy, 2, 2, UI_MUTED))
         elif self.kind == "eraser":
             l = left + 8
             r = right - 8
             t = mid_y + 9
             b = mid_y - 9
-            arcade.draw_lrbt_rectangle_filled(l, r, b, t, arcade.color.LIGHT_GRAY)
-            arcade.draw_lrbt_rectangle_outline(l, r, b, t, UI_BORDER, 2)
+            out.append(_rect(l, r, b, t, arcade.color.LIGHT_GRAY))
+            out.append(_rect_outline(l, r, b, t, UI_BORDER, 2))
+        return out
 
 
 class CircleButton:
-    def __init__(self, cx: float, cy: float, r: float, color, name: str, on_click: Callable[[], None]):
+    def __init__(self, cx: float, cy: float, r: float, color, name: str, on_click: Callable[[], None], texts: TextLayer):
         self.cx, self.cy, self.r = cx, cy, r
         self.color = color
         self.name = name
         self.on_click = on_click
         self.hover = False
         self.active = False
+        self.label = texts.text(name, cx - r, cy - r - 16, UI_MUTED, 11)
 
     def contains(self, px: float, py: float) -> bool:
         return (px - self.cx) ** 2 + (py - self.cy) ** 2 <= self.r ** 2
 
-    def draw(self):
+    def shapes(self) -> list[Shape]:
         ring = 3 if self.active else (2 if self.hover else 1)
-        arcade.draw_circle_filled(self.cx, self.cy, self.r, self.color)
-        arcade.draw_circle_outline(self.cx, self.cy, self.r, UI_BORDER, ring)
-        arcade.draw_text(self.name, self.cx - self.r, self.cy - self.r - 16, UI_MUTED, 11)
+        return [
+            shape_list.create_ellipse_filled(self.cx, self.cy, self.r * 2, self.r * 2, self.color),
+            ring_shape(self.cx, self.cy, self.r, ring, UI_BORDER),
+        ]
+
+
+# Al guardar, las transformaciones de la herramienta de selección se aplican a las coordenadas.
+# La cabecera de capas (si no es la capa única de partida) va primero en el JSON y al final
+# en el binario.
+
+def _write_json(path: str, traces: list, layers: Optional[dict] = None):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(([layers] if layers else []) + [flatten(tr).to_dict() for tr in traces], f)
+
+
+def _write_binary(path: str, traces: list, layers: Optional[dict] = None):
+    write_binary(path, map(flatten, traces), layers=layers)
 
 
 class Paint(arcade.View):
-    def __init__(self, load_path: Optional[str] = None):
+    def __init__(self, load_path: Optional[str] = None, autosave_path: str = AUTOSAVE,
+                 tiles: bool = False, tile_size: int = TILE, tile_budget: int = TILE_BUDGET, profile: bool = False,
+                 continuous: bool = False, progressive: bool = False, server: Optional[str] = None):
         super().__init__()
         self.background_color = arcade.color.WHITE
         self.tool = PencilTool()
-        self.used_tools = {self.tool.name: self.tool}
+        # Una instancia de cada herramienta para dibujar los trazos terminados (un rectángulo
+        # rotado se dibuja con el marcador aunque nadie lo haya usado)
+        self.used_tools = {name: cls() for name, cls in TOOLS.items()}
+        self.used_tools[self.tool.name] = self.tool
         self.color = arcade.color.BLUE
-        self.traces: list[dict] = []
-        self.redo_stack: list[dict] = []
+        self.traces = TraceStore()
+        self.history = History()
+        # Cambios del borrador en el arrastre en curso; van al historial como uno solo al soltar
+        self._erased: list[Change] = []
+        self.tolerance = TOLERANCE
         self.active_shape_index: Optional[int] = None
+        self.drawing = False
+        # Arrastres recibidos desde el último cuadro (x, y, dx, dy, botones) y última
+        # posición del borrador en el mundo, para barrer desde ahí
+        self._drags: list[tuple[int, int, int, int, int]] = []
+        self._erase_from: Optional[tuple[int, int]] = None
+        self.tile_size = tile_size
+        self.tile_budget = tile_budget
+        self.tiles = tiles
+        self.view = Viewport(WIDTH, HEIGHT - TOOLBAR_H)
+        # Capas: los trazos nuevos van a la activa; cada una se dibuja en su propia textura
+        # (LayerCache) y el cuadro las mezcla
+        self.layers = Layers()
+        self._layers_key = None
+        self.layer_texts = TextLayer()
+        self.layer_labels: list[arcade.Text] = []
+        self.trace_cache = self._make_cache(tiles)
         self.show_grid = False
         self.grid_cell = 20
+        self.profiler = Profiler(profile)
+        # Grabación de la sesión (--grabar): los manejadores de entrada y cada cuadro quedan
+        # en el archivo para reproducirlos con replay.py
+        self.recorder: Optional[Recorder] = None
+        self.hud = ProfilerHUD(self.profiler, 8, HEIGHT - TOOLBAR_H - 8)
+        self._points: tuple[tuple, int] = ((), 0)
+        # Redibujo por eventos: solo se dibuja un cuadro si algo cambió desde el último
+        # (ver PaintWindow); continuous vuelve a dibujar siempre
+        self.continuous = continuous
+        self.dirty = True
+        # Con progressive el archivo se lee en un hilo aparte y los trazos se agregan de a
+        # tandas en cada cuadro (_pump_loader); hasta que termina no se puede editar y el
+        # diario de autoguardado se abre al final
+        self.loader: Optional[Loader] = None
+        self.journal: Optional[Journal] = None
+        self._autosave_path = autosave_path
+        # Colaboración (server = "host[:puerto]"): los cambios propios salen en una tanda por
+        # cuadro (_share) y los ajenos se aplican en _pump_remote. Los trazos ajenos reciben
+        # una secuencia local; _gids y _remote la traducen a su id (cliente, id) y de vuelta.
+        # _live es el trazo en curso ya anunciado y lo que se mandó de él.
+        self.collab: Optional[Client] = None
+        self._gids: dict[int, Gid] = {}
+        self._remote: dict[Gid, int] = {}
+        self._live: Optional[tuple[int, object]] = None
+        self._erased_shared = 0
+        if server:
+            host, _, port = server.partition(":")
+            try:
+                self.collab = Client(host, int(port or PORT), on_receive=self._wake)
+                print("Conectado a", server)
+            except OSError as e:
+                print("No se pudo conectar al servidor:", e)
+        recovered = False
         if load_path:
             try:
-                with open(load_path, "r", encoding="utf-8") as f:
-                    self.traces = json.load(f)
-                names = {t.get("tool") for t in self.traces}
-                for nm in names:
-                    if nm == "PENCIL":
-                        self.used_tools[nm] = PencilTool()
-                    elif nm == "MARKER":
-                        self.used_tools[nm] = MarkerTool()
-                    elif nm == "SPRAY":
-                        self.used_tools[nm] = SprayTool()
-                    elif nm == "ERASER":
-                        self.used_tools[nm] = EraserTool()
-                    elif nm == "LINE":
-                        self.used_tools[nm] = LineTool()
-                    elif nm == "RECT":
-                        self.used_tools[nm] = RectTool()
-                    elif nm == "CIRCLE":
-                        self.used_tools[nm] = CircleTool()
-                    elif nm == "CELL":
-                        self.used_tools[nm] = CellTool()
+                if is_journal(load_path):
+                    self._autosave_path = load_path
+                    recovered = True
+                if progressive:
+                    # Las capas también se leen en el hilo de carga (_pump_loader)
+                    self.loader = Loader(load_path)
+                else:
+                    self.layers.load(read_layers(load_path))
+                    for _progress, chunk in read_chunks(load_path):
+                        self._add_loaded(chunk)
             except Exception as e:
                 print("No se pudo cargar el archivo:", e)
+        if not recovered:
+            old = backup(self._autosave_path)
+            if old:
+                print("Autoguardado anterior movido a", old)
+        if self.loader is None:
+            self._loaded()
         self.buttons: list[Button] = []
         self.color_buttons: list[CircleButton] = []
+        self.grid = GridLayer(WIDTH, HEIGHT - TOOLBAR_H, arcade.color.LIGHT_GRAY)
+        self.toolbar = RetainedShapes(self._toolbar_shapes)
         self._build_ui()
         self._sync_active_states()
 
+    def _add_loaded(self, chunk: Chunk):
+        # Los índices del TraceStore se arman a medida que llegan los trazos
+        for seq, tr in chunk:
+            self.traces.insert_seq(seq, tr)
+        self.layers.ensure({tr.layer for _seq, tr in chunk})
+
+    def _pump_loader(self):
+        loader = self.loader
+        if loader is None:
+            return
+        with self.profiler.span("carga", "entrada"):
+            deadline = time.perf_counter() + LOAD_BUDGET
+            for layers, chunk in loader.take():
+                if layers is not None:
+                    self.layers.load(layers)
+                self._add_loaded(chunk)
+                if time.perf_counter() > deadline:
+                    break
+        if loader.done():
+            if loader.error is not None:
+                print("No se pudo cargar el archivo:", loader.error)
+            print(f"Cargados {len(self.traces)} trazos de {loader.path}")
+            self.loader = None
+            self._loaded()
+
+    def _loaded(self):
+        # Con el dibujo ya cargado se abre el diario y, si hay colaboración, se publican sus trazos
+        self.journal = Journal(self._autosave_path, self.traces.items(), self.layers.header())
+        if self.collab:
+            for seq, tr in self.traces.items():
+                self.collab.send(add(self._gid(seq), tr))
+
+    def _wake(self):
+        # Desde el hilo de la red: llegaron mensajes
+        self.dirty = True
+
+    def _gid(self, seq: int) -> Gid:
+        return self._gids.get(seq) or (self.collab.me, seq)
+
+    def _share(self):
+        # Cambios propios del cuadro: el trazo en curso (nuevo, puntos agregados o extremo
+        # de la figura) y lo borrado en el arrastre; sale todo en una tanda con lo que ya
+        # hayan encolado _log y _clear_canvas
+        collab = self.collab
+        if collab is None:
+            return
+        if self.drawing and self.traces:
+            seq, tr = self.traces.seq_at(-1), self.traces[-1]
+            gid = self._gid(seq)
+            sent = (tr.x2, tr.y2) if isinstance(tr, ShapeTrace) else len(tr.coords)
+            if self._live is None or self._live[0] != seq:
+                collab.send(add(gid, tr))
+            elif isinstance(tr, ShapeTrace):
+                if sent != self._live[1]:
+                    collab.send(shape(gid, *sent))
+            elif sent > self._live[1]:
+                collab.send(append(gid, tr.coords[self._live[1]:]))
+            self._live = (seq, sent)
+        self._share_erased()
+        collab.flush()
+
+    def _share_erased(self):
+        # De lo que tocó el borrador sale el estado actual de cada trazo: borrado, o la copia
+        # de celdas recortada (un ADD con el mismo id la reemplaza)
+        if self.collab is None:
+            return
+        for change in self._erased[self._erased_shared:]:
+            for seq, _tr in change.removed:
+                if self.traces.get(seq) is None:
+                    self.collab.send(remove(self._gid(seq)))
+            for seq, tr in change.added:
+                if self.traces.get(seq) is tr:
+                    self.collab.send(add(self._gid(seq), tr))
+        self._erased_shared = len(self._erased)
+
+    def _pump_remote(self):
+        # Aplica los mensajes recibidos con el mismo tope de tiempo por cuadro que la carga.
+        # Mientras se dibuja esperan: el trazo en curso tiene que seguir siendo el último
+        collab = self.collab
+        if collab is None or self.drawing or self.loader or getattr(self.tool, "lifted", None):
+            return
+        with self.profiler.span("remoto", "entrada"):
+            deadline = time.perf_counter() + LOAD_BUDGET
+            inbox = collab.inbox
+            while inbox and time.perf_counter() < deadline:
+                self._apply_remote(inbox.popleft())
+        if collab.closed and not inbox:
+            print("Se cerró la conexión con el servidor")
+            self.collab = None
+
+    def _apply_remote(self, msg: Message):
+        kind, gid = msg[0], msg[1:3]
+        if kind == CLEAR:
+            self.traces.clear()
+            self.journal.cleared()
+            return
+        seq = gid[1] if gid[0] == self.collab.me else self._remote.get(gid)
+        old = self.traces.get(seq) if seq is not None else None
+        if kind == REMOVE:
+            if old is not None:
+                self.traces.remove_seq(seq)
+                self.journal.removed([seq])
+            return
+        # Los puntos de un trazo en curso se agregan en el lugar, como al dibujar: todavía no
+        # está en el diario ni en el historial. Lo demás se reemplaza entero, porque el diario,
+        # el historial y las cachés comparten los registros
+        if kind == APPEND and isinstance(old, (StrokeTrace, SprayTrace)):
+            self.traces.extend(old, coords_of(msg))
+            return
+        if kind == ADD:
+            tr = trace_of(msg)
+            self.layers.ensure((tr.layer,))
+        elif kind == SHAPE and isinstance(old, ShapeTrace):
+            tr = ShapeTrace(old.tool, old.color, old.x1, old.y1, *POINT.unpack(msg[3]), old.width)
+        else:
+            return
+        if kind != ADD:
+            tr.layer = old.layer
+        if old is not None:
+            self.traces.remove_seq(seq)
+        if seq is None:
+            self.traces.append(tr)
+            seq = self.traces.seq_of(tr)
+            self._gids[seq] = gid
+            self._remote[gid] = seq
+        else:
+            self.traces.insert_seq(seq, tr)
+        # Los puntos del trazo en curso no van al diario: llegan enteros con su ADD al soltar
+        if kind == ADD:
+            if old is not None:
+                self.journal.removed([seq])
+            self.journal.added(seq, tr)
+
     def _build_ui(self):
         tools = [
             ("Lápiz (1)", lambda: PencilTool(), "pencil"),
@@ -162,13 +409,15 @@ class Paint(arcade.View):
             ("Celdas (8)", lambda: CellTool(cell=20), "pencil"),
         ]
         self.buttons.clear()
+        self.texts = TextLayer()
         cols = 4
         for i, (label, ctor, kind) in enumerate(tools):
             col = i % cols
             row = i // cols
             x = MARGIN + col * (TOOL_BTN_W + GAP)
             y = HEIGHT - (row + 1) * (TOOL_BTN_H + 8) - 8
-            btn = ToolButton(x, y, TOOL_BTN_W, TOOL_BTN_H, label, on_click=lambda c=ctor: self._set_tool(c()), kind=kind)
+            btn = ToolButton(x, y, TOOL_BTN_W, TOOL_BTN_H, label, on_click=lambda c=ctor: self._set_tool(c()),
+                             texts=self.texts, kind=kind)
             self.buttons.append(btn)
         start_x = MARGIN + cols * (TOOL_BTN_W + GAP) + 18
         r = 12
@@ -184,17 +433,89 @@ class Paint(arcade.View):
             row = i // color_cols
             cx = start_x + col * gap_x
             cy = row_start_y - row * gap_y
-            cb = CircleButton(cx, cy, r, color, label, on_click=lambda c=color: self._set_color(c))
+            cb = CircleButton(cx, cy, r, color, label, on_click=lambda c=color: self._set_color(c), texts=self.texts)
             self.color_buttons.append(cb)
         ctrl_x = WIDTH - MARGIN - 108
-        save_btn = Button(ctrl_x, HEIGHT - TOOLBAR_H + 122, 100, 30, "Guardar (O)", on_click=self._save)
-        clear_btn = Button(ctrl_x, HEIGHT - TOOLBAR_H + 86, 100, 30, "Limpiar", on_click=self._clear_canvas)
-        undo_btn = Button(ctrl_x, HEIGHT - TOOLBAR_H + 50, 100, 28, "Deshacer (Z)", on_click=self._undo)
-        redo_btn = Button(ctrl_x, HEIGHT - TOOLBAR_H + 20, 100, 28, "Rehacer (Y)", on_click=self._redo)
-        size_minus = Button(MARGIN + 260, HEIGHT - TOOLBAR_H + 10, 34, 28, "−", on_click=self._size_down)
-        size_plus = Button(MARGIN + 298, HEIGHT - TOOLBAR_H + 10, 34, 28, "+", on_click=self._size_up)
-        grid_btn = Button(MARGIN + 338, HEIGHT - TOOLBAR_H + 10, 110, 28, "Cuadrícula (G)", on_click=self._toggle_grid)
-        self.buttons += [save_btn, clear_btn, undo_btn, redo_btn, size_minus, size_plus, grid_btn]
+        save_btn = Button(ctrl_x, HEIGHT - TOOLBAR_H + 122, 100, 30, "Guardar (O)", on_click=self._save, texts=self.texts)
+        clear_btn = Button(ctrl_x, HEIGHT - TOOLBAR_H + 86, 100, 30, "Limpiar", on_click=self._clear_canvas, texts=self.texts)
+        undo_btn = Button(ctrl_x, HEIGHT - TOOLBAR_H + 50, 100, 28, "Deshacer (Z)", on_click=self._undo, texts=self.texts)
+        redo_btn = Button(ctrl_x, HEIGHT - TOOLBAR_H + 20, 100, 28, "Rehacer (Y)", on_click=self._redo, texts=self.texts)
+        size_minus = Button(MARGIN + 260, HEIGHT - TOOLBAR_H + 10, 34, 28, "−", on_click=self._size_down, texts=self.texts)
+        size_plus = Button(MARGIN + 298, HEIGHT - TOOLBAR_H + 10, 34, 28, "+", on_click=self._size_up, texts=self.texts)
+        grid_btn = Button(MARGIN + 338, HEIGHT - TOOLBAR_H + 10, 110, 28, "Cuadrícula (G)", on_click=self._toggle_grid, texts=self.texts)
+        svg_btn = Button(MARGIN + 338, HEIGHT - TOOLBAR_H + 44, 110, 26, "SVG (E)", on_click=self._export_svg, texts=self.texts)
+        self.buttons += [save_btn, clear_btn, undo_btn, redo_btn, size_minus, size_plus, grid_btn, svg_btn]
+        self.current_label = self.texts.text("Actual:", MARGIN, HEIGHT - TOOLBAR_H + 12, UI_TEXT, 14)
+        self.tool_label = self.texts.text(self.tool.name.title(), MARGIN + 102, HEIGHT - TOOLBAR_H + 16, UI_MUTED, 14)
+        self.zoom_label = self.texts.text("", MARGIN + 460, HEIGHT - TOOLBAR_H + 16, UI_MUTED, 12)
+        self.load_label = self.texts.text("", MARGIN + 460, HEIGHT - TOOLBAR_H + 40, UI_MUTED, 12)
+
+    def _toolbar_shapes(self) -> list[Shape]:
+        out = [
+            _rect(0, WIDTH, HEIGHT - TOOLBAR_H + 4, HEIGHT + 4, UI_SHADOW),
+            _rect(0, WIDTH, HEIGHT - TOOLBAR_H, HEIGHT, UI_BG),
+            _rect_outline(0, WIDTH, HEIGHT - TOOLBAR_H, HEIGHT, UI_BORDER, 2),
+        ]
+        for b in self.buttons:
+            out += b.shapes()
+        for cb in self.color_buttons:
+            out += cb.shapes()
+        out.append(_rect(MARGIN + 60, MARGIN + 94, HEIGHT - TOOLBAR_H + 10, HEIGHT - TOOLBAR_H + 44, self.color))
+        out.append(_rect_outline(MARGIN + 60, MARGIN + 94, HEIGHT - TOOLBAR_H + 10, HEIGHT - TOOLBAR_H + 44, UI_BORDER, 2))
+        out.append(_rect_outline(0, WIDTH, 0, HEIGHT - TOOLBAR_H, CANVAS_BORDER, 2))
+        if self.loader:
+            # Barra de progreso de la carga sobre el borde inferior de la barra
+            out.append(_rect(0, WIDTH * self.loader.progress, HEIGHT - TOOLBAR_H, HEIGHT - TOOLBAR_H + 3, UI_BORDER))
+        return out
+
+    def _toolbar_key(self) -> tuple:
+        # Todo lo que cambia el aspecto de la barra; si no cambia, no se rearma
+        return (tuple(b.hover + 2 * b.active for b in self.buttons),
+                tuple(cb.hover + 2 * cb.active for cb in self.color_buttons), tuple(self.color),
+                self.loader and round(self.loader.progress, 2))
+
+    def _draw_ui(self):
+        with self.profiler.span("barra"):
+            self.toolbar.draw(self._toolbar_key())
+            self.tool_label.text = self.tool.name.title() + (" (cubeta)" if getattr(self.tool, "fill", False) else "")
+            self.zoom_label.text = f"Zoom {self.view.zoom:.0%}"
+            self.load_label.text = f"Cargando {self.loader.progress:.0%}" if self.loader else ""
+            self.texts.draw()
+
+    def _draw_active(self, trace: Trace):
+        # Tiempo por herramienta del trazo en curso (draw_traces o grow_shapes)
+        with self.profiler.span("activo " + trace.tool):
+            self.trace_cache.draw_active(self.used_tools[trace.tool], trace)
+
+    def _draw_layers(self):
+        # Lista de capas arriba a la derecha del lienzo, la de más arriba primero; los textos
+        # se rearman solo cuando cambian las capas
+        key = self.layers.key()
+        if key != self._layers_key:
+            self._layers_key = key
+            # Las etiquetas se guardan: un arcade.Text sin referencias sale del lote
+            self.layer_texts = TextLayer()
+            self.layer_labels = []
+            y = HEIGHT - TOOLBAR_H - 20
+            for layer in reversed(self.layers.order):
+                active = layer.id == self.layers.active
+                state = "" if layer.visible else " · oculta"
+                state += " · bloqueada" if layer.locked else ""
+                self.layer_labels.append(self.layer_texts.text(
+                    f"{'>' if active else ' '} {layer.name}  {layer.opacity:.0%}{state}",
+                    WIDTH - LAYERS_W, y, UI_TEXT if active else UI_MUTED, 11))
+                y -= 16
+        n = len(self.layers.order)
+        top = HEIGHT - TOOLBAR_H - 4
+        arcade.draw_lrbt_rectangle_filled(WIDTH - LAYERS_W - 8, WIDTH - 4, top - 16 * n - 8, top, LAYERS_BG)
+        self.layer_texts.draw()
+
+    def _draw_grid(self):
+        # Con la cámara del lienzo activa: la cuadrícula está en coordenadas del mundo
+        if self.show_grid or self.tool.name == "CELL":
+            with self.profiler.span("cuadrícula"):
+                cell = self.grid_cell if self.tool.name != "CELL" else getattr(self.tool, "cell", 20)
+                self.grid.draw(cell, self.view.box(), self.view.zoom)
 
     def _sync_active_states(self):
         for b in self.buttons:
@@ -222,6 +543,7 @@ class Paint(arcade.View):
             cb.active = (cb.color == self.color)
 
     def _set_tool(self, tool_obj):
+        self._commit()
         self.tool = tool_obj
         self.used_tools[self.tool.name] = self.tool
         self._sync_active_states()
@@ -231,26 +553,131 @@ class Paint(arcade.View):
         self._sync_active_states()
 
     def _save(self):
-        try:
-            with open("dibujo.txt", "w", encoding="utf-8") as f:
-                json.dump(self.traces, f)
-            print("Guardado en dibujo.txt")
-        except Exception as e:
-            print("Error al guardar:", e)
+        if self.loader:
+            return None
+        self._finish_select()
+        return save_async("dibujo.txt", list(self.traces), partial(_write_json, layers=self.layers.header()))
+
+    def _save_binary(self):
+        if self.loader:
+            return None
+        self._finish_select()
+        return save_async("dibujo.pntb", list(self.traces), partial(_write_binary, layers=self.layers.header()))
+
+    def _export_svg(self):
+        # El SVG se escribe por partes en el hilo de guardado; las transformaciones se
+        # aplican al exportar, sin tocar el dibujo
+        if self.loader:
+            return None
+        self._finish_select()
+        return save_async("dibujo.svg", list(self.traces), partial(write_svg, layers=self.layers.header()))
+
+    def _commit(self):
+        # Cierra la acción en curso (trazo dibujado, borrados del arrastre o selección) y la
+        # pasa al historial y al diario
+        self._finish_select()
+        if self.drawing and self.traces:
+            last = self.traces[-1]
+            if isinstance(last, StrokeTrace) and self.tolerance > 0:
+                last.coords = rdp(last.coords, self.tolerance)
+                self.traces.touch(last)
+            self._record(Change(added=[(self.traces.seq_at(-1), last)]))
+        if self._erased:
+            # Lo que no salió todavía hacia el servidor sale ahora, y el cambio ya no se reenvía
+            self._share_erased()
+            change = Change.merge(self._erased)
+            if change.added or change.removed:
+                self._record(change, shared=True)
+            self._erased = []
+            self._erased_shared = 0
+        self.drawing = False
+        self._live = None
+
+    def _finish_select(self):
+        # Suelta la banda de selección o lo que se está transformando
+        if isinstance(self.tool, SelectTool):
+            change = self.tool.finish(self.traces)
+            if change:
+                self._record(change)
+
+    def _delete_selection(self):
+        if isinstance(self.tool, SelectTool) and not self.loader:
+            self._commit()
+            change = self.tool.delete(self.traces)
+            if change:
+                self._record(change)
+
+    def _flatten(self):
+        # Aplica las transformaciones a las coordenadas (lo seleccionado o todo el dibujo)
+        if self.loader:
+            return
+        self._commit()
+        tool = self.tool if isinstance(self.tool, SelectTool) else SelectTool()
+        change = tool.flatten_selection(self.traces)
+        if change:
+            self._record(change)
+        print(f"Transformaciones aplicadas: {len(change.added) if change else 0} trazos")
+
+    def _record(self, change: Change, shared: bool = False):
+        self.history.push(change)
+        self._log(change.added, change.removed, shared)
+
+    def _log(self, added: list[tuple[int, Trace]], removed: list[tuple[int, Trace]], shared: bool = False):
+        # shared: el cambio ya salió hacia el servidor durante el arrastre (_share_erased)
+        self.journal.removed([seq for seq, _tr in removed])
+        for seq, tr in added:
+            self.journal.added(seq, tr)
+        if self.collab and not shared:
+            for seq, _tr in removed:
+                self.collab.send(remove(self._gid(seq)))
+            for seq, tr in added:
+                self.collab.send(add(self._gid(seq), tr))
 
     def _clear_canvas(self):
-        self.traces = []
-        self.redo_stack = []
+        if self.loader:
+            return
+        self._commit()
         self.active_shape_index = None
+        if not self.traces:
+            return
+        items = list(self.traces.items())
+        self.traces.clear()
+        self.history.push(Change(removed=items))
+        self.journal.cleared()
+        if self.collab:
+            self.collab.send(clear())
+
+    def _simplify_document(self):
+        if self.loader:
+            return
+        self._commit()
+        new, old, before, after = simplify_items(self.traces.items(), self.tolerance)
+        if new:
+            change = Change(added=new, removed=old)
+            change.apply(self.traces)
+            self._record(change)
+        print(f"Simplificado: {before} puntos -> {after} ({before - after} quitados)")
+
+    def _set_tolerance(self, tol: float):
+        self.tolerance = max(0.0, tol)
+        print(f"Tolerancia de simplificación: {self.tolerance:g} px")
 
     def _undo(self):
-        if self.traces:
-            self.redo_stack.append(self.traces.pop())
-            self.active_shape_index = None
+        if self.loader:
+            return
+        self._commit()
+        self.active_shape_index = None
+        change = self.history.undo(self.traces)
+        if change:
+            self._log(change.removed, change.added)
 
     def _redo(self):
-        if self.redo_stack:
-            self.traces.append(self.redo_stack.pop())
+        if self.loader:
+            return
+        self._commit()
+        change = self.history.redo(self.traces)
+        if change:
+            self._log(change.added, change.removed)
 
     def _size_down(self):
         if self.tool.name == "MARKER":
@@ -272,10 +699,99 @@ class Paint(arcade.View):
         elif self.tool.name == "CELL":
             self.tool.cell += 1
 
+    def _make_cache(self, tiles: bool) -> LayerCache:
+        # La caché de cada capa: celdas de ShapeElementList o mosaicos rasterizados
+        if tiles:
+            make = lambda: TileCache(WIDTH, HEIGHT - TOOLBAR_H, self.tile_size, self.tile_budget)
+        else:
+            make = ViewCache
+        return LayerCache(self.layers, WIDTH, HEIGHT - TOOLBAR_H, make)
+
+    def _toggle_tiles(self):
+        # Cambia entre las celdas de ShapeElementList y los mosaicos rasterizados; la nueva
+        # caché se arma desde cero con los trazos terminados
+        self.tiles = not self.tiles
+        self.trace_cache = self._make_cache(self.tiles)
+        print("Mosaicos:", "sí" if self.tiles else "no")
+
+    def _layers_changed(self):
+        # Lo seleccionado en una capa que se ocultó o bloqueó deja de estarlo; el diario
+        # guarda las capas
+        if isinstance(self.tool, SelectTool):
+            editable = self.layers.editable()
+            self.tool.selected = [seq for seq in self.tool.selected
+                                  if self.traces.get(seq) is not None and self.traces.get(seq).layer in editable]
+        if self.journal:
+            self.journal.layers(self.layers.to_dict())
+
+    def _new_layer(self):
+        self._commit()
+        self.layers.add()
+        self._layers_changed()
+
+    def _select_layer(self, step: int):
+        self._commit()
+        self.layers.select(step)
+        self._layers_changed()
+
+    def _move_layer(self, step: int):
+        self.layers.move(step)
+        self._layers_changed()
+
+    def _toggle_layer_visible(self):
+        self._commit()
+        layer = self.layers.current()
+        layer.visible = not layer.visible
+        self._layers_changed()
+
+    def _toggle_layer_lock(self):
+        self._commit()
+        layer = self.layers.current()
+        layer.locked = not layer.locked
+        self._layers_changed()
+
+    def _layer_opacity(self, step: float):
+        layer = self.layers.current()
+        layer.opacity = round(min(1.0, max(0.0, layer.opacity + step)), 2)
+        self._layers_changed()
+
+    def _can_draw(self) -> bool:
+        if self.layers.active in self.layers.editable():
+            return True
+        print("La capa activa está oculta o bloqueada")
+        return False
+
     def _toggle_grid(self):
         self.show_grid = not self.show_grid
 
+    def _toggle_fill(self):
+        if self.tool.name == "CELL":
+            self.tool.fill = not self.tool.fill
+
+    def _reset_view(self):
+        self.view.reset()
+
+    def _toggle_profiler(self):
+        self.profiler.enabled = not self.profiler.enabled
+
+    def _export_profile(self):
+        n = self.profiler.export(PROFILE)
+        print(f"Perfil exportado a {PROFILE} ({n} muestras)")
+
+    def _counts(self) -> tuple[int, int]:
+        # Trazos y puntos para el HUD. Los puntos de los trazos terminados se recuentan
+        # solo cuando cambia el documento; los del trazo en curso se suman aparte.
+        active = len(self.traces[-1]) if self.drawing and self.traces else 0
+        key = (len(self.traces), len(self.history.undo_stack), len(self.history.redo_stack), self.drawing)
+        if self._points[0] != key:
+            self._points = (key, sum(len(tr) for tr in self.traces) - active)
+        return len(self.traces), self._points[1] + active
+
+    @recorded(KEY)
+    @timed("on_key_press")
     def on_key_press(self, symbol: int, modifiers: int):
+        self.dirty = True
+        self._flush_drags()
         if symbol == arcade.key.KEY_1:
             self._set_tool(PencilTool())
         elif symbol == arcade.key.KEY_2:
@@ -292,38 +808,92 @@ class Paint(arcade.View):
             self._set_tool(CircleTool())
         elif symbol == arcade.key.KEY_8:
             self._set_tool(CellTool(cell=20))
+        elif symbol == arcade.key.KEY_9:
+            self._set_tool(SelectTool())
         for _label, color, keyc in PALETTE:
             if symbol == keyc:
                 self._set_color(color)
         if symbol == arcade.key.O:
             self._save()
+        if symbol == arcade.key.B:
+            self._save_binary()
+        if symbol == arcade.key.E:
+            self._export_svg()
         if symbol == arcade.key.Z:
             self._undo()
         if symbol == arcade.key.Y:
             self._redo()
         if symbol == arcade.key.G:
             self._toggle_grid()
+        if symbol == arcade.key.T:
+            self._toggle_tiles()
+        if symbol == arcade.key.P:
+            self._simplify_document()
+        if symbol == arcade.key.BRACKETLEFT:
+            self._set_tolerance(self.tolerance - 0.5)
+        if symbol == arcade.key.BRACKETRIGHT:
+            self._set_tolerance(self.tolerance + 0.5)
         if symbol == arcade.key.MINUS:
             self._size_down()
         if symbol == arcade.key.EQUAL:
             self._size_up()
+        if symbol == arcade.key.F3:
+            self._toggle_profiler()
+        if symbol == arcade.key.F4:
+            self._export_profile()
+        if symbol == arcade.key.KEY_0:
+            self._reset_view()
+        if symbol == arcade.key.R:
+            self._toggle_fill()
+        if symbol == arcade.key.DELETE:
+            self._delete_selection()
+        if symbol == arcade.key.U:
+            self._flatten()
+        if symbol == arcade.key.N:
+            self._new_layer()
+        if symbol in (arcade.key.PAGEUP, arcade.key.PAGEDOWN):
+            step = 1 if symbol == arcade.key.PAGEUP else -1
+            if modifiers & arcade.key.MOD_SHIFT:
+                self._move_layer(step)
+            else:
+                self._select_layer(step)
+        if symbol == arcade.key.V:
+            # L ya es el gris de la paleta: el bloqueo va con Shift+V
+            if modifiers & arcade.key.MOD_SHIFT:
+                self._toggle_layer_lock()
+            else:
+                self._toggle_layer_visible()
+        if symbol == arcade.key.COMMA:
+            self._layer_opacity(-OPACITY_STEP)
+        if symbol == arcade.key.PERIOD:
+            self._layer_opacity(OPACITY_STEP)
 
     def _in_canvas(self, x: int, y: int) -> bool:
         return y < HEIGHT - TOOLBAR_H
 
+    def _world(self, x: int, y: int) -> tuple[int, int]:
+        return self.view.to_world(x, y)
+
     def _snap(self, x: int, y: int) -> tuple[int, int]:
         if self.tool.name != "CELL":
             return x, y
         c = getattr(self.tool, "cell", 20)
         return int((x // c) * c), int((y // c) * c)
 
+    @timed("on_mouse_motion")
     def on_mouse_motion(self, x: int, y: int, dx: int, dy: int):
-        for b in self.buttons:
-            b.hover = b.contains(x, y)
-        for cb in self.color_buttons:
-            cb.hover = cb.contains(x, y)
+        # Mover el ratón solo pide un cuadro si cambia el resaltado de algún botón
+        for b in self.buttons + self.color_buttons:
+            hover = b.contains(x, y)
+            if hover != b.hover:
+                b.hover = hover
+                self.dirty = True
 
+    @recorded(PRESS)
+    @timed("on_mouse_press")
     def on_mouse_press(self, x: int, y: int, button: int, modifiers: int):
+        self.dirty = True
+        self._flush_drags()
         if button != arcade.MOUSE_BUTTON_LEFT:
             return
         for cb in self.color_buttons:
@@ -334,104 +904,254 @@ class Paint(arcade.View):
             if b.contains(x, y):
                 b.on_click()
                 return
-        if not self._in_canvas(x, y):
+        # Mientras se carga un dibujo el lienzo solo se mira
+        if not self._in_canvas(x, y) or self.loader:
             return
+        x, y = self._world(x, y)
+        self._commit()
         if self.tool.name == "ERASER":
-            self.tool.erase_at(self.traces, x, y)
-            self.redo_stack.clear()
+            with self.profiler.span("erase_at", "entrada"):
+                self._erased.append(self.tool.erase_at(self.traces, x, y, self.layers.editable()))
+            self._erase_from = (x, y)
+            return
+        if self.tool.name == "SELECT":
+            self.tool.press(self.traces, x, y, self.view.zoom, lasso=bool(modifiers & arcade.key.MOD_SHIFT),
+                            layers=self.layers.editable())
+            return
+        if not self._can_draw():
             return
+        layer = self.layers.active
         if self.tool.name == "SPRAY":
             px, py = self._snap(x, y)
-            points = self.tool.make_spray(px, py)
-            self.traces.append({"tool": "SPRAY", "color": self.color, "points": points})
-            self.redo_stack.clear()
+            spray = SprayTrace(self.color, self.tool.make_spray(px, py))
+            spray.layer = layer
+            self.traces.append(spray)
+            self.drawing = True
             return
         if self.tool.name in ("LINE", "RECT", "CIRCLE"):
             sx, sy = self._snap(x, y)
-            entry = {"tool": self.tool.name, "color": self.color, "start": (sx, sy), "end": (sx, sy), "width": getattr(self.tool, "width", 2)}
+            entry = ShapeTrace(self.tool.name, self.color, sx, sy, sx, sy, getattr(self.tool, "width", 2))
+            entry.layer = layer
             self.traces.append(entry)
             self.active_shape_index = len(self.traces) - 1
-            self.redo_stack.clear()
+            self.drawing = True
             return
         if self.tool.name == "CELL":
+            # La celda (o el relleno de la cubeta) reemplaza a las que ya estaban pintadas
             sx, sy = self._snap(x, y)
-            s = self.tool.cell
-            self.traces.append({"tool": "CELL", "color": self.color, "xy": (sx, sy), "size": s})
-            self.redo_stack.clear()
+            cells = array("i", (sx, sy))
+            if self.tool.fill:
+                with self.profiler.span("flood_fill", "entrada"):
+                    cells = flood_fill(self.traces, self.tool.cell, sx, sy, self.view.box(), layer=layer)
+                if cells is None:
+                    print("Relleno demasiado grande: acerca la vista")
+                    return
+            change = paint_cells(self.traces, self.color, self.tool.cell, cells, layer)
+            if change:
+                self._record(change)
             return
         sx, sy = self._snap(x, y)
-        if self.tool.name == "MARKER":
-            self.traces.append({"tool": self.tool.name, "color": self.color, "trace": [(sx, sy)], "width": self.tool.width})
-        else:
-            self.traces.append({"tool": self.tool.name, "color": self.color, "trace": [(sx, sy)]})
-        self.redo_stack.clear()
+        stroke = StrokeTrace(self.tool.name, self.color, width=self.tool.width if self.tool.name == "MARKER" else None)
+        stroke.add(sx, sy)
+        stroke.layer = layer
+        self.traces.append(stroke)
+        self.drawing = True
 
+    @recorded(DRAG)
+    @timed("on_mouse_drag")
     def on_mouse_drag(self, x: int, y: int, dx: int, dy: int, buttons: int, modifiers: int):
-        if not (buttons & arcade.MOUSE_BUTTON_LEFT):
+        # Solo se encola: los arrastres se procesan juntos una vez por cuadro (_flush_drags)
+        self.dirty = True
+        self._drags.append((x, y, dx, dy, buttons))
+
+    def _flush_drags(self):
+        # Aplica en orden los arrastres encolados: los de desplazamiento mueven la vista y las
+        # posiciones del botón izquierdo dentro del lienzo se pasan juntas a la herramienta.
+        # Salir del lienzo corta el recorrido.
+        if not self._drags:
             return
-        if not self._in_canvas(x, y):
+        drags, self._drags = self._drags, []
+        with self.profiler.span("arrastres", "entrada"):
+            path: list[int] = []
+            for x, y, dx, dy, buttons in drags:
+                if buttons & (arcade.MOUSE_BUTTON_RIGHT | arcade.MOUSE_BUTTON_MIDDLE):
+                    self.view.pan(dx, dy)
+                elif not (buttons & arcade.MOUSE_BUTTON_LEFT):
+                    continue
+                elif self._in_canvas(x, y):
+                    path += self._world(x, y)
+                else:
+                    self._drag_to(path)
+                    path = []
+                    self._erase_from = None
+            self._drag_to(path)
+
+    def _drag_to(self, path: list[int]):
+        # path: posiciones del mundo (x0, y0, x1, y1, ...) de los arrastres de un cuadro
+        if not path or self.loader:
+            return
+        if self.tool.name == "SELECT":
+            self.tool.drag(self.traces, self.used_tools, path)
             return
         if not self.traces:
             return
         if self.tool.name == "ERASER":
-            self.tool.erase_at(self.traces, x, y)
+            if self._erase_from is not None:
+                path = [*self._erase_from, *path]
+            with self.profiler.span("erase_along", "entrada"):
+                self._erased.append(self.tool.erase_along(self.traces, path, self.layers.editable()))
+            self._erase_from = (path[-2], path[-1])
             return
+        if not self.drawing:
+            return
+        points = [self._snap(path[i], path[i + 1]) for i in range(0, len(path), 2)]
         if self.tool.name == "SPRAY":
             last = self.traces[-1]
-            if "points" in last:
-                px, py = self._snap(x, y)
-                last["points"].extend(self.tool.make_spray(px, py))
+            if isinstance(last, SprayTrace):
+                for px, py in points:
+                    last.extend(self.tool.make_spray(px, py))
+                self.traces.touch(last)
             return
         if self.tool.name in ("LINE", "RECT", "CIRCLE"):
             if self.active_shape_index is not None and 0 <= self.active_shape_index < len(self.traces):
-                ex, ey = self._snap(x, y)
-                self.traces[self.active_shape_index]["end"] = (ex, ey)
+                shape = self.traces[self.active_shape_index]
+                shape.x2, shape.y2 = points[-1]
+                self.traces.touch(shape)
             return
         last = self.traces[-1]
-        if "trace" in last:
-            px, py = self._snap(x, y)
-            last["trace"].append((px, py))
+        if isinstance(last, StrokeTrace):
+            n = len(last.coords)
+            for px, py in points:
+                if far_enough(last.coords, px, py, self.tolerance):
+                    last.add(px, py)
+            if len(last.coords) != n:
+                self.traces.touch(last)
 
+    @recorded(RELEASE)
+    @timed("on_mouse_release")
     def on_mouse_release(self, x: int, y: int, button: int, modifiers: int):
+        self.dirty = True
+        self._flush_drags()
         if button != arcade.MOUSE_BUTTON_LEFT:
             return
+        self._erase_from = None
+        self._commit()
         if self.tool.name in ("LINE", "RECT", "CIRCLE"):
             self.active_shape_index = None
 
+    @recorded(SCROLL)
+    @timed("on_mouse_scroll")
+    def on_mouse_scroll(self, x: int, y: int, scroll_x: float, scroll_y: float):
+        self.dirty = True
+        self._flush_drags()
+        if self._in_canvas(x, y):
+            self.view.zoom_at(x, y, ZOOM_STEP ** scroll_y)
+
     def on_draw(self):
-        self.clear()
-        arcade.draw_lrbt_rectangle_filled(0, WIDTH, HEIGHT - TOOLBAR_H + 4, HEIGHT + 4, UI_SHADOW)
-        arcade.draw_lrbt_rectangle_filled(0, WIDTH, HEIGHT - TOOLBAR_H, HEIGHT, UI_BG)
-        arcade.draw_lrbt_rectangle_outline(0, WIDTH, HEIGHT - TOOLBAR_H, HEIGHT, UI_BORDER, 2)
-        for b in self.buttons:
-            b.draw()
-        for cb in self.color_buttons:
-            cb.draw()
-        arcade.draw_text("Actual:", MARGIN, HEIGHT - TOOLBAR_H + 12, UI_TEXT, 14)
-        arcade.draw_lrbt_rectangle_filled(MARGIN + 60, MARGIN + 94, HEIGHT - TOOLBAR_H + 10, HEIGHT - TOOLBAR_H + 44, self.color)
-        arcade.draw_lrbt_rectangle_outline(MARGIN + 60, MARGIN + 94, HEIGHT - TOOLBAR_H + 10, HEIGHT - TOOLBAR_H + 44, UI_BORDER, 2)
-        arcade.draw_text(self.tool.name.title(), MARGIN + 102, HEIGHT - TOOLBAR_H + 16, UI_MUTED, 14)
-        arcade.draw_lrbt_rectangle_outline(0, WIDTH, 0, HEIGHT - TOOLBAR_H, CANVAS_BORDER, 2)
-        if self.show_grid or self.tool.name == "CELL":
-            c = self.grid_cell if self.tool.name != "CELL" else getattr(self.tool, "cell", 20)
-            for gx in range(0, WIDTH, c):
-                arcade.draw_line(gx, 0, gx, HEIGHT - TOOLBAR_H, arcade.color.LIGHT_GRAY, 1)
-            for gy in range(0, HEIGHT - TOOLBAR_H, c):
-                arcade.draw_line(0, gy, WIDTH, gy, arcade.color.LIGHT_GRAY, 1)
-        for tool in self.used_tools.values():
-            tool.draw_traces(self.traces)
+        if self.recorder is not None:
+            self.recorder.add(FRAME)
+        prof = self.profiler
+        self._pump_loader()
+        self._pump_remote()
+        self._flush_drags()
+        self._share()
+        with prof.span("cuadro", "cuadro"):
+            self.clear()
+            # El lienzo con su cámara (recortado a su viewport): cuadrícula, las capas con
+            # los trazos terminados de las partes visibles y el trazo en curso sobre su capa
+            committed = len(self.traces) - 1 if self.drawing and self.traces else len(self.traces)
+            active = self.traces[-1] if committed < len(self.traces) else None
+            with self.view.camera.activate():
+                self._draw_grid()
+                with prof.span("sync"):
+                    self.trace_cache.sync(self.traces, self.used_tools, committed, self.view.box(), self.view.zoom)
+                with prof.span("trazos"):
+                    self.trace_cache.draw(None if active is None else lambda: self._draw_active(active))
+                if isinstance(self.tool, SelectTool):
+                    self.tool.draw_overlay(self.traces, self.view.zoom)
+            self._draw_layers()
+            self._draw_ui()
+        if prof.enabled:
+            self.hud.draw(self._counts)
+        # Con el HUD encendido se sigue dibujando siempre para medir cuadros,
+        # y mientras dura la carga, para ir agregando tandas
+        self.dirty = self.continuous or prof.enabled or self.loader is not None or bool(self.collab and self.collab.inbox)
+
+
+class PaintWindow(arcade.Window):
+    # Ventana que no dibuja ni presenta cuadros mientras la vista no esté sucia: el último
+    # cuadro presentado queda en pantalla y el bucle de eventos solo espera entrada
+    def draw(self, dt: float):
+        if getattr(self.current_view, "dirty", True):
+            super().draw(dt)
+
+    def on_expose(self):
+        self._mark_dirty()
+
+    def on_resize(self, width: int, height: int):
+        self._mark_dirty()
+
+    def _mark_dirty(self):
+        if self.current_view is not None:
+            self.current_view.dirty = True
 
 
 def main():
-    import sys
-    window = arcade.Window(WIDTH, HEIGHT, TITLE)
+    import argparse
+    parser = argparse.ArgumentParser(description=TITLE)
     # Invocación del programa en la forma: python main.py ruta/a/mi/archivo
-    if len(sys.argv) > 1:
-        app = Paint(sys.argv[1])
-    else:
-        app = Paint()
+    # (dibujo.txt, un .pntb o autosave.journal para recuperar lo último autoguardado)
+    parser.add_argument("archivo", nargs="?")
+    parser.add_argument("--semilla", type=int, help="semilla del spray, para dibujos reproducibles")
+    parser.add_argument("--mosaicos", action="store_true", help="rasterizar los trazos en mosaicos fuera de pantalla")
+    parser.add_argument("--mosaico-px", type=int, default=TILE, help="lado de cada mosaico (por defecto %(default)s)")
+    parser.add_argument("--mosaicos-mb", type=int, default=TILE_BUDGET // 2**20,
+                        help="memoria de GPU para mosaicos en MB, por capa (por defecto %(default)s)")
+    parser.add_argument("--perfil", action="store_true", help="empezar con el perfilador y su HUD encendidos (F3)")
+    parser.add_argument("--continuo", action="store_true", help="dibujar todos los cuadros aunque nada haya cambiado")
+    parser.add_argument("--servidor", metavar="HOST[:PUERTO]",
+                        help=f"dibujar en colaboración con el servidor de collab.py (puerto {PORT} por defecto)")
+    parser.add_argument("--carga-directa", action="store_true",
+                        help="leer el archivo entero antes de abrir la ventana en vez de en segundo plano")
+    parser.add_argument("--grabar", metavar="SESION",
+                        help="grabar la entrada en un archivo de sesión para reproducirla con replay.py")
+    args = parser.parse_args()
+    if args.grabar and args.servidor:
+        parser.error("--grabar no se puede usar con --servidor: los trazos ajenos no quedan en la sesión")
+    seed = args.semilla
+    if args.grabar and seed is None:
+        # La sesión guarda la semilla para que el spray salga igual al reproducirla
+        seed = random.randrange(2 ** 32)
+    if seed is not None:
+        SprayTool.seed(seed)
+    window = PaintWindow(WIDTH, HEIGHT, TITLE)
+    app = Paint(args.archivo, tiles=args.mosaicos, tile_size=args.mosaico_px, tile_budget=args.mosaicos_mb * 2**20,
+                profile=args.perfil, continuous=args.continuo,
+                progressive=not (args.carga_directa or args.grabar), server=args.servidor)
+    if args.grabar:
+        # Con carga directa el dibujo ya está entero antes del primer evento grabado. Se copia
+        # junto a la sesión (sin aplicar las transformaciones) porque guardar (O) o el diario de
+        # autoguardado pueden cambiar el archivo durante la grabación; su huella va en la cabecera.
+        start = None
+        if args.archivo:
+            start = os.path.splitext(args.grabar)[0] + ".inicio.txt"
+            with open(start, "w", encoding="utf-8") as f:
+                header = app.layers.header()
+                json.dump(([header] if header else []) + [tr.to_dict() for tr in app.traces], f)
+        app.recorder = Recorder(args.grabar, {
+            "semilla": seed, "archivo": start and os.path.basename(start),
+            "origen": args.archivo and os.path.abspath(args.archivo),
+            "inicio": [len(app.traces), fingerprint(app.traces).hex()], "mosaicos": args.mosaicos,
+            "mosaico_px": args.mosaico_px, "mosaicos_mb": args.mosaicos_mb, "fecha": time.strftime("%Y-%m-%d %H:%M:%S")})
     window.show_view(app)
     arcade.run()
+    if app.recorder:
+        app.recorder.close(app.traces)
+        print("Sesión grabada en", args.grabar)
+    if app.journal:
+        app.journal.close()
+    if app.collab:
+        app.collab.close()
 
 
 if __name__ == "__main__":
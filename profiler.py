@@ -0,0 +1,154 @@
+import functools
+import json
+import time
+from collections import deque
+from typing import Callable
+import arcade
+from ui import TextLayer
+
+# Muestras guardadas para exportar (las más viejas se descartan) y cuadros para percentiles
+SAMPLES = 200_000
+FRAMES = 240
+REFRESH = 0.5
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "cat", "t0")
+
+    def __init__(self, profiler: "Profiler", name: str, cat: str):
+        self.profiler = profiler
+        self.name = name
+        self.cat = cat
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, self.cat, self.t0, time.perf_counter_ns() - self.t0)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Profiler:
+    # Instrumentación opcional. Apagado, span() devuelve siempre el mismo contexto vacío
+    # y timed() solo mira `enabled`, así que el costo es casi nulo. Encendido guarda cada
+    # tramo (nombre, categoría, inicio, duración en ns) para el HUD y para exportar.
+    def __init__(self, enabled: bool = False, keep: int = SAMPLES):
+        self.enabled = enabled
+        self.samples: deque[tuple[str, str, int, int]] = deque(maxlen=keep)
+        self.frames: deque[int] = deque(maxlen=FRAMES)
+        self.stats: dict[str, list[int]] = {}
+        self._origin = time.perf_counter_ns()
+
+    def span(self, name: str, cat: str = "dibujo"):
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name, cat)
+
+    def add(self, name: str, cat: str, start: int, dur: int):
+        self.samples.append((name, cat, start, dur))
+        s = self.stats.get(name)
+        if s is None:
+            s = self.stats[name] = [0, 0, 0]
+        s[0] += 1
+        s[1] += dur
+        if dur > s[2]:
+            s[2] = dur
+        if cat == "cuadro":
+            self.frames.append(dur)
+
+    def take_stats(self) -> dict[str, list[int]]:
+        # Cantidad, total y máximo por nombre desde la última llamada
+        stats, self.stats = self.stats, {}
+        return stats
+
+    def percentiles(self, ps: tuple[int, ...] = (50, 95, 99)) -> list[float]:
+        # Duración de on_draw en ms para cada percentil de los últimos FRAMES cuadros
+        frames = sorted(self.frames)
+        if not frames:
+            return [0.0] * len(ps)
+        return [frames[min(len(frames) - 1, len(frames) * p // 100)] / 1e6 for p in ps]
+
+    def export(self, path: str) -> int:
+        # Formato Chrome trace (eventos completos "X", en µs): lo abren chrome://tracing,
+        # Perfetto y speedscope
+        events = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "paint"}}]
+        for name, cat, start, dur in self.samples:
+            events.append({"name": name, "cat": cat, "ph": "X", "pid": 1, "tid": 1,
+                           "ts": (start - self._origin) / 1000, "dur": dur / 1000})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(events) - 1
+
+
+def timed(name: str) -> Callable:
+    # Mide un método de una vista que tenga `self.profiler` (manejadores de entrada)
+    def wrap(fn):
+        @functools.wraps(fn)
+        def run(self, *args):
+            prof = self.profiler
+            if not prof.enabled:
+                return fn(self, *args)
+            t0 = time.perf_counter_ns()
+            try:
+                return fn(self, *args)
+            finally:
+                prof.add(name, "entrada", t0, time.perf_counter_ns() - t0)
+        return run
+    return wrap
+
+
+class ProfilerHUD:
+    # Panel con FPS, percentiles del cuadro, conteos y tiempos por tramo. El texto se
+    # rearma cada REFRESH segundos, no en cada cuadro.
+    LINES = 12
+
+    def __init__(self, profiler: Profiler, left: float, top: float, width: float = 360):
+        self.profiler = profiler
+        self.left = left
+        self.top = top
+        self.width = width
+        self.texts = TextLayer()
+        self.lines = [self.texts.text("", left + 8, top - 16 - 15 * i, arcade.color.WHITE, 10)
+                      for i in range(self.LINES)]
+        self._last = time.perf_counter()
+        self._count = 0
+
+    def draw(self, counts: Callable[[], tuple[int, int]]):
+        # counts() -> (trazos, puntos); solo se llama al refrescar
+        self._count += 1
+        now = time.perf_counter()
+        if now - self._last >= REFRESH:
+            self._refresh(now - self._last, *counts())
+            self._last = now
+            self._count = 0
+        arcade.draw_lrbt_rectangle_filled(self.left, self.left + self.width,
+                                          self.top - 16 - 15 * self.LINES, self.top, (0, 0, 0, 170))
+        self.texts.draw()
+
+    def _refresh(self, elapsed: float, traces: int, points: int):
+        p50, p95, p99 = self.profiler.percentiles()
+        rows = [
+            f"FPS {self._count / elapsed:.1f}   cuadro p50 {p50:.2f}  p95 {p95:.2f}  p99 {p99:.2f} ms",
+            f"trazos {traces}   puntos {points}",
+        ]
+        stats = self.profiler.take_stats()
+        # Promedio por llamada y máximo desde el refresco anterior, lo más caro primero
+        for name, (count, total, peak) in sorted(stats.items(), key=lambda kv: -kv[1][1]):
+            if name == "cuadro":
+                continue
+            rows.append(f"{name:<16} {total / count / 1e6:7.3f} ms  máx {peak / 1e6:7.3f}  x{count}")
+        for line, row in zip(self.lines, rows + [""] * self.LINES):
+            line.text = row
+
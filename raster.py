@@ -0,0 +1,360 @@
+import json
+import math
+import os
+import struct
+import sys
+import time
+import zlib
+from typing import Iterable, Optional
+import numpy as np
+from autosave import is_journal, recover
+from binformat import BinaryDrawing, is_binary
+from loader import read_layers
+from records import Trace, flatten, from_dict, split_header
+
+# Rasterizador por CPU con NumPy, sin arcade ni ventana: arma los mismos TRIANGLE_STRIP
+# que tool.py (create_shapes) y los pinta en un búfer RGBA con la regla de GL (un píxel
+# entra si su centro cae dentro del triángulo). Sirve para miniaturas y exportaciones
+# en servidores sin pantalla ni GPU.
+
+# Lienzo de main.py: la ventana menos la barra superior
+WIDTH = 980
+HEIGHT = 470
+BACKGROUND = (255, 255, 255, 255)
+MARKER_WIDTH = 8
+CELL_BORDER = (47, 79, 79, 255)
+# Desempate de los centros que caen justo sobre un borde: se corre apenas el punto de
+# muestra, así coincide píxel a píxel con GL sin multimuestreo
+BIAS_X = 1e-4
+BIAS_Y = 1e-4
+# Booleanos por lote al probar los triángulos contra su caja de píxeles
+CHUNK = 1 << 22
+# Triángulos acumulados antes de volcar al búfer
+BATCH = 1 << 18
+
+_SQUARE = np.array([(-1, -1), (-1, -1), (1, -1), (-1, 1), (1, 1), (1, 1)], dtype=np.float64)
+
+
+def _xy(coords) -> np.ndarray:
+    return np.frombuffer(coords, dtype=np.int32).reshape(-1, 2).astype(np.float64)
+
+
+def thick_strip(coords, width: float) -> np.ndarray:
+    # Igual que tool._strip_shape: un cuadrilátero por segmento, sin puntas ni uniones
+    p = _xy(coords)
+    s, e = p[:-1], p[1:]
+    v = s - e
+    length = np.hypot(v[:, 0], v[:, 1])
+    hw = width / 2
+    n = np.empty_like(v)
+    ok = length > 0
+    n[ok, 0] = v[ok, 1] / length[ok] * hw
+    n[ok, 1] = -v[ok, 0] / length[ok] * hw
+    n[~ok] = hw
+    return np.stack([s - n, s + n, e - n, e + n], axis=1).reshape(-1, 2)
+
+
+def points_strip(coords, size: float) -> np.ndarray:
+    # tool._points_shape: cuadrados de lado size unidos con triángulos degenerados
+    return (_xy(coords)[:, None, :] + _SQUARE * (size / 2)).reshape(-1, 2)
+
+
+def ring_strip(cx: float, cy: float, r: float, w: float) -> np.ndarray:
+    # tool.ring_shape: borde hacia adentro, mismos segmentos que draw_circle_outline
+    size = r * 2
+    segments = 6 if size <= 12 else max(3, int(size) // 2)
+    a = np.arange(segments + 1) * (math.pi * 2 / segments)
+    s, c = np.sin(a), np.cos(a)
+    return np.stack([cx + s * r, cy + c * r, cx + s * (r - w), cy + c * (r - w)], axis=1).reshape(-1, 2)
+
+
+def rect_strip(cx: float, cy: float, w: float, h: float) -> np.ndarray:
+    # shape_list.create_rectangle_filled
+    l, r, b, t = cx - w / 2, cx + w / 2, cy - h / 2, cy + h / 2
+    return np.array([(l, b), (l, t), (r, b), (r, t)], dtype=np.float64)
+
+
+def rect_outline_strip(cx: float, cy: float, w: float, h: float, border: float) -> np.ndarray:
+    # shape_list.create_rectangle_outline: anillo de 4 cuadriláteros centrado en el borde
+    hb = border / 2
+    il, ir, ib, it = cx - w / 2 + hb, cx + w / 2 - hb, cy - h / 2 + hb, cy + h / 2 - hb
+    ol, orr, ob, ot = cx - w / 2 - hb, cx + w / 2 + hb, cy - h / 2 - hb, cy + h / 2 + hb
+    return np.array([(ol, ot), (il, it), (orr, ot), (ir, it), (orr, ob), (ir, ib),
+                     (ol, ob), (il, ib), (ol, ot), (il, it)], dtype=np.float64)
+
+
+def line_strip(x1: float, y1: float, x2: float, y2: float, width: float) -> np.ndarray:
+    # shape_list.create_line (get_points_for_thick_line)
+    return thick_strip(np.array([x1, y1, x2, y2], dtype=np.int32), width)
+
+
+def trace_strips(tr: Trace) -> list[tuple[np.ndarray, tuple]]:
+    # Los TRIANGLE_STRIP de un trazo con su color, en el orden de create_shapes
+    tr = flatten(tr)
+    color = _rgba(tr.color)
+    t = tr.tool
+    if t in ("PENCIL", "MARKER"):
+        if len(tr) < 2:
+            return []
+        width = 1 if t == "PENCIL" else (tr.width or MARKER_WIDTH)
+        return [(thick_strip(tr.coords, width), color)]
+    if t == "SPRAY":
+        return [(points_strip(tr.coords, 1), color)] if len(tr) else []
+    if t == "LINE":
+        if (tr.x1, tr.y1) == (tr.x2, tr.y2):
+            return []
+        return [(line_strip(tr.x1, tr.y1, tr.x2, tr.y2, tr.width), color)]
+    if t == "RECT":
+        cx, cy = (tr.x1 + tr.x2) / 2, (tr.y1 + tr.y2) / 2
+        return [(rect_outline_strip(cx, cy, abs(tr.x2 - tr.x1), abs(tr.y2 - tr.y1), tr.width), color)]
+    if t == "CIRCLE":
+        r = int(((tr.x2 - tr.x1) ** 2 + (tr.y2 - tr.y1) ** 2) ** 0.5)
+        return [(ring_strip(tr.x1, tr.y1, r, tr.width), color)]
+    if t == "CELL":
+        s = tr.size
+        out = []
+        for x, y in tr.points():
+            out += [(rect_strip(x + s / 2, y + s / 2, s, s), color),
+                    (rect_outline_strip(x + s / 2, y + s / 2, s, s, 1), CELL_BORDER)]
+        return out
+    return []
+
+
+def _rgba(color) -> tuple:
+    return tuple(color) if len(color) == 4 else (*color, 255)
+
+
+def _triangles(strip: np.ndarray) -> np.ndarray:
+    if len(strip) < 3:
+        return np.empty((0, 3, 2))
+    return np.stack([strip[:-2], strip[1:-1], strip[2:]], axis=1)
+
+
+def cover(tris: np.ndarray, width: int, height: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Píxeles cuyo centro cae en cada triángulo: (índice de triángulo, x, y)
+    a, b, c = tris[:, 0], tris[:, 1], tris[:, 2]
+    area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+    lo = np.floor(tris.min(axis=1) - 0.5).astype(np.int64)
+    hi = np.floor(tris.max(axis=1) - 0.5).astype(np.int64)
+    np.maximum(lo, 0, out=lo)
+    np.minimum(hi, (width - 1, height - 1), out=hi)
+    size = hi - lo + 1
+    live = np.nonzero((area != 0) & (size[:, 0] > 0) & (size[:, 1] > 0))[0]
+    # Triángulos agrupados por tamaño de caja (potencias de 2) y probados por lotes contra
+    # una grilla común del tamaño máximo del grupo
+    bucket = np.ceil(np.log2(size[live])).astype(np.int64)
+    key = bucket[:, 0] * 64 + bucket[:, 1]
+    live = live[np.argsort(key, kind="stable")]
+    key = np.sort(key, kind="stable")
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    out_t, out_x, out_y = [], [], []
+    for start, end in zip(starts, np.r_[starts[1:], len(live)]):
+        kw, kh = size[live[start:end]].max(axis=0)
+        step = max(1, CHUNK // (kw * kh))
+        for i in range(start, end, step):
+            idx = live[i:min(end, i + step)]
+            out = _cover_chunk(a, b, c, area, lo, hi, idx, kw, kh)
+            out_t.append(out[0])
+            out_x.append(out[1])
+            out_y.append(out[2])
+    if not out_t:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    return np.concatenate(out_t), np.concatenate(out_x), np.concatenate(out_y)
+
+
+def _cover_chunk(a, b, c, area, lo, hi, idx, kw, kh):
+    gx = lo[idx, 0, None, None] + np.arange(kw)[None, None, :]
+    gy = lo[idx, 1, None, None] + np.arange(kh)[None, :, None]
+    px = gx + 0.5 + BIAS_X
+    py = gy + 0.5 + BIAS_Y
+    sign = np.sign(area[idx])[:, None, None]
+    inside = (gx <= hi[idx, 0, None, None]) & (gy <= hi[idx, 1, None, None])
+    for p, q in ((a, b), (b, c), (c, a)):
+        px0, py0 = p[idx, 0, None, None], p[idx, 1, None, None]
+        ex, ey = q[idx, 0, None, None] - px0, q[idx, 1, None, None] - py0
+        inside &= (ex * (py - py0) - ey * (px - px0)) * sign >= 0
+    k, iy, ix = np.nonzero(inside)
+    return idx[k], lo[idx[k], 0] + ix, lo[idx[k], 1] + iy
+
+
+class _Batch:
+    # Triángulos opacos pendientes: al volcar, cada píxel toma el color del último
+    # triángulo (en orden de dibujo) que lo cubre
+    def __init__(self, buf: np.ndarray):
+        self.buf = buf
+        self.tris: list[np.ndarray] = []
+        self.colors: list[tuple] = []
+        self.sizes: list[int] = []
+        self.count = 0
+
+    def add(self, tris: np.ndarray, color: tuple):
+        self.tris.append(tris)
+        self.colors.append(color)
+        self.sizes.append(len(tris))
+        self.count += len(tris)
+        if self.count >= BATCH:
+            self.flush()
+
+    def flush(self):
+        if not self.tris:
+            return
+        h, w = self.buf.shape[:2]
+        tris = np.concatenate(self.tris)
+        colors = np.array(self.colors, dtype=np.uint8)
+        owner = np.repeat(np.arange(len(self.colors)), self.sizes)
+        t, x, y = cover(tris, w, h)
+        pid = y * w + x
+        order = np.lexsort((t, pid))
+        pid, t = pid[order], t[order]
+        last = np.ones(len(pid), dtype=bool)
+        last[:-1] = pid[1:] != pid[:-1]
+        self.buf.reshape(-1, 4)[pid[last]] = colors[owner[t[last]]]
+        self.tris, self.colors, self.sizes, self.count = [], [], [], 0
+
+
+def _blend(buf: np.ndarray, tris: np.ndarray, color: tuple):
+    # Color translúcido: mezcla SRC_ALPHA, ONE_MINUS_SRC_ALPHA una vez por píxel cubierto
+    h, w = buf.shape[:2]
+    _t, x, y = cover(tris, w, h)
+    pid = np.unique(y * w + x)
+    flat = buf.reshape(-1, 4)
+    alpha = color[3] / 255
+    src = np.array(color, dtype=np.float64)
+    flat[pid, :3] = np.round(src[:3] * alpha + flat[pid, :3] * (1 - alpha))
+    flat[pid, 3] = np.round(color[3] + flat[pid, 3] * (1 - alpha))
+
+
+def rasterize(traces: Iterable[Trace], width: int = WIDTH, height: int = HEIGHT,
+              background: tuple = BACKGROUND) -> np.ndarray:
+    # Devuelve un búfer (alto, ancho, 4) uint8 con la fila de arriba primero, como una imagen
+    buf = np.empty((height, width, 4), dtype=np.uint8)
+    buf[:] = background
+    _paint(buf, traces)
+    return buf[::-1]
+
+
+def rasterize_layers(traces: Iterable[Trace], layers: Optional[dict], width: int = WIDTH, height: int = HEIGHT,
+                     background: tuple = BACKGROUND) -> np.ndarray:
+    # Como rasterize, por capas (cabecera layers.Layers.to_dict): las visibles de abajo hacia
+    # arriba y las ocultas no. Una capa translúcida se pinta sobre un búfer transparente (el
+    # color queda premultiplicado, como en la textura de layers.LayerCache) y se mezcla
+    # después con su opacidad.
+    if not layers:
+        return rasterize(traces, width, height, background)
+    groups: dict[int, list[Trace]] = {}
+    for tr in traces:
+        groups.setdefault(tr.layer, []).append(tr)
+    order = list(layers["layers"])
+    known = {d["id"] for d in order}
+    order += [{"id": lid} for lid in sorted(groups) if lid not in known]
+    buf = np.empty((height, width, 4), dtype=np.uint8)
+    buf[:] = background
+    for d in order:
+        group = groups.get(d["id"])
+        if not group or not d.get("visible", True):
+            continue
+        alpha = d.get("opacity", 1.0)
+        if alpha >= 1:
+            _paint(buf, group)
+            continue
+        top = np.zeros_like(buf)
+        _paint(top, group)
+        keep = 1 - top[..., 3:4] / 255 * alpha
+        buf[:] = np.round(top * alpha + buf * keep)
+    return buf[::-1]
+
+
+def _paint(buf: np.ndarray, traces: Iterable[Trace]):
+    batch = _Batch(buf)
+    for tr in traces:
+        for strip, color in trace_strips(tr):
+            tris = _triangles(strip)
+            if color[3] == 255:
+                batch.add(tris, color)
+            elif color[3]:
+                batch.flush()
+                _blend(buf, tris, color)
+    batch.flush()
+
+
+def thumbnail(img: np.ndarray, size: int) -> np.ndarray:
+    # Achica por un factor entero promediando bloques, hasta que el lado mayor entre en size
+    f = math.ceil(max(img.shape[:2]) / size)
+    if f <= 1:
+        return img
+    h, w = img.shape[0] // f * f, img.shape[1] // f * f
+    blocks = img[:h, :w].reshape(h // f, f, w // f, f, 4).astype(np.uint32)
+    return (blocks.sum(axis=(1, 3)) // (f * f)).astype(np.uint8)
+
+
+def write_png(path: str, img: np.ndarray):
+    # PNG RGBA de 8 bits sin dependencias: una fila por línea con filtro 0 y zlib
+    h, w = img.shape[:2]
+    raw = np.zeros((h, 1 + w * 4), dtype=np.uint8)
+    raw[:, 1:] = np.ascontiguousarray(img).reshape(h, -1)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)))
+        f.write(chunk(b"IEND", b""))
+
+
+def load(path: str) -> tuple[list[Trace], Optional[dict]]:
+    # dibujo.txt (JSON), .pntb o un diario de autoguardado, detectado por el contenido,
+    # con su cabecera de capas
+    if is_journal(path):
+        return list(recover(path)), read_layers(path)
+    if is_binary(path):
+        with BinaryDrawing(path) as drawing:
+            return list(drawing), drawing.layers
+    with open(path, "r", encoding="utf-8") as f:
+        layers, items = split_header(json.load(f))
+    return [from_dict(d) for d in items], layers
+
+
+def export(path: str, out_dir: str, width: int, height: int, size: Optional[int]) -> tuple[str, str, int, float]:
+    # Trabajo de un proceso: (origen, destino o mensaje de error, trazos, segundos)
+    t0 = time.perf_counter()
+    try:
+        traces, layers = load(path)
+        img = rasterize_layers(traces, layers, width, height)
+        if size:
+            img = thumbnail(img, size)
+        dst = os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0] + ".png")
+        write_png(dst, img)
+    except Exception as e:
+        return path, f"error: {e}", 0, time.perf_counter() - t0
+    return path, dst, len(traces), time.perf_counter() - t0
+
+
+def main():
+    import argparse
+    from concurrent.futures import ProcessPoolExecutor
+    parser = argparse.ArgumentParser(description="Exporta dibujos a PNG sin ventana ni GPU")
+    parser.add_argument("archivos", nargs="+", help="dibujo.txt, .pntb o autosave.journal")
+    parser.add_argument("--salida", default=".", help="carpeta de los PNG (por defecto la actual)")
+    parser.add_argument("--ancho", type=int, default=WIDTH)
+    parser.add_argument("--alto", type=int, default=HEIGHT)
+    parser.add_argument("--miniatura", type=int, help="lado mayor de la imagen en píxeles")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count(), help="por defecto uno por núcleo")
+    args = parser.parse_args()
+    os.makedirs(args.salida, exist_ok=True)
+    t0 = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.procesos) as pool:
+        jobs = [pool.submit(export, p, args.salida, args.ancho, args.alto, args.miniatura) for p in args.archivos]
+        for job in jobs:
+            src, dst, n, secs = job.result()
+            failed += dst.startswith("error:")
+            print(f"{src} -> {dst} ({n} trazos, {secs:.2f} s)")
+    print(f"{len(args.archivos) - failed} de {len(args.archivos)} archivos en {time.perf_counter() - t0:.1f} s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import copy
+from array import array
+from typing import Optional
+import numpy as np
+from geometry import Affine, affine_coords, apply, compose, scale_of
+
+
+def _coords(points) -> array:
+    out = array("i")
+    for (x, y) in points:
+        out.append(int(x))
+        out.append(int(y))
+    return out
+
+
+def _pairs(coords: array) -> list[tuple[int, int]]:
+    it = iter(coords)
+    return list(zip(it, it))
+
+
+class Trace:
+    # Registro compacto de un trazo. Las coordenadas viven en array('i') planos
+    # (x0, y0, x1, y1, ...) que crecen en el lugar durante el arrastre.
+    # transform: transformación afín opcional (herramienta de selección) que se aplica al
+    # dibujar, borrar y calcular la caja, sin reescribir las coordenadas (ver flatten)
+    # layer: id de la capa (layers.Layers) a la que pertenece
+    __slots__ = ("tool", "color", "transform", "layer")
+
+    def __init__(self, tool: str, color):
+        self.tool = tool
+        self.color = tuple(color)
+        self.transform: Optional[Affine] = None
+        self.layer = 0
+
+    def to_dict(self) -> dict:
+        raise NotImplementedError
+
+    def _dict(self, d: dict) -> dict:
+        if self.transform is not None:
+            d["transform"] = list(self.transform)
+        if self.layer:
+            d["layer"] = self.layer
+        return d
+
+
+class StrokeTrace(Trace):
+    # PENCIL y MARKER
+    __slots__ = ("coords", "width")
+
+    def __init__(self, tool: str, color, coords: Optional[array] = None, width: Optional[int] = None):
+        super().__init__(tool, color)
+        self.coords = coords if coords is not None else array("i")
+        self.width = width
+
+    def add(self, x: int, y: int):
+        self.coords.append(int(x))
+        self.coords.append(int(y))
+
+    def __len__(self) -> int:
+        return len(self.coords) // 2
+
+    def points(self) -> list[tuple[int, int]]:
+        return _pairs(self.coords)
+
+    def to_dict(self) -> dict:
+        d = {"tool": self.tool, "color": list(self.color), "trace": self.points()}
+        if self.width is not None:
+            d["width"] = self.width
+        return self._dict(d)
+
+
+class SprayTrace(Trace):
+    __slots__ = ("coords",)
+
+    def __init__(self, color, coords: Optional[array] = None):
+        super().__init__("SPRAY", color)
+        self.coords = coords if coords is not None else array("i")
+
+    def extend(self, coords: array):
+        self.coords.extend(coords)
+
+    def __len__(self) -> int:
+        return len(self.coords) // 2
+
+    def points(self) -> list[tuple[int, int]]:
+        return _pairs(self.coords)
+
+    def to_dict(self) -> dict:
+        return self._dict({"tool": self.tool, "color": list(self.color), "points": self.points()})
+
+
+class ShapeTrace(Trace):
+    # LINE, RECT y CIRCLE: (x1, y1) es el inicio o el centro, (x2, y2) el extremo
+    __slots__ = ("x1", "y1", "x2", "y2", "width")
+
+    def __init__(self, tool: str, color, x1: int, y1: int, x2: int, y2: int, width: int = 2):
+        super().__init__(tool, color)
+        self.x1, self.y1, self.x2, self.y2 = int(x1), int(y1), int(x2), int(y2)
+        self.width = width
+
+    def to_dict(self) -> dict:
+        return self._dict({"tool": self.tool, "color": list(self.color), "start": (self.x1, self.y1),
+                           "end": (self.x2, self.y2), "width": self.width})
+
+
+class CellTrace(Trace):
+    # Una o más celdas del mismo color y tamaño (un clic o un relleno de la cubeta):
+    # coords guarda la esquina inferior izquierda de cada una
+    __slots__ = ("coords", "size")
+
+    def __init__(self, color, coords: array, size: int):
+        super().__init__("CELL", color)
+        self.coords = coords
+        self.size = int(size)
+
+    def __len__(self) -> int:
+        return len(self.coords) // 2
+
+    def points(self) -> list[tuple[int, int]]:
+        return _pairs(self.coords)
+
+    def to_dict(self) -> dict:
+        # Una sola celda se guarda como antes ("xy"); varias, en una lista
+        if len(self) == 1:
+            return self._dict({"tool": self.tool, "color": list(self.color), "xy": tuple(self.coords), "size": self.size})
+        return self._dict({"tool": self.tool, "color": list(self.color), "cells": self.points(), "size": self.size})
+
+
+def from_dict(d: dict) -> Trace:
+    tr = _from_dict(d)
+    if "transform" in d:
+        tr.transform = tuple(d["transform"])
+    tr.layer = d.get("layer", 0)
+    return tr
+
+
+def split_header(items: list[dict]) -> tuple[Optional[dict], list[dict]]:
+    # Un dibujo JSON puede empezar con la cabecera de capas (layers.Layers.to_dict), que
+    # no es un trazo
+    if items and "tool" not in items[0]:
+        return items[0], items[1:]
+    return None, items
+
+
+def _from_dict(d: dict) -> Trace:
+    # Capa de compatibilidad con el formato JSON de dibujo.txt
+    t = d["tool"]
+    if t in ("PENCIL", "MARKER"):
+        return StrokeTrace(t, d["color"], _coords(d.get("trace", [])), d.get("width"))
+    if t == "SPRAY":
+        return SprayTrace(d["color"], _coords(d.get("points", [])))
+    if t in ("LINE", "RECT", "CIRCLE"):
+        (x1, y1) = d["start"]
+        (x2, y2) = d["end"]
+        return ShapeTrace(t, d["color"], x1, y1, x2, y2, d.get("width", 2))
+    if t == "CELL":
+        cells = _coords(d["cells"]) if "cells" in d else _coords([d["xy"]])
+        return CellTrace(d["color"], cells, d["size"])
+    raise ValueError(f"Herramienta desconocida: {t}")
+
+
+def transformed(tr: Trace, m: Affine) -> Trace:
+    # Copia del registro con m aplicada después de su transformación; comparte las
+    # coordenadas, que no cambian una vez terminado el trazo
+    out = copy.copy(tr)
+    out.transform = m if tr.transform is None else compose(m, tr.transform)
+    return out
+
+
+def _axis_aligned(m: Affine) -> bool:
+    # Sin rotar o rotada un múltiplo de 90°: un rectángulo sigue alineado con los ejes
+    return (abs(m[1]) < 1e-9 and abs(m[2]) < 1e-9) or (abs(m[0]) < 1e-9 and abs(m[3]) < 1e-9)
+
+
+def flatten(tr: Trace) -> Trace:
+    # El trazo con su transformación aplicada a las coordenadas (el mismo si no tiene).
+    # Supone una semejanza: los grosores se escalan y los círculos siguen siendo círculos.
+    # Un rectángulo rotado pasa a ser una polilínea cerrada de marcador del mismo grosor,
+    # y las celdas se vuelven a acomodar a la cuadrícula de su tamaño escalado.
+    if tr.transform is None:
+        return tr
+    out = _flatten(tr, tr.transform)
+    out.layer = tr.layer
+    return out
+
+
+def _flatten(tr: Trace, m: Affine) -> Trace:
+    s = scale_of(m)
+
+    def width(w: int) -> int:
+        return w if s == 1 else max(1, round(w * s))
+    if isinstance(tr, StrokeTrace):
+        w = tr.width if tr.tool == "PENCIL" or s == 1 else width(tr.width or 8)
+        return StrokeTrace(tr.tool, tr.color, affine_coords(tr.coords, m), w)
+    if isinstance(tr, SprayTrace):
+        return SprayTrace(tr.color, affine_coords(tr.coords, m))
+    if isinstance(tr, CellTrace):
+        size = width(tr.size)
+        c = np.frombuffer(tr.coords, dtype=np.int32).reshape(-1, 2) + tr.size / 2
+        x, y = m[0] * c[:, 0] + m[2] * c[:, 1] + m[4], m[1] * c[:, 0] + m[3] * c[:, 1] + m[5]
+        corners = np.column_stack((np.rint((x - size / 2) / size), np.rint((y - size / 2) / size))) * size
+        # Dos celdas que caen en la misma posición quedan una sola, en el orden original
+        _u, first = np.unique(corners, axis=0, return_index=True)
+        out = array("i")
+        out.frombytes(corners[np.sort(first)].astype(np.int32).tobytes())
+        return CellTrace(tr.color, out, size)
+    (x1, y1), (x2, y2) = apply(m, tr.x1, tr.y1), apply(m, tr.x2, tr.y2)
+    if tr.tool != "RECT" or _axis_aligned(m):
+        return ShapeTrace(tr.tool, tr.color, round(x1), round(y1), round(x2), round(y2), width(tr.width))
+    corners = [apply(m, x, y) for x, y in ((tr.x1, tr.y1), (tr.x2, tr.y1), (tr.x2, tr.y2), (tr.x1, tr.y2), (tr.x1, tr.y1))]
+    return StrokeTrace("MARKER", tr.color, _coords([(round(x), round(y)) for x, y in corners]), width(tr.width))
@@ -0,0 +1,251 @@
+import bisect
+import math
+from collections import OrderedDict
+from typing import Optional
+import arcade
+from arcade.shape_list import Shape, ShapeElementList
+from records import Trace, flatten
+from spatial import Box
+from store import TraceStore
+from viewport import lod_level
+
+CHUNK = 512
+# Lado de las celdas de ViewCache en el nivel de detalle 0 (se duplica en cada nivel)
+BIN = 512
+BINS_MAX = 256
+# Los bordes finos (contorno de celdas, puntas) pueden asomar fuera de la caja del trazo;
+# en el nivel k la geometría simplificada puede salirse hasta PAD << k
+PAD = 1
+# Rangos sucios más largos que esto (limpiar) invalidan todo
+RANGE_MAX = 64
+
+
+def trace_shapes(tools: dict, trace: Trace, level: int) -> list[Shape]:
+    # Figuras de un trazo para un nivel de detalle; las herramientas sin lod_shapes
+    # (figuras, celdas) usan siempre su geometría completa. Un trazo transformado se
+    # arma con su transformación ya aplicada (records.flatten), con la herramienta del
+    # resultado: un rectángulo rotado se dibuja como polilínea de marcador
+    if trace.transform is not None:
+        trace = flatten(trace)
+    tool = tools[trace.tool]
+    lod = getattr(tool, "lod_shapes", None) if level else None
+    if lod is None:
+        return tool.create_shapes(trace)
+    return lod(trace, 1 << level)
+
+
+def overlaps(a: Box, b: Box) -> bool:
+    return a[0] <= b[2] and a[2] >= b[0] and a[1] <= b[3] and a[3] >= b[1]
+
+
+class _Segment:
+    # Hasta CHUNK trazos consecutivos compilados en un ShapeElementList. Como todas las
+    # figuras son TRIANGLE_STRIP caen en un solo lote y conservan el orden de dibujo.
+    def __init__(self, seq: int):
+        self.lo = seq
+        self.hi = seq
+        self.count = 0
+        self.shapes: ShapeElementList = ShapeElementList()
+
+    def add(self, tools: dict, hi: int, traces: list[Trace]):
+        for tr in traces:
+            for sh in trace_shapes(tools, tr, 0):
+                self.shapes.append(sh)
+        self.hi = hi
+        self.count += len(traces)
+
+
+class TraceCache:
+    # Trazos ya terminados compilados en la GPU por segmentos. Solo se recompilan los
+    # segmentos que tocan un rango sucio del TraceStore; el trazo en curso se dibuja aparte.
+    def __init__(self):
+        self.segments: list[_Segment] = []
+        self.active = ActiveTrace()
+
+    def _fill(self, store: TraceStore, tools: dict, traces: list[Trace], out: list[_Segment]):
+        # Despacha cada tramo de la misma herramienta a su create_shapes
+        seg = out[-1] if out else None
+        i = 0
+        while i < len(traces):
+            if seg is None or seg.count >= CHUNK:
+                seg = _Segment(store.seq_of(traces[i]))
+                out.append(seg)
+            tool = traces[i].tool
+            j = i + 1
+            while j < len(traces) and j - i < CHUNK - seg.count and traces[j].tool == tool:
+                j += 1
+            run = traces[i:j]
+            seg.add(tools, store.seq_of(run[-1]), run)
+            i = j
+
+    def _rebuild(self, store: TraceStore, tools: dict, lo: int, hi: int, upto: int):
+        segs = self.segments
+        i = bisect.bisect_left(segs, lo, key=lambda s: s.hi)
+        j = bisect.bisect_right(segs, hi, key=lambda s: s.lo)
+        if i == len(segs):
+            return
+        if i < j:
+            lo = min(lo, segs[i].lo)
+            hi = max(hi, segs[j - 1].hi)
+        new: list[_Segment] = []
+        self._fill(store, tools, store.between(lo, min(hi, upto)), new)
+        segs[i:j] = new
+
+    def sync(self, store: TraceStore, tools: dict, committed: int, view: Optional[Box] = None, zoom: float = 1.0):
+        # committed: cuántos trazos (desde el principio) ya están terminados. La vista no
+        # se usa: esta caché dibuja siempre todo el dibujo con la geometría completa
+        upto = store.seq_at(committed - 1) if committed else -1
+        for lo, hi in store.take_dirty():
+            self._rebuild(store, tools, lo, hi, upto)
+        last_hi = self.segments[-1].hi if self.segments else -1
+        new = store.between(last_hi + 1, upto)
+        if new:
+            self._fill(store, tools, new, self.segments)
+
+    def draw(self):
+        for seg in self.segments:
+            seg.shapes.draw()
+
+    def draw_active(self, tool, trace: Trace):
+        self.active.draw(tool, trace)
+
+
+class _Bin:
+    __slots__ = ("level", "rect", "query", "shapes")
+
+    def __init__(self, level: int, rect: Box):
+        self.level = level
+        self.rect = rect
+        pad = PAD << level
+        self.query = (rect[0] - pad, rect[1] - pad, rect[2] + pad, rect[3] + pad)
+        self.shapes: Optional[ShapeElementList] = None
+
+
+class ViewCache:
+    # Trazos terminados repartidos en celdas fijas del mundo, de BIN << nivel de lado (un
+    # juego de celdas por nivel de detalle). Cada celda compila, en orden cronológico, los
+    # trazos cuya caja la toca, y se dibuja recortada (scissor) a su rectángulo de pantalla:
+    # un trazo que cruza varias celdas se repite, pero dentro de cada una el orden de dibujo
+    # es el de siempre. Por cuadro solo se compilan y dibujan las celdas visibles, así que el
+    # costo depende de lo que se ve y no del tamaño del dibujo. Un trazo nuevo se agrega a
+    # las celdas ya compiladas que toca; un borrado invalida solo esas celdas.
+    def __init__(self, bin: int = BIN, capacity: int = BINS_MAX):
+        self.bin = bin
+        self.capacity = capacity
+        self.bins: OrderedDict[tuple[int, int, int], _Bin] = OrderedDict()
+        self.visible: list[_Bin] = []
+        self.active = ActiveTrace()
+        self.builds = 0
+        self._boxes: dict[int, Box] = {}
+        self._last = -1
+        self._tools: dict = {}
+        self._origin = (0.0, 0.0)
+        self._zoom = 1.0
+
+    def _invalidate(self, box: Optional[Box]):
+        if box is None:
+            return
+        for b in self.bins.values():
+            if b.shapes is not None and overlaps(b.query, box):
+                b.shapes = None
+
+    def sync(self, store: TraceStore, tools: dict, committed: int, view: Optional[Box] = None, zoom: float = 1.0):
+        # view: parte visible del mundo; sin vista (benchmarks) se toma todo el dibujo
+        # con el mundo alineado a la pantalla
+        self._tools = tools
+        upto = store.seq_at(committed - 1) if committed else -1
+        boxes = self._boxes
+        for lo, hi in store.take_dirty():
+            if hi - lo > RANGE_MAX:
+                self.bins.clear()
+                self._boxes = boxes = {seq: store.index.boxes.get(seq) for seq, _tr in store.items() if seq <= self._last}
+                continue
+            for seq in range(lo, min(hi, self._last) + 1):
+                self._invalidate(boxes.pop(seq, None))
+                if store.get(seq) is not None:
+                    boxes[seq] = store.index.boxes.get(seq)
+                    self._invalidate(boxes[seq])
+        for tr in store.between(self._last + 1, upto):
+            seq = store.seq_of(tr)
+            box = boxes[seq] = store.index.boxes.get(seq)
+            if box is not None:
+                for b in self.bins.values():
+                    if b.shapes is not None and overlaps(b.query, box):
+                        for sh in trace_shapes(tools, tr, b.level):
+                            b.shapes.append(sh)
+            self._last = seq
+        if view is None:
+            self._origin = (0.0, 0.0)
+            view = store.index.extent()
+        else:
+            self._origin = (view[0], view[1])
+        self._zoom = zoom
+        self.visible = []
+        if view is None:
+            return
+        level = lod_level(zoom)
+        size = self.bin << level
+        for i in range(math.floor(view[0] / size), math.ceil(view[2] / size)):
+            for j in range(math.floor(view[1] / size), math.ceil(view[3] / size)):
+                key = (level, i, j)
+                b = self.bins.get(key)
+                if b is None:
+                    b = self.bins[key] = _Bin(level, (i * size, j * size, (i + 1) * size, (j + 1) * size))
+                else:
+                    self.bins.move_to_end(key)
+                if b.shapes is None:
+                    self._build(b, store)
+                self.visible.append(b)
+        while len(self.bins) > max(self.capacity, len(self.visible)):
+            self.bins.popitem(last=False)
+
+    def _build(self, b: _Bin, store: TraceStore):
+        b.shapes = ShapeElementList()
+        for seq in sorted(s for s in store.index.query(*b.query) if s <= self._last):
+            tr = store.get(seq)
+            for sh in trace_shapes(self._tools, tr, b.level):
+                b.shapes.append(sh)
+        self.builds += 1
+
+    def draw(self):
+        ctx = arcade.get_window().ctx
+        ox, oy = self._origin
+        z = self._zoom
+        for b in self.visible:
+            if not len(b.shapes):
+                continue
+            # Píxeles cuyo centro cae dentro de la celda: las celdas vecinas no se pisan
+            l, bt, r, t = b.rect
+            x0, x1 = max(0, math.ceil((l - ox) * z - 0.5)), math.ceil((r - ox) * z - 0.5)
+            y0, y1 = max(0, math.ceil((bt - oy) * z - 0.5)), math.ceil((t - oy) * z - 0.5)
+            if x1 <= x0 or y1 <= y0:
+                continue
+            ctx.scissor = (x0, y0, x1 - x0, y1 - y0)
+            b.shapes.draw()
+        ctx.scissor = None
+
+    def draw_active(self, tool, trace: Trace):
+        self.active.draw(tool, trace)
+
+
+class ActiveTrace:
+    # El trazo en curso. Si la herramienta sabe compilar solo lo nuevo (grow_shapes,
+    # el spray), se mantiene un ShapeElementList que crece en la GPU; si no, modo inmediato.
+    def __init__(self):
+        self.trace: Optional[Trace] = None
+        self.done = 0
+        self.shapes: Optional[ShapeElementList] = None
+
+    def draw(self, tool, trace: Trace):
+        grow = getattr(tool, "grow_shapes", None)
+        if grow is None:
+            tool.draw_traces([trace])
+            return
+        if self.trace is not trace:
+            self.trace = trace
+            self.done = 0
+            self.shapes = ShapeElementList()
+        for sh in grow(trace, self.done):
+            self.shapes.append(sh)
+        self.done = len(trace)
+        self.shapes.draw()
@@ -0,0 +1,159 @@
+# Reproduce una sesión grabada con `main.py --grabar`: carga el mismo dibujo con la misma
+# semilla del spray, le pasa a Paint los eventos grabados (a la velocidad original con
+# --tiempo-real o lo más rápido posible) y dibuja un cuadro donde se dibujó al grabar.
+# Informa la latencia de cada manejador y de cada cuadro, y compara el dibujo final con la
+# huella grabada: sale con código 1 si no coincide, así una sesión sirve de prueba de
+# regresión. Con --salida guarda las medidas en el formato de benchmarks/suite.py, para
+# compararlas con `suite.py comparar`.
+# Uso: python replay.py sesion.pnts [--tiempo-real] [--ventana] [--salida medidas.json]
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from session import DRAG, END, FRAME, KEY, NAMES, PRESS, RELEASE, SCROLL, fingerprint, read_session
+
+HANDLERS = {PRESS: "on_mouse_press", DRAG: "on_mouse_drag", RELEASE: "on_mouse_release", KEY: "on_key_press",
+            SCROLL: "on_mouse_scroll"}
+
+
+def percentile(values: list[float], p: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def summary(times: dict[int, list[float]]) -> dict[str, float]:
+    out = {}
+    print(f"{'evento':>18} {'cant.':>7} {'media':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'máx':>8}  (ms)")
+    for kind, values in times.items():
+        if not values:
+            continue
+        values.sort()
+        name = NAMES[kind]
+        row = {"media": sum(values) / len(values), "p50": percentile(values, 0.5), "p95": percentile(values, 0.95),
+               "p99": percentile(values, 0.99), "max": values[-1]}
+        print(f"{name:>18} {len(values):>7} " + " ".join(f"{v:>8.3f}" for v in row.values()))
+        for stat, value in row.items():
+            out[f"{name}_{stat}_ms"] = value
+    return out
+
+
+def replay(path: str, real_time: bool, visible: bool) -> tuple[bool, dict[str, float], dict]:
+    # Se importa aquí: ARCADE_HEADLESS tiene que estar puesto antes de cargar arcade
+    import arcade
+    from main import HEIGHT, Paint, TITLE, WIDTH
+    from tiles import TILE, BUDGET
+    from tool import SprayTool
+
+    with open(path, "rb") as f:
+        meta, events = read_session(f)
+        events = list(events)
+    end = next((args for kind, _t, args in events if kind == END), None)
+    window = arcade.Window(WIDTH, HEIGHT, TITLE, visible=visible)
+    info = {"gl": f"{window.ctx.info.VENDOR} {window.ctx.info.RENDERER}", "semilla": meta.get("semilla")}
+    # Los guardados de la sesión (O, B, E) y el autoguardado van a un directorio temporal:
+    # ni pisan archivos ni cambian el dibujo de partida, que se copia ahí antes de cargarlo
+    tmp = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    # El dibujo de partida (main.py lo copia junto a la sesión) se busca en su directorio
+    load = meta.get("archivo")
+    if load:
+        load = shutil.copy(os.path.join(os.path.dirname(os.path.abspath(path)), load), tmp)
+    os.chdir(tmp)
+    try:
+        SprayTool.seed(meta.get("semilla"))
+        app = Paint(load, autosave_path=os.path.join(tmp, "autosave.journal"), tiles=meta.get("mosaicos", False),
+                    tile_size=meta.get("mosaico_px", TILE),
+                    tile_budget=meta.get("mosaicos_mb", BUDGET // 2 ** 20) * 2 ** 20)
+        window.show_view(app)
+        start = meta.get("inicio")
+        if start and [len(app.traces), fingerprint(app.traces).hex()] != start:
+            print("El dibujo de partida no coincide con el de la grabación:", meta.get("archivo"))
+            return False, {}, info
+        handlers = {kind: getattr(app, name) for kind, name in HANDLERS.items()}
+        times: dict[int, list[float]] = {kind: [] for kind in (*HANDLERS, FRAME)}
+        t0 = time.perf_counter()
+        for kind, t, args in events:
+            if kind == END:
+                break
+            if real_time:
+                wait = t0 + t - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+            start_ns = time.perf_counter_ns()
+            if kind == FRAME:
+                app.on_draw()
+                window.ctx.finish()
+            else:
+                handlers[kind](*args)
+            times[kind].append((time.perf_counter_ns() - start_ns) / 1e6)
+            if visible and kind == FRAME:
+                window.flip()
+                window.dispatch_events()
+        total = time.perf_counter() - t0
+        # Un trazo en curso al cerrar la ventana también cuenta, igual que al grabar
+        ok = True
+        if end is None:
+            print("La sesión no tiene estado final (grabación cortada): no se verifica el dibujo")
+        elif (len(app.traces), fingerprint(app.traces)) != end:
+            print(f"El dibujo final NO coincide con la grabación ({len(app.traces)} trazos, se grabaron {end[0]})")
+            ok = False
+        else:
+            print(f"El dibujo final coincide con la grabación ({end[0]} trazos)")
+        n = sum(len(v) for v in times.values())
+        print(f"{n} eventos en {total:.2f} s ({n / total if total else 0:.0f} por segundo)")
+        results = summary(times)
+        results["total_ms"] = total * 1000
+        app.journal.close()
+        # Los guardados manuales corren en hilos aparte: se esperan antes de borrar el temporal
+        for thread in threading.enumerate():
+            if thread.name == "guardar":
+                thread.join()
+        return ok, results, info
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp, ignore_errors=True)
+        window.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproducir una sesión grabada con main.py --grabar")
+    parser.add_argument("sesion")
+    parser.add_argument("--tiempo-real", action="store_true", help="respetar los tiempos grabados entre eventos")
+    parser.add_argument("--ventana", action="store_true", help="mostrar la ventana (por defecto sin ventana)")
+    parser.add_argument("--salida", help="guardar las medidas en JSON, comparables con benchmarks/suite.py comparar")
+    args = parser.parse_args()
+    if not args.ventana:
+        os.environ.setdefault("ARCADE_HEADLESS", "1")
+    try:
+        ok, results, info = replay(args.sesion, args.tiempo_real, args.ventana)
+    except (OSError, ValueError) as e:
+        print("No se pudo reproducir la sesión:", e)
+        sys.exit(1)
+    if args.salida and results:
+        import arcade
+        name = os.path.splitext(os.path.basename(args.sesion))[0]
+        report = {
+            "meta": {
+                "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "python": platform.python_version(),
+                "arcade": arcade.version.VERSION,
+                "gl": info["gl"],
+                "mezcla": name,
+                "semilla": info["semilla"],
+                "tiempo_real": args.tiempo_real,
+            },
+            "resultados": {name: results},
+        }
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        print("Medidas en", args.salida)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import functools
+import hashlib
+import json
+import struct
+import time
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional
+from records import Trace
+
+# Grabación de sesiones (.pnts, little-endian): los eventos de entrada de Paint tal como
+# llegan, para reproducirlos después con replay.py.
+#   cabecera   MAGIC, versión u16, largo u32 y un JSON con la semilla del spray, el archivo
+#              cargado y las opciones de la ventana
+#   eventos    tipo u8, µs desde el evento anterior u32 y los argumentos del manejador
+#              (PAYLOAD[tipo]); FRAME marca cada on_draw
+#   END        al cerrar: cantidad de trazos y huella (fingerprint) del estado final
+# Un archivo cortado (cierre abrupto) se lee hasta el último evento entero y sin END.
+MAGIC = b"PNTS"
+VERSION = 2
+HEADER = struct.Struct("<4sHI")
+EVENT = struct.Struct("<BI")
+
+PRESS, DRAG, RELEASE, KEY, SCROLL, FRAME, END = range(1, 8)
+NAMES = {PRESS: "on_mouse_press", DRAG: "on_mouse_drag", RELEASE: "on_mouse_release", KEY: "on_key_press",
+         SCROLL: "on_mouse_scroll", FRAME: "cuadro"}
+PAYLOAD = {
+    PRESS: struct.Struct("<hhBH"),      # x, y, botón, modificadores
+    DRAG: struct.Struct("<hhhhBH"),     # x, y, dx, dy, botones, modificadores
+    RELEASE: struct.Struct("<hhBH"),
+    KEY: struct.Struct("<QH"),          # tecla (las de key.user_key pasan de 32 bits), modificadores
+    SCROLL: struct.Struct("<hhff"),     # x, y, scroll_x, scroll_y
+    FRAME: struct.Struct("<"),
+    END: struct.Struct("<I16s"),        # trazos, huella
+}
+# Versión 1: la tecla iba en u32
+KEY_V1 = struct.Struct("<IH")
+# Un hueco más largo entre eventos se guarda con este tope (algo más de una hora)
+DT_MAX = 2 ** 32 - 1
+
+Event = tuple[int, float, tuple]
+
+
+def fingerprint(traces: Iterable[Trace]) -> bytes:
+    # Huella del dibujo: los trazos en orden, con el mismo diccionario que dibujo.txt
+    h = hashlib.blake2b(digest_size=16)
+    for tr in traces:
+        h.update(json.dumps(tr.to_dict(), sort_keys=True).encode("utf-8"))
+    return h.digest()
+
+
+class Recorder:
+    # Escribe los eventos a medida que llegan, con búfer; close() agrega el estado final
+    def __init__(self, path: str, meta: dict):
+        self.path = path
+        self._file: BinaryIO = open(path, "wb")
+        data = json.dumps(meta).encode("utf-8")
+        self._file.write(HEADER.pack(MAGIC, VERSION, len(data)) + data)
+        self._last = time.perf_counter()
+        self.events = 0
+
+    def add(self, kind: int, *args):
+        now = time.perf_counter()
+        dt = min(DT_MAX, round((now - self._last) * 1e6))
+        self._last = now
+        if kind in (PRESS, DRAG, RELEASE, KEY):
+            # Con pantallas de alta densidad las coordenadas pueden llegar como float
+            args = tuple(int(a) for a in args)
+        self._file.write(EVENT.pack(kind, dt) + PAYLOAD[kind].pack(*args))
+        self.events += 1
+
+    def close(self, traces: Optional[Iterable[Trace]] = None):
+        if traces is not None:
+            traces = list(traces)
+            self.add(END, len(traces), fingerprint(traces))
+        self._file.close()
+
+
+def recorded(kind: int) -> Callable:
+    # Graba cada llamada a un manejador de una vista que tenga `self.recorder` (None: nada)
+    def wrap(fn):
+        @functools.wraps(fn)
+        def run(self, *args):
+            if self.recorder is not None:
+                self.recorder.add(kind, *args)
+            return fn(self, *args)
+        return run
+    return wrap
+
+
+def read_session(f: BinaryIO) -> tuple[dict, Iterator[Event]]:
+    # (cabecera, eventos (tipo, segundos desde el comienzo, argumentos)) de un .pnts abierto
+    magic, version, n = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("No es una sesión grabada")
+    if version > VERSION:
+        raise ValueError(f"Versión de sesión no soportada: {version}")
+    meta = json.loads(f.read(n))
+    payloads = PAYLOAD if version > 1 else {**PAYLOAD, KEY: KEY_V1}
+
+    def events() -> Iterator[Event]:
+        t = 0.0
+        while True:
+            head = f.read(EVENT.size)
+            if len(head) < EVENT.size:
+                return
+            kind, dt = EVENT.unpack(head)
+            payload = payloads.get(kind)
+            if payload is None:
+                raise ValueError(f"Evento desconocido: {kind}")
+            data = f.read(payload.size)
+            if len(data) < payload.size:
+                return
+            t += dt / 1e6
+            yield kind, t, payload.unpack(data)
+    return meta, events()
@@ -0,0 +1,123 @@
+from array import array
+from typing import Iterable
+from records import Trace, StrokeTrace
+
+# Tolerancia por defecto en píxeles: ningún punto quitado queda a más de esta
+# distancia del trazo simplificado
+TOLERANCE = 1.0
+
+
+def far_enough(coords: array, x: int, y: int, min_dist: float) -> bool:
+    # Filtro durante el arrastre: descarta puntos repetidos o más cerca que min_dist del anterior
+    if not coords:
+        return True
+    dx = x - coords[-2]
+    dy = y - coords[-1]
+    if dx == 0 and dy == 0:
+        return False
+    return dx * dx + dy * dy >= min_dist * min_dist
+
+
+def rdp(coords: array, tol: float) -> array:
+    # Ramer–Douglas–Peucker iterativo sobre coordenadas planas; conserva los extremos
+    n = len(coords) // 2
+    if n < 3:
+        return coords
+    keep = bytearray(n)
+    keep[0] = keep[n - 1] = 1
+    tol2 = tol * tol
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        ax, ay = coords[2 * i], coords[2 * i + 1]
+        bx, by = coords[2 * j], coords[2 * j + 1]
+        vx, vy = bx - ax, by - ay
+        seg2 = vx * vx + vy * vy
+        best, best_d = -1, tol2
+        for k in range(i + 1, j):
+            px, py = coords[2 * k] - ax, coords[2 * k + 1] - ay
+            if seg2 == 0:
+                d = px * px + py * py
+            else:
+                cross = px * vy - py * vx
+                d = cross * cross / seg2
+            if d > best_d:
+                best, best_d = k, d
+        if best >= 0:
+            keep[best] = 1
+            if best - i > 1:
+                stack.append((i, best))
+            if j - best > 1:
+                stack.append((best, j))
+    if all(keep):
+        return coords
+    out = array("i")
+    for k in range(n):
+        if keep[k]:
+            out.append(coords[2 * k])
+            out.append(coords[2 * k + 1])
+    return out
+
+
+def simplify_trace(tr: StrokeTrace, tol: float) -> StrokeTrace:
+    # Devuelve el mismo trazo si no hay nada para quitar
+    coords = rdp(tr.coords, tol)
+    if coords is tr.coords:
+        return tr
+    out = StrokeTrace(tr.tool, tr.color, coords, tr.width)
+    out.transform = tr.transform
+    out.layer = tr.layer
+    return out
+
+
+def simplify_items(items: Iterable[tuple[int, Trace]], tol: float) -> tuple[list, list, int, int]:
+    # Pasada por todo el documento: devuelve (reemplazos, originales, puntos antes, puntos después)
+    # con los pares (secuencia, trazo) de lápiz y marcador que cambiaron
+    new: list[tuple[int, Trace]] = []
+    old: list[tuple[int, Trace]] = []
+    before = after = 0
+    for seq, tr in items:
+        if tr.tool not in ("PENCIL", "MARKER"):
+            continue
+        simple = simplify_trace(tr, tol)
+        before += len(tr)
+        after += len(simple)
+        if simple is not tr:
+            new.append((seq, simple))
+            old.append((seq, tr))
+    return new, old, before, after
+
+
+def main():
+    import argparse
+    import json
+    from binformat import BinaryDrawing, is_binary, write_binary
+    from records import from_dict, split_header
+
+    parser = argparse.ArgumentParser(description="Simplifica los trazos de lápiz y marcador de un dibujo")
+    parser.add_argument("src")
+    parser.add_argument("dst")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCE, help="en píxeles (por defecto %(default)s)")
+    args = parser.parse_args()
+    binary = is_binary(args.src)
+    if binary:
+        with BinaryDrawing(args.src) as drawing:
+            traces = list(drawing)
+            header = drawing.layers
+    else:
+        with open(args.src, "r", encoding="utf-8") as f:
+            header, items = split_header(json.load(f))
+        traces = [from_dict(d) for d in items]
+    new, _old, before, after = simplify_items(enumerate(traces), args.tolerancia)
+    for i, tr in new:
+        traces[i] = tr
+    if binary:
+        write_binary(args.dst, traces, layers=header)
+    else:
+        with open(args.dst, "w", encoding="utf-8") as f:
+            json.dump(([header] if header else []) + [tr.to_dict() for tr in traces], f)
+    print(f"{before} puntos -> {after} ({before - after} quitados, {len(new)} trazos cambiados)")
+
+
+if __name__ == "__main__":
+    main()
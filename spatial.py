@@ -0,0 +1,147 @@
+import bisect
+from array import array
+from typing import Optional
+from geometry import coord_bounds
+from records import Trace, flatten
+
+CELL = 64
+
+Box = tuple[float, float, float, float]
+
+
+def trace_bounds(tr: Trace) -> Optional[Box]:
+    # Caja (left, bottom, right, top) que incluye el grosor con el que el borrador lo toca
+    if tr.transform is not None:
+        tr = flatten(tr)
+    t = tr.tool
+    if t in ("PENCIL", "MARKER", "SPRAY"):
+        c = tr.coords
+        if not c:
+            return None
+        left, bottom, right, top = coord_bounds(c)
+        pad = _pad(tr)
+        return (left - pad, bottom - pad, right + pad, top + pad)
+    if t in ("LINE", "RECT"):
+        pad = tr.width / 2 if t == "LINE" else tr.width
+        return (min(tr.x1, tr.x2) - pad, min(tr.y1, tr.y2) - pad, max(tr.x1, tr.x2) + pad, max(tr.y1, tr.y2) + pad)
+    if t == "CIRCLE":
+        r = ((tr.x2 - tr.x1) ** 2 + (tr.y2 - tr.y1) ** 2) ** 0.5 + tr.width / 2
+        return (tr.x1 - r, tr.y1 - r, tr.x1 + r, tr.y1 + r)
+    if t == "CELL":
+        left, bottom, right, top = coord_bounds(tr.coords)
+        return (left, bottom, right + tr.size, top + tr.size)
+    return None
+
+
+def _pad(tr: Trace) -> float:
+    return 0 if tr.tool == "SPRAY" else (tr.width or (1 if tr.tool == "PENCIL" else 8)) / 2
+
+
+def grow_bounds(box: Optional[Box], tr: Trace, coords: array) -> Optional[Box]:
+    # Caja de un trazo a mano o de spray (sin transformación) después de agregarle coords:
+    # la que tenía más la de los puntos nuevos, sin recorrer los viejos
+    if not coords:
+        return box
+    left, bottom, right, top = coord_bounds(coords)
+    pad = _pad(tr)
+    if box is None:
+        return (left - pad, bottom - pad, right + pad, top + pad)
+    return (min(box[0], left - pad), min(box[1], bottom - pad), max(box[2], right + pad), max(box[3], top + pad))
+
+
+class CellGrid:
+    # Índice disperso de las celdas pintadas, por tamaño de celda: (tamaño, x, y) -> números
+    # de secuencia de los trazos CELL que la pintan, en orden cronológico (el último es el
+    # que se ve). Pintar encima reemplaza la celda en lugar de apilar otra (cells.paint_cells);
+    # solo los dibujos viejos pueden tener más de uno por celda.
+    def __init__(self):
+        self.cells: dict[tuple[int, int, int], list[int]] = {}
+
+    def insert(self, seq: int, trace: Trace):
+        cells, s, c = self.cells, trace.size, trace.coords
+        for i in range(0, len(c), 2):
+            owners = cells.setdefault((s, c[i], c[i + 1]), [])
+            if owners and owners[-1] > seq:
+                bisect.insort(owners, seq)
+            else:
+                owners.append(seq)
+
+    def remove(self, seq: int, trace: Trace):
+        cells, s, c = self.cells, trace.size, trace.coords
+        for i in range(0, len(c), 2):
+            key = (s, c[i], c[i + 1])
+            owners = cells[key]
+            owners.remove(seq)
+            if not owners:
+                del cells[key]
+
+    def owners(self, size: int, x: int, y: int) -> list[int]:
+        return self.cells.get((size, x, y), [])
+
+    def clear(self):
+        self.cells.clear()
+
+
+class GridIndex:
+    # Cuadrícula uniforme: cada celda guarda las claves (con su caja) cuyas cajas la tocan
+    def __init__(self, cell: int = CELL):
+        self.cell = cell
+        self.cells: dict[tuple[int, int], dict[int, Box]] = {}
+        self.boxes: dict[int, Box] = {}
+
+    def _keys(self, box: Box):
+        c = self.cell
+        for gx in range(int(box[0] // c), int(box[2] // c) + 1):
+            for gy in range(int(box[1] // c), int(box[3] // c) + 1):
+                yield gx, gy
+
+    def insert(self, key: int, box: Optional[Box]):
+        if box is None:
+            return
+        self.boxes[key] = box
+        for k in self._keys(box):
+            self.cells.setdefault(k, {})[key] = box
+
+    def remove(self, key: int):
+        box = self.boxes.pop(key, None)
+        if box is None:
+            return
+        for k in self._keys(box):
+            bucket = self.cells[k]
+            del bucket[key]
+            if not bucket:
+                del self.cells[k]
+
+    def update(self, key: int, box: Optional[Box]):
+        if self.boxes.get(key) == box:
+            return
+        self.remove(key)
+        self.insert(key, box)
+
+    def query(self, left: float, bottom: float, right: float, top: float) -> set[int]:
+        found: set[int] = set()
+        c = self.cell
+        gx0, gy0, gx1, gy1 = int(left // c), int(bottom // c), int(right // c), int(top // c)
+        if (gx1 - gx0 + 1) * (gy1 - gy0 + 1) > len(self.cells):
+            # Caja más grande que lo ocupado (vista muy alejada): se recorren las celdas con trazos
+            buckets = (b for (gx, gy), b in self.cells.items() if gx0 <= gx <= gx1 and gy0 <= gy <= gy1)
+        else:
+            buckets = (self.cells.get(k) for k in self._keys((left, bottom, right, top)))
+        for bucket in buckets:
+            if bucket:
+                found.update(key for key, b in bucket.items()
+                             if b[0] <= right and b[2] >= left and b[1] <= top and b[3] >= bottom)
+        return found
+
+    def extent(self) -> Optional[Box]:
+        # Caja de todas las celdas ocupadas, redondeada a la cuadrícula
+        if not self.cells:
+            return None
+        xs = [gx for gx, _gy in self.cells]
+        ys = [gy for _gx, gy in self.cells]
+        c = self.cell
+        return (min(xs) * c, min(ys) * c, (max(xs) + 1) * c, (max(ys) + 1) * c)
+
+    def clear(self):
+        self.cells.clear()
+        self.boxes.clear()
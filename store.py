@@ -0,0 +1,252 @@
+import bisect
+from array import array
+from typing import Collection, Iterable, Iterator, Optional
+from records import Trace
+from spatial import Box, CellGrid, GridIndex, grow_bounds, trace_bounds
+
+COMPACT_MIN = 64
+
+
+class TraceStore:
+    # Reemplaza la lista plana de trazos: índice cronológico (números de secuencia
+    # crecientes), cubetas por herramienta, rangos sucios para la caché de dibujo y
+    # una cuadrícula espacial con la caja de cada trazo para el borrador, más el índice
+    # disperso de las celdas pintadas (CellGrid).
+    # Los borrados dejan una lápida en _order que se compacta de vez en cuando.
+    # Cada capa tiene además su propio TraceStore (layers) con los mismos números de
+    # secuencia, su índice espacial y sus rangos sucios: la caché de cada capa y el borrador
+    # trabajan solo con las capas que les tocan. Las capas no llevan cuadrícula de celdas
+    # ni capas propias (layered=False).
+    def __init__(self, traces: Iterable[Trace] = (), layered: bool = True):
+        self._next_seq = 0
+        self._order: list[int] = []
+        self._dead = 0
+        self._items: dict[int, Trace] = {}
+        self._seqs: dict[int, int] = {}
+        self.buckets: dict[str, dict[int, Trace]] = {}
+        self.dirty: list[tuple[int, int]] = []
+        self.index = GridIndex()
+        self.cells = CellGrid()
+        self.layers: Optional[dict[int, TraceStore]] = {} if layered else None
+        for tr in traces:
+            self.append(tr)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __bool__(self) -> bool:
+        return bool(self._items)
+
+    def __iter__(self) -> Iterator[Trace]:
+        items = self._items
+        for seq in self._order:
+            tr = items.get(seq)
+            if tr is not None:
+                yield tr
+
+    def __getitem__(self, i: int) -> Trace:
+        return self._items[self.seq_at(i)]
+
+    def get(self, seq: int) -> Optional[Trace]:
+        return self._items.get(seq)
+
+    def items(self) -> Iterator[tuple[int, Trace]]:
+        items = self._items
+        for seq in self._order:
+            tr = items.get(seq)
+            if tr is not None:
+                yield seq, tr
+
+    def seq_of(self, trace: Trace) -> int:
+        return self._seqs[id(trace)]
+
+    def seq_at(self, i: int) -> int:
+        if i >= 0:
+            self._compact()
+            return self._order[i]
+        # Desde el final solo hay lápidas sueltas: el recorrido es corto
+        items = self._items
+        for seq in reversed(self._order):
+            if seq in items:
+                i += 1
+                if i == 0:
+                    return seq
+        raise IndexError(i)
+
+    def _compact(self):
+        if self._dead:
+            items = self._items
+            self._order = [seq for seq in self._order if seq in items]
+            self._dead = 0
+
+    def _trim(self):
+        # Quita lápidas del final para que pop y [-1] sigan siendo O(1)
+        order = self._order
+        while order and order[-1] not in self._items:
+            order.pop()
+            self._dead -= 1
+
+    def _add(self, seq: int, trace: Trace, box: Optional[Box] = None):
+        self._items[seq] = trace
+        self._seqs[id(trace)] = seq
+        self.buckets.setdefault(trace.tool, {})[seq] = trace
+        if self.layers is None:
+            # Una capa: la caja ya la calculó el TraceStore principal
+            self.index.insert(seq, box)
+            return
+        box = trace_bounds(trace)
+        self.index.insert(seq, box)
+        if trace.tool == "CELL":
+            self.cells.insert(seq, trace)
+        layer = self.layers.get(trace.layer)
+        if layer is None:
+            layer = self.layers[trace.layer] = TraceStore(layered=False)
+        layer._place(seq)
+        layer._add(seq, trace, box)
+
+    def _drop(self, seq: int) -> Trace:
+        trace = self._items.pop(seq)
+        del self._seqs[id(trace)]
+        del self.buckets[trace.tool][seq]
+        self.index.remove(seq)
+        self.dirty.append((seq, seq))
+        if self.layers is not None:
+            if trace.tool == "CELL":
+                self.cells.remove(seq, trace)
+            self.layers[trace.layer].remove_seq(seq)
+        return trace
+
+    def append(self, trace: Trace):
+        seq = self._next_seq
+        self._next_seq += 1
+        self._order.append(seq)
+        self._add(seq, trace)
+
+    def pop(self) -> Trace:
+        trace = self._drop(self._order.pop())
+        self._trim()
+        return trace
+
+    def remove(self, trace: Trace) -> int:
+        seq = self._seqs[id(trace)]
+        self.remove_seq(seq)
+        return seq
+
+    def remove_seq(self, seq: int) -> Trace:
+        trace = self._drop(seq)
+        self._dead += 1
+        self._trim()
+        if self._dead > COMPACT_MIN and self._dead > len(self._items):
+            self._compact()
+        return trace
+
+    def insert_seq(self, seq: int, trace: Trace):
+        # Reinserta un trazo en su posición cronológica original (p. ej. al deshacer un borrado).
+        # Una secuencia nueva (carga de un dibujo) es un append: la caché la toma sola.
+        self._place(seq)
+        self._add(seq, trace)
+
+    def _place(self, seq: int):
+        if seq < self._next_seq:
+            self.dirty.append((seq, seq))
+        order = self._order
+        i = bisect.bisect_left(order, seq)
+        if i < len(order) and order[i] == seq:
+            self._dead -= 1
+        else:
+            order.insert(i, seq)
+        self._next_seq = max(self._next_seq, seq + 1)
+
+    def clear(self):
+        if self._order:
+            self.dirty.append((self._order[0], self._order[-1]))
+        self._order.clear()
+        self._dead = 0
+        self._items.clear()
+        self._seqs.clear()
+        self.buckets.clear()
+        self.index.clear()
+        self.cells.clear()
+        for layer in (self.layers or {}).values():
+            layer.clear()
+
+    def touch(self, trace: Trace):
+        # Llamar cuando cambian las coordenadas de un trazo (arrastre del trazo en curso)
+        seq = self._seqs[id(trace)]
+        box = trace_bounds(trace)
+        self.index.update(seq, box)
+        if self.layers is not None:
+            self.layers[trace.layer].index.update(seq, box)
+
+    def extend(self, trace: Trace, coords: array):
+        # Agrega puntos a un trazo a mano o de spray ya guardado (APPEND de un colaborador):
+        # la caja crece con los puntos nuevos y el trazo queda sucio para las cachés
+        seq = self._seqs[id(trace)]
+        trace.coords.extend(coords)
+        box = grow_bounds(self.index.boxes.get(seq), trace, coords)
+        self.index.update(seq, box)
+        self.dirty.append((seq, seq))
+        if self.layers is not None:
+            layer = self.layers[trace.layer]
+            layer.index.update(seq, box)
+            layer.dirty.append((seq, seq))
+
+    def query(self, left: float, bottom: float, right: float, top: float,
+              layers: Optional[Collection[int]] = None) -> set[int]:
+        # Secuencias cuya caja toca el rectángulo. Con layers, solo las de esas capas: se
+        # consultan sus índices y los trazos de las demás ni se miran
+        if layers is None:
+            return self.index.query(left, bottom, right, top)
+        found: set[int] = set()
+        for lid in layers:
+            layer = self.layers.get(lid)
+            if layer:
+                found |= layer.index.query(left, bottom, right, top)
+        return found
+
+    def near(self, x: float, y: float, r: float, layers: Optional[Collection[int]] = None) -> list[Trace]:
+        # Candidatos cuya caja toca el cuadrado de lado 2r alrededor de (x, y), en orden cronológico
+        seqs = sorted(self.query(x - r, y - r, x + r, y + r, layers))
+        return [self._items[seq] for seq in seqs]
+
+    def near_segments(self, segments: list[tuple[float, float, float, float]], r: float,
+                      layers: Optional[Collection[int]] = None) -> list[tuple[Trace, list[int]]]:
+        # Igual que near para varios tramos (x1, y1, x2, y2): cada candidato cuya caja toca la
+        # de algún tramo agrandada en r, en orden cronológico, con los índices de esos tramos
+        found: dict[int, list[int]] = {}
+        for k, (x1, y1, x2, y2) in enumerate(segments):
+            for seq in self.query(min(x1, x2) - r, min(y1, y2) - r, max(x1, x2) + r, max(y1, y2) + r, layers):
+                found.setdefault(seq, []).append(k)
+        return [(self._items[seq], found[seq]) for seq in sorted(found)]
+
+    def take_dirty(self) -> list[tuple[int, int]]:
+        dirty, self.dirty = self.dirty, []
+        return dirty
+
+    def between(self, lo: float, hi: float) -> list[Trace]:
+        # Trazos vivos con lo <= seq <= hi, en orden cronológico
+        order = self._order
+        i = bisect.bisect_left(order, lo)
+        j = bisect.bisect_right(order, hi)
+        items = self._items
+        return [items[seq] for seq in order[i:j] if seq in items]
+
+    def runs(self) -> Iterator[tuple[str, list[Trace]]]:
+        # Tramos consecutivos de la misma herramienta, en el orden en que se dibujaron
+        run: list[Trace] = []
+        tool = None
+        for tr in self:
+            if tr.tool != tool and run:
+                yield tool, run
+                run = []
+            tool = tr.tool
+            run.append(tr)
+        if run:
+            yield tool, run
+
+    def tools(self) -> set[str]:
+        return {name for name, bucket in self.buckets.items() if bucket}
+
+    def to_list(self) -> list[dict]:
+        # Formato JSON de dibujo.txt
+        return [tr.to_dict() for tr in self]
@@ -0,0 +1,328 @@
+import json
+import os
+import sys
+import time
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional
+import numpy as np
+from autosave import is_journal, recover
+from binformat import BinaryDrawing, is_binary
+from geometry import VECTOR_MIN
+from loader import iter_json, read_layers
+from raster import CELL_BORDER, MARKER_WIDTH
+from records import Trace, flatten, from_dict
+from spatial import Box, trace_bounds
+
+# Exportación a SVG por partes: svg_parts es un generador que devuelve el documento de a
+# pedazos (un elemento, o un tramo de un camino largo), así ni el texto entero ni el
+# dibujo entero tienen que estar en memoria; desde un archivo los trazos se leen de a uno.
+# Lápiz y marcador son caminos con diferencias relativas; los trazos SPRAY o CELL seguidos
+# del mismo color se juntan en un solo camino (un cuadrado por punto o por celda), lo que
+# mantiene el orden del dibujo. Las coordenadas se redondean a múltiplos de `step`
+# unidades (1 por defecto: enteros) y el eje y se invierte, como en una imagen.
+
+STEP = 1
+# Puntos por pedazo de un camino
+CHUNK = 1 << 14
+BACKGROUND = "#ffffff"
+# Margen alrededor de la caja del dibujo (la del spray no incluye el lado de sus cuadrados)
+PAD = 1
+
+
+def _hex(color) -> str:
+    return "#%02x%02x%02x" % tuple(color[:3])
+
+
+@lru_cache(maxsize=1024)
+def _paint(attr: str, color: tuple) -> str:
+    # fill="#rrggbb" o stroke="#rrggbb", con su opacidad si el color es translúcido
+    out = f'{attr}="{_hex(color)}"'
+    if len(color) == 4 and color[3] < 255:
+        out += f' {attr}-opacity="{color[3] / 255:.3g}"'
+    return out
+
+
+def _opaque(color) -> bool:
+    return len(color) < 4 or color[3] == 255
+
+
+def scan(traces: Iterable[Trace]) -> Optional[Box]:
+    # Caja de todo el dibujo (None si está vacío)
+    left = bottom = right = top = None
+    for tr in traces:
+        box = trace_bounds(tr)
+        if box is None:
+            continue
+        if left is None:
+            left, bottom, right, top = box
+        else:
+            left, bottom = min(left, box[0]), min(bottom, box[1])
+            right, top = max(right, box[2]), max(top, box[3])
+    return None if left is None else (left, bottom, right, top)
+
+
+class _Writer:
+    # Convierte trazos (coordenadas del mundo) en elementos SVG. Lleva el camino abierto
+    # de SPRAY o CELL y su último punto, para seguir el mismo camino con el trazo siguiente
+    # si es del mismo tipo y color.
+    def __init__(self, left: int, top: int, step: int):
+        self.left = left
+        self.top = top
+        self.step = step
+        self.run: Optional[tuple] = None
+        self.last: Optional[tuple[int, int]] = None
+        self.paths = 0
+
+    def _q(self, v: float) -> int:
+        return int(round(v / self.step)) * self.step
+
+    def _point(self, x: float, y: float) -> tuple[int, int]:
+        return self._q(x - self.left), self._q(self.top - y)
+
+    def _deltas(self, coords, dy: int = 0) -> Iterator[list[int]]:
+        # Diferencias dx, dy, ... (en coordenadas del SVG, redondeadas al paso) de cada
+        # punto respecto del anterior, empezando por self.last, sin las nulas, de a CHUNK
+        # puntos; deja en self.last el último punto. Los trazos cortos van sin NumPy, donde
+        # armar los arreglos cuesta más que recorrerlos.
+        px, py = self.last
+        if len(coords) < 2 * VECTOR_MIN:
+            q = self.step
+            out = []
+            for x, y in zip(coords[0::2], coords[1::2]):
+                x, y = x - self.left, self.top - dy - y
+                if q != 1:
+                    x, y = round(x / q) * q, round(y / q) * q
+                if x != px or y != py:
+                    out += (x - px, y - py)
+                    px, py = x, y
+            self.last = (px, py)
+            if out:
+                yield out
+            return
+        p = np.frombuffer(coords, dtype=np.int32).reshape(-1, 2).astype(np.int64)
+        xy = np.empty((len(p) + 1, 2), dtype=np.int64)
+        xy[0] = px, py
+        xy[1:, 0] = p[:, 0] - self.left
+        xy[1:, 1] = self.top - dy - p[:, 1]
+        if self.step != 1:
+            xy[1:] = np.rint(xy[1:] / self.step).astype(np.int64) * self.step
+        self.last = tuple(xy[-1].tolist())
+        d = np.diff(xy, axis=0)
+        d = d[(d != 0).any(axis=1)]
+        for i in range(0, len(d), CHUNK):
+            yield d[i:i + CHUNK].ravel().tolist()
+
+    def trace(self, tr: Trace) -> Iterator[str]:
+        tr = flatten(tr)
+        t = tr.tool
+        if t in ("SPRAY", "CELL"):
+            # Un translúcido no se junta: cada trazo se mezcla una vez, como en la ventana
+            key = (t, tuple(tr.color)) if _opaque(tr.color) else None
+            if self.run is not None and (key is None or key != self.run):
+                yield self.close()
+            if not tr.coords:
+                return
+            if self.run is None:
+                yield from self._open(tr)
+            yield from (self._spray(tr) if t == "SPRAY" else self._cells(tr))
+            if key is None:
+                yield self.close()
+            return
+        if self.run is not None:
+            yield self.close()
+        if t in ("PENCIL", "MARKER"):
+            if len(tr) >= 2:
+                width = 1 if t == "PENCIL" else (tr.width or MARKER_WIDTH)
+                yield from self._polyline(tr, width)
+            return
+        x1, y1 = self._point(tr.x1, tr.y1)
+        x2, y2 = self._point(tr.x2, tr.y2)
+        stroke = _paint("stroke", tr.color)
+        if t == "LINE" and (tr.x1, tr.y1) != (tr.x2, tr.y2):
+            yield f'<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" {stroke} stroke-width="{tr.width}"/>\n'
+        elif t == "RECT":
+            yield (f'<rect x="{min(x1, x2)}" y="{min(y1, y2)}" width="{abs(x2 - x1)}" height="{abs(y2 - y1)}" '
+                   f'{stroke} stroke-width="{tr.width}"/>\n')
+        elif t == "CIRCLE":
+            # El borde va hacia adentro del radio, como tool.ring_shape
+            r = int(((tr.x2 - tr.x1) ** 2 + (tr.y2 - tr.y1) ** 2) ** 0.5)
+            if tr.width < r:
+                yield f'<circle cx="{x1}" cy="{y1}" r="{r - tr.width / 2:g}" {stroke} stroke-width="{tr.width}"/>\n'
+            else:
+                yield f'<circle cx="{x1}" cy="{y1}" r="{r}" {_paint("fill", tr.color)}/>\n'
+
+    def _polyline(self, tr: Trace, width: int) -> Iterator[str]:
+        c = tr.coords
+        self.last = self._point(c[0], c[1])
+        yield f'<path {_paint("stroke", tr.color)} stroke-width="{width}" d="M{self.last[0]} {self.last[1]}l'
+        empty = True
+        for d in self._deltas(c):
+            yield ("" if empty else " ") + " ".join(map(str, d))
+            empty = False
+        # Todos los puntos cayeron en el mismo lugar: un tramo nulo, como en la ventana
+        yield '0 0"/>\n' if empty else '"/>\n'
+        self.last = None
+
+    def _open(self, tr: Trace) -> Iterator[str]:
+        self.run = (tr.tool, tuple(tr.color))
+        self.last = None
+        self.paths += 1
+        if tr.tool == "SPRAY":
+            yield f'<path {_paint("fill", tr.color)} d="'
+        else:
+            # El relleno va en el grupo para que el <use> del borde no lo herede
+            yield f'<g {_paint("fill", tr.color)}><path id="c{self.paths}" d="'
+
+    def _squares(self, coords, shape: str, dy: int = 0, offset: float = 0) -> Iterator[str]:
+        # Un subcamino por punto: después de "z" el punto actual vuelve al comienzo del
+        # subcamino, así cada uno se mueve con la diferencia entera respecto del anterior y
+        # solo el primero lleva el corrimiento de la esquina
+        if self.last is None:
+            x, y = self._point(coords[0], coords[1] + dy)
+            yield f"M{x + offset:g} {y + offset:g}{shape}"
+            self.last = (x, y)
+        for d in self._deltas(coords, dy):
+            yield "".join([f"m{dx} {dy}{shape}" for dx, dy in zip(d[0::2], d[1::2])])
+
+    def _spray(self, tr: Trace) -> Iterator[str]:
+        # tool._points_shape: un cuadrado de 1 × 1 centrado en cada punto
+        return self._squares(tr.coords, "h1v1h-1z", offset=-0.5)
+
+    def _cells(self, tr: Trace) -> Iterator[str]:
+        # Desde la esquina de arriba a la izquierda (en el SVG) de cada celda
+        s = tr.size
+        return self._squares(tr.coords, f"h{s}v{s}h-{s}z", s)
+
+    def close(self) -> str:
+        tool, _color = self.run
+        self.run = None
+        if tool == "SPRAY":
+            return '"/>\n'
+        # El borde fino de las celdas, el mismo camino sin relleno
+        return (f'"/></g><use xlink:href="#c{self.paths}" fill="none" {_paint("stroke", CELL_BORDER)} '
+                f'stroke-width="1"/>\n')
+
+
+def svg_parts(traces: Iterable[Trace], box: Optional[Box], layers: Optional[dict] = None,
+              step: int = STEP) -> Iterator[str]:
+    # El documento de a pedazos. Con varias capas, `traces` se recorre una vez por capa
+    # visible (de abajo hacia arriba, cada una en un <g> con su opacidad); las capas que
+    # no están en la cabecera van arriba de todo.
+    if box is None:
+        box = (0, 0, 1, 1)
+    left, bottom = int(np.floor(box[0])) - PAD, int(np.floor(box[1])) - PAD
+    right, top = int(np.ceil(box[2])) + PAD, int(np.ceil(box[3])) + PAD
+    w, h = right - left, top - bottom
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+           f'width="{w}" height="{h}" viewBox="0 0 {w} {h}">\n'
+           f'<rect width="{w}" height="{h}" fill="{BACKGROUND}"/>\n'
+           '<g fill="none">\n')
+    writer = _Writer(left, top, step)
+    order = (layers or {}).get("layers", [])
+    if len(order) <= 1:
+        for tr in traces:
+            yield from writer.trace(tr)
+        if writer.run is not None:
+            yield writer.close()
+    else:
+        known = {d["id"] for d in order}
+        for d in order + [None]:
+            if d is not None and not d.get("visible", True):
+                continue
+            opacity = 1.0 if d is None else d.get("opacity", 1.0)
+            group = f'<g id="capa-{"otras" if d is None else d["id"]}"'
+            group += f' opacity="{opacity:.3g}">\n' if opacity < 1 else ">\n"
+            # El grupo se abre con el primer trazo de la capa: las vacías no quedan
+            empty = True
+            for tr in traces:
+                if (tr.layer == d["id"]) if d is not None else (tr.layer not in known):
+                    if empty:
+                        yield group
+                        empty = False
+                    yield from writer.trace(tr)
+            if writer.run is not None:
+                yield writer.close()
+            if not empty:
+                yield "</g>\n"
+    yield "</g>\n</svg>\n"
+
+
+def write_svg(path: str, traces: Iterable[Trace], layers: Optional[dict] = None, step: int = STEP,
+              box: Optional[Box] = None):
+    # `traces` se recorre una vez para la caja (si no se da) y otra por capa
+    if box is None:
+        box = scan(traces)
+    with open(path, "w", encoding="utf-8") as f:
+        for part in svg_parts(traces, box, layers, step):
+            f.write(part)
+
+
+class DrawingSource:
+    # Los trazos de un archivo, que se pueden recorrer varias veces sin tenerlos todos en
+    # memoria: el JSON se vuelve a leer por partes y el .pntb se decodifica de a un trazo.
+    # El diario se recupera entero (sus operaciones pueden borrar trazos ya agregados).
+    def __init__(self, path: str):
+        self.path = path
+        self.layers = read_layers(path)
+        self._store = recover(path) if is_journal(path) else None
+        self._drawing = BinaryDrawing(path) if self._store is None and is_binary(path) else None
+
+    def __iter__(self) -> Iterator[Trace]:
+        if self._store is not None:
+            return iter(self._store)
+        if self._drawing is not None:
+            return iter(self._drawing)
+        return self._json()
+
+    def _json(self) -> Iterator[Trace]:
+        with open(self.path, "r", encoding="utf-8") as f:
+            for d in iter_json(f):
+                if "tool" in d:
+                    yield from_dict(d)
+
+    def box(self) -> Optional[Box]:
+        # El .pntb tiene la caja de cada trazo en la tabla, sin decodificarlo
+        return scan(self) if self._drawing is None else self._drawing.box()
+
+    def close(self):
+        if self._drawing is not None:
+            self._drawing.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def export(path: str, out_dir: str, step: int = STEP) -> tuple[str, str, float]:
+    # (origen, destino o mensaje de error, segundos)
+    t0 = time.perf_counter()
+    dst = os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0] + ".svg")
+    try:
+        with DrawingSource(path) as src:
+            write_svg(dst, src, src.layers, step, src.box())
+    except (OSError, ValueError, KeyError, json.JSONDecodeError) as e:
+        return path, f"error: {e}", time.perf_counter() - t0
+    return path, dst, time.perf_counter() - t0
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Exporta dibujos a SVG sin ventana, leyéndolos por partes")
+    parser.add_argument("archivos", nargs="+", help="dibujo.txt, .pntb o autosave.journal")
+    parser.add_argument("--salida", default=".", help="carpeta de los SVG (por defecto la actual)")
+    parser.add_argument("--paso", type=int, default=STEP, help="redondear las coordenadas a múltiplos de este paso")
+    args = parser.parse_args()
+    os.makedirs(args.salida, exist_ok=True)
+    failed = 0
+    for path in args.archivos:
+        src, dst, secs = export(path, args.salida, max(1, args.paso))
+        failed += dst.startswith("error:")
+        print(f"{src} -> {dst} ({secs:.2f} s)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import math
+from collections import OrderedDict
+from typing import Optional
+import arcade
+from arcade.gl import geometry
+from arcade.shape_list import ShapeElementList
+from pyglet.math import Mat4
+from records import Trace
+from render import PAD, RANGE_MAX, ActiveTrace, overlaps, trace_shapes
+from spatial import Box
+from store import TraceStore
+from viewport import lod_level
+
+TILE = 256
+BUDGET = 64 * 1024 * 1024
+# Sin multimuestreo por defecto, igual que el dibujo directo en pantalla; con 4 u 8 los
+# mosaicos quedan suavizados (el modo de segmentos no)
+SAMPLES = 0
+
+# Mezcla al dibujar en un mosaico transparente: el color queda premultiplicado y el
+# alfa se acumula bien; al pegar el mosaico en pantalla se mezcla como premultiplicado.
+BLEND_INTO_TILE = (0x0302, 0x0303, 1, 0x0303)
+BLEND_TILE = (1, 0x0303)
+
+
+class _Tile:
+    __slots__ = ("fbo", "valid", "pending")
+
+    def __init__(self, fbo):
+        self.fbo = fbo
+        self.valid = False
+        self.pending: list[Trace] = []
+
+
+class TileCache:
+    # Alternativa a ViewCache: los trazos terminados se rasterizan en mosaicos de
+    # tile x tile píxeles de pantalla (framebuffers fuera de pantalla) al zoom actual, y
+    # cada cuadro solo pega los mosaicos visibles. Un trazo nuevo se dibuja encima de los
+    # mosaicos que toca su caja; un borrado, deshacer o reinserción vuelve a rasterizar esos
+    # mosaicos desde el índice espacial. Mover la vista solo rasteriza los mosaicos que
+    # entran; cambiar el zoom los descarta todos. Los mosaicos residentes respetan `budget`
+    # bytes de GPU (los menos usados se liberan). Con samples > 1 los trazos se dibujan con
+    # multimuestreo en un framebuffer auxiliar y se resuelven en el mosaico.
+    def __init__(self, width: int, height: int, tile: int = TILE, budget: int = BUDGET, samples: int = SAMPLES):
+        self.ctx = arcade.get_window().ctx
+        self.width = width
+        self.height = height
+        self.tile = tile
+        # Como mínimo los que cubren la vista en cualquier posición
+        self.capacity = max(budget // (tile * tile * 4), (math.ceil(width / tile) + 1) * (math.ceil(height / tile) + 1))
+        self.tiles: OrderedDict[tuple[int, int], _Tile] = OrderedDict()
+        self.visible: list[tuple[int, int]] = []
+        self.zoom = 1.0
+        self.active = ActiveTrace()
+        self.renders = 0
+        self._origin = (0.0, 0.0)
+        self._boxes: dict[int, Box] = {}
+        self._last = -1
+        self._tools: dict = {}
+        self._free: list = []
+        self._full = geometry.quad_2d_fs()
+        self._program = self.ctx.utility_textured_quad_program
+        samples = min(samples, self.ctx.info.MAX_SAMPLES)
+        self._scratch = None
+        if samples > 1:
+            self._scratch = self.ctx.framebuffer(color_attachments=[self.ctx.texture((tile, tile), samples=samples)])
+
+    def memory(self) -> int:
+        return (len(self.tiles) + len(self._free)) * self.tile * self.tile * 4
+
+    def _rect(self, key: tuple[int, int]) -> Box:
+        # Parte del mundo que cubre un mosaico al zoom actual
+        s = self.tile / self.zoom
+        return (key[0] * s, key[1] * s, (key[0] + 1) * s, (key[1] + 1) * s)
+
+    def _pad(self) -> float:
+        return max(PAD << lod_level(self.zoom), PAD / self.zoom)
+
+    def _touching(self, box: Optional[Box]):
+        if box is None:
+            return
+        pad = self._pad()
+        padded = (box[0] - pad, box[1] - pad, box[2] + pad, box[3] + pad)
+        for key, tile in self.tiles.items():
+            if overlaps(self._rect(key), padded):
+                yield tile
+
+    def _invalidate(self, box: Optional[Box]):
+        for tile in self._touching(box):
+            tile.valid = False
+            tile.pending.clear()
+
+    def _invalidate_all(self):
+        for tile in self.tiles.values():
+            tile.valid = False
+            tile.pending.clear()
+
+    def sync(self, store: TraceStore, tools: dict, committed: int, view: Optional[Box] = None, zoom: float = 1.0):
+        # view: parte visible del mundo (por defecto el lienzo alineado a la pantalla)
+        self._tools = tools
+        if zoom != self.zoom:
+            self.zoom = zoom
+            self._free += [tile.fbo for tile in self.tiles.values()]
+            self.tiles.clear()
+        if view is None:
+            view = (0, 0, self.width / zoom, self.height / zoom)
+        self._origin = (view[0], view[1])
+        upto = store.seq_at(committed - 1) if committed else -1
+        boxes = self._boxes
+        for lo, hi in store.take_dirty():
+            if hi - lo > RANGE_MAX:
+                self._invalidate_all()
+                self._boxes = boxes = {seq: store.index.boxes.get(seq) for seq, _tr in store.items() if seq <= self._last}
+                continue
+            for seq in range(lo, min(hi, self._last) + 1):
+                # Caja vieja (trazo que salió) y nueva (trazo que volvió o se reemplazó)
+                self._invalidate(boxes.pop(seq, None))
+                if store.get(seq) is not None:
+                    boxes[seq] = store.index.boxes.get(seq)
+                    self._invalidate(boxes[seq])
+        for tr in store.between(self._last + 1, upto):
+            seq = store.seq_of(tr)
+            boxes[seq] = store.index.boxes.get(seq)
+            for tile in self._touching(boxes[seq]):
+                if tile.valid:
+                    tile.pending.append(tr)
+            self._last = seq
+        t = self.tile
+        self.visible = [(i, j)
+                        for j in range(math.floor(view[1] * zoom / t), math.ceil(view[3] * zoom / t))
+                        for i in range(math.floor(view[0] * zoom / t), math.ceil(view[2] * zoom / t))]
+        for key in self.visible:
+            self._update(key, store)
+
+    def _update(self, key: tuple[int, int], store: TraceStore):
+        tile = self.tiles.get(key)
+        if tile is None:
+            while len(self.tiles) >= self.capacity:
+                _k, old = self.tiles.popitem(last=False)
+                self._free.append(old.fbo)
+            fbo = self._free.pop() if self._free else self.ctx.framebuffer(
+                color_attachments=[self.ctx.texture((self.tile, self.tile))])
+            tile = self.tiles[key] = _Tile(fbo)
+        else:
+            self.tiles.move_to_end(key)
+        if not tile.valid:
+            pad = self._pad()
+            x0, y0, x1, y1 = self._rect(key)
+            seqs = sorted(s for s in store.index.query(x0 - pad, y0 - pad, x1 + pad, y1 + pad) if s <= self._last)
+            self._render(key, tile, [store.get(s) for s in seqs], clear=True)
+            tile.valid = True
+        elif tile.pending:
+            self._render(key, tile, tile.pending, clear=False)
+        tile.pending = []
+
+    def _render(self, key: tuple[int, int], tile: _Tile, traces: list[Trace], clear: bool):
+        ctx = self.ctx
+        level = lod_level(self.zoom)
+        shapes = ShapeElementList()
+        for tr in traces:
+            for sh in trace_shapes(self._tools, tr, level):
+                shapes.append(sh)
+        x0, y0, x1, y1 = self._rect(key)
+        target = self._scratch or tile.fbo
+        projection, view, blend = ctx.projection_matrix, ctx.view_matrix, ctx.blend_func
+        with target.activate():
+            if clear:
+                target.clear(color=(0, 0, 0, 0))
+            elif target is not tile.fbo:
+                # Se parte del contenido actual del mosaico para dibujar solo lo nuevo encima
+                ctx.disable(ctx.BLEND)
+                tile.fbo.color_attachments[0].use(0)
+                self._full.render(self._program)
+            ctx.projection_matrix = Mat4.orthogonal_projection(x0, x1, y0, y1, -100, 100)
+            ctx.view_matrix = Mat4()
+            ctx.blend_func = BLEND_INTO_TILE
+            shapes.draw()
+        ctx.projection_matrix, ctx.view_matrix, ctx.blend_func = projection, view, blend
+        if target is not tile.fbo:
+            # copy_framebuffer deja enlazados sus framebuffers: activate() restaura el anterior
+            with tile.fbo.activate():
+                ctx.copy_framebuffer(target, tile.fbo)
+        self.renders += 1
+
+    def draw(self):
+        # Cada mosaico se pega con un viewport de su tamaño en su lugar de la pantalla
+        ctx = self.ctx
+        blend, viewport = ctx.blend_func, ctx.viewport
+        ctx.enable(ctx.BLEND)
+        ctx.blend_func = BLEND_TILE
+        ctx.scissor = (0, 0, self.width, self.height)
+        t = self.tile
+        sx, sy = round(self._origin[0] * self.zoom), round(self._origin[1] * self.zoom)
+        for key in self.visible:
+            self.tiles[key].fbo.color_attachments[0].use(0)
+            ctx.viewport = (key[0] * t - sx, key[1] * t - sy, t, t)
+            self._full.render(self._program)
+        ctx.viewport = viewport
+        ctx.scissor = None
+        ctx.blend_func = blend
+        ctx.disable(ctx.BLEND)
+
+    def draw_active(self, tool, trace: Trace):
+        self.active.draw(tool, trace)
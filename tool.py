@@ -1,21 +1,142 @@
 import arcade
-import random
-from typing import Protocol
+import math
+import numpy as np
+from array import array
+from typing import Collection, Optional, Protocol
+from arcade import shape_list
+from arcade.shape_list import Shape, ShapeElementList
+from arcade.types import Color
+from pyglet.math import Mat4
+from records import Trace, StrokeTrace, SprayTrace, ShapeTrace, CellTrace, flatten, transformed
+from geometry import IDENTITY, VECTOR_MIN, Affine, apply, around, disk_count, inside_polygon, pack, points, \
+    polyline_dist, rect_dist, ring_dist, seg_dist, seg_rect_dist, segs_dist, translation
+from cells import trim_cells
+from history import Change
+from render import trace_shapes
+from simplify import rdp
+from spatial import Box
+from store import TraceStore
 
 
 class Tool(Protocol):
     name: str
-    def draw_traces(self, traces: list[dict]): ...
+    def draw_traces(self, traces: list[Trace]): ...
+    def create_shapes(self, trace: Trace) -> list[Shape]: ...
     def get_name(self) -> str: ...
 
 
+class _ArrayShape(Shape):
+    # Shape armado directamente desde un array('f') de x, y intercalados, sin pasar
+    # por listas de tuplas. Todas las figuras retenidas son TRIANGLE_STRIP: así comparten
+    # un solo lote en el ShapeElementList y se dibujan en el orden en que se agregaron.
+    def __init__(self, xy: array, color, colors: Optional[np.ndarray] = None):
+        # colors: un RGBA por vértice (si no, todo del color `color`)
+        self.ctx = arcade.get_window().ctx
+        self.program = self.ctx.line_generic_with_colors_program
+        self.mode = arcade.gl.TRIANGLE_STRIP
+        n = len(xy) // 2
+        c = Color.from_iterable(color)
+        data = array("f", bytes(24 * n))
+        data[0::6] = xy[0::2]
+        data[1::6] = xy[1::2]
+        if colors is not None:
+            view = np.frombuffer(data, dtype=np.float32).reshape(n, 6)
+            view[:, 2:] = colors
+        else:
+            for k in range(4):
+                data[2 + k::6] = array("f", [c[k]]) * n
+        self.points = ()
+        self.colors = [c]
+        self.data = data
+        self.vertices = n
+        self.geometry = None
+        self.buffer = None
+
+
+def _strip_shape(coords: array, color, width: float) -> Shape:
+    # Igual que arcade.draw_line_strip con grosor (get_points_for_thick_line), también para grosor 1
+    hw = width / 2
+    out = array("f")
+    for i in range(2, len(coords), 2):
+        sx, sy, ex, ey = coords[i - 2], coords[i - 1], coords[i], coords[i + 1]
+        vx, vy = sx - ex, sy - ey
+        length = math.sqrt(vx * vx + vy * vy)
+        if length == 0:
+            nx, ny = hw, hw
+        else:
+            nx, ny = vy / length * hw, -vx / length * hw
+        out.extend((sx - nx, sy - ny, sx + nx, sy + ny, ex - nx, ey - ny, ex + nx, ey + ny))
+    return _ArrayShape(out, color)
+
+
+_SQUARE = np.array([(-1, -1), (-1, -1), (1, -1), (-1, 1), (1, 1), (1, 1)], dtype=np.float32)
+
+
+def _points_shape(coords: array, color, size: float) -> Shape:
+    # Cuadrados de lado size como arcade.draw_points, unidos con triángulos degenerados
+    pts = np.frombuffer(coords, dtype=np.int32).reshape(-1, 1, 2).astype(np.float32)
+    out = array("f")
+    out.frombytes((pts + _SQUARE * (size / 2)).tobytes())
+    return _ArrayShape(out, color)
+
+
+# Relleno y borde de una celda como create_rectangle_filled y create_rectangle_outline
+# (borde de 1 centrado en el contorno), cada uno con sus extremos repetidos para unirlos
+# con triángulos degenerados: (dx, dy) en unidades de celda más (ex, ey) en unidades de borde
+_CELL_FILL = np.array([(0, 0, 0, 0), (0, 0, 0, 0), (0, 1, 0, 0), (1, 0, 0, 0), (1, 1, 0, 0), (1, 1, 0, 0)],
+                      dtype=np.float32)
+_CELL_BORDER = np.array([(0, 1, -1, 1), (0, 1, -1, 1), (0, 1, 1, -1), (1, 1, 1, 1), (1, 1, -1, -1),
+                         (1, 0, 1, -1), (1, 0, -1, 1), (0, 0, -1, -1), (0, 0, 1, 1), (0, 1, -1, 1),
+                         (0, 1, 1, -1), (0, 1, 1, -1)], dtype=np.float32)
+CELL_BORDER = arcade.color.DARK_SLATE_GRAY
+
+
+def _cells_shape(coords: array, size: int, color, border: bool = True) -> Shape:
+    # Todas las celdas de un trazo en una sola figura: por celda el relleno y encima su
+    # borde, en el mismo orden en que se dibujaban como figuras sueltas
+    corners = np.frombuffer(coords, dtype=np.int32).reshape(-1, 1, 2).astype(np.float32)
+    parts = [_CELL_FILL, _CELL_BORDER] if border else [_CELL_FILL]
+    offsets = np.concatenate(parts)
+    xy = corners + offsets[:, :2] * size + offsets[:, 2:] * 0.5
+    colors = np.concatenate([np.tile(np.asarray(Color.from_iterable(color), dtype=np.float32), (len(_CELL_FILL), 1)),
+                             np.tile(np.asarray(CELL_BORDER, dtype=np.float32), (len(_CELL_BORDER), 1))][:len(parts)])
+    out = array("f")
+    out.frombytes(xy.tobytes())
+    return _ArrayShape(out, color, np.tile(colors, (len(corners), 1)))
+
+
+def ring_shape(cx: float, cy: float, r: float, w: float, color, step: int = 1) -> Shape:
+    # Mismo anillo que arcade.draw_circle_outline: borde hacia adentro y mismos segmentos.
+    # Con step > 1 (vista alejada) se usan los segmentos de un círculo step veces más chico.
+    size = r * 2 / step
+    segments = 6 if size <= 12 else max(3, int(size) // 2)
+    st = math.pi * 2 / segments
+    out = array("f")
+    for i in range(segments + 1):
+        s, c = math.sin(i * st), math.cos(i * st)
+        out.extend((cx + s * r, cy + c * r, cx + s * (r - w), cy + c * (r - w)))
+    return _ArrayShape(out, color)
+
+
 class PencilTool(Tool):
     name = "PENCIL"
 
-    def draw_traces(self, traces: list[dict]):
+    def draw_traces(self, traces: list[StrokeTrace]):
         for trace in traces:
-            if trace["tool"] == self.name and len(trace["trace"]) >= 2:
-                arcade.draw_line_strip(trace["trace"], trace["color"])
+            if trace.tool == self.name and len(trace) >= 2:
+                arcade.draw_line_strip(trace.points(), trace.color)
+
+    def create_shapes(self, trace: StrokeTrace) -> list[Shape]:
+        if len(trace) < 2:
+            return []
+        return [_strip_shape(trace.coords, trace.color, 1)]
+
+    def lod_shapes(self, trace: StrokeTrace, step: int) -> list[Shape]:
+        # Vista alejada: step unidades del mundo son cerca de un píxel. Se simplifica con esa
+        # tolerancia y el trazo se engorda a step para seguir viéndose como una línea de 1 px.
+        if len(trace) < 2:
+            return []
+        return [_strip_shape(rdp(trace.coords, step), trace.color, step)]
 
     def get_name(self) -> str:
         return self.name
@@ -27,11 +148,21 @@ class MarkerTool(Tool):
     def __init__(self, width: int = 8):
         self.width = width
 
-    def draw_traces(self, traces: list[dict]):
+    def draw_traces(self, traces: list[StrokeTrace]):
         for trace in traces:
-            if trace["tool"] == self.name and len(trace["trace"]) >= 2:
-                w = trace.get("width", self.width)
-                arcade.draw_line_strip(trace["trace"], trace["color"], w)
+            if trace.tool == self.name and len(trace) >= 2:
+                w = trace.width or self.width
+                arcade.draw_line_strip(trace.points(), trace.color, w)
+
+    def create_shapes(self, trace: StrokeTrace) -> list[Shape]:
+        if len(trace) < 2:
+            return []
+        return [_strip_shape(trace.coords, trace.color, trace.width or self.width)]
+
+    def lod_shapes(self, trace: StrokeTrace, step: int) -> list[Shape]:
+        if len(trace) < 2:
+            return []
+        return [_strip_shape(rdp(trace.coords, step), trace.color, trace.width or self.width)]
 
     def get_name(self) -> str:
         return self.name
@@ -39,29 +170,156 @@ class MarkerTool(Tool):
 
 class SprayTool(Tool):
     name = "SPRAY"
+    # Generador compartido por todas las instancias; seed() lo vuelve reproducible
+    rng = np.random.default_rng()
 
     def __init__(self, radius: int = 10, density: int = 20):
         self.radius = radius
         self.density = density
 
-    def make_spray(self, x: int, y: int) -> list[tuple[int, int]]:
-        pts: list[tuple[int, int]] = []
-        for _ in range(self.density):
-            rx = random.uniform(-self.radius, self.radius)
-            ry = random.uniform(-self.radius, self.radius)
-            if rx * rx + ry * ry <= self.radius * self.radius:
-                pts.append((int(x + rx), int(y + ry)))
-        return pts
-
-    def draw_traces(self, traces: list[dict]):
+    @classmethod
+    def seed(cls, seed: Optional[int]):
+        cls.rng = np.random.default_rng(seed)
+
+    def make_spray(self, x: int, y: int) -> array:
+        # Muestreo exacto del disco (r = R·sqrt(u)), sin rechazo. `density` sigue siendo la
+        # cantidad de tiros sobre el cuadrado: se generan los que caían dentro del círculo.
+        n = max(1, round(self.density * math.pi / 4))
+        u = self.rng.random((2, n))
+        r = self.radius * np.sqrt(u[0])
+        t = 2 * math.pi * u[1]
+        pts = np.empty(2 * n, dtype=np.int32)
+        pts[0::2] = x + r * np.cos(t)
+        pts[1::2] = y + r * np.sin(t)
+        out = array("i")
+        out.frombytes(pts.tobytes())
+        return out
+
+    def draw_traces(self, traces: list[SprayTrace]):
         for trace in traces:
-            if trace["tool"] == self.name and trace.get("points"):
-                arcade.draw_points(trace["points"], trace["color"], 1)
+            if trace.tool == self.name and len(trace):
+                arcade.draw_points(trace.points(), trace.color, 1)
+
+    def create_shapes(self, trace: SprayTrace) -> list[Shape]:
+        return self.grow_shapes(trace, 0)
+
+    def grow_shapes(self, trace: SprayTrace, start: int) -> list[Shape]:
+        # Solo los puntos desde el índice start: el spray en curso crece sin recompilarse
+        if start >= len(trace):
+            return []
+        return [_points_shape(trace.coords[2 * start:], trace.color, 1)]
+
+    def lod_shapes(self, trace: SprayTrace, step: int) -> list[Shape]:
+        # Un punto de lado step por cada celda de step x step ocupada: en la vista alejada
+        # cada celda es cerca de un píxel, así que se ve igual con muchos menos vértices
+        if not len(trace):
+            return []
+        cells = np.unique(np.frombuffer(trace.coords, dtype=np.int32).reshape(-1, 2) // step, axis=0)
+        coords = array("i")
+        coords.frombytes((cells * step + step // 2).astype(np.int32).tobytes())
+        return [_points_shape(coords, trace.color, step)]
 
     def get_name(self) -> str:
         return self.name
 
 
+def _stroke_width(tr: StrokeTrace) -> int:
+    return tr.width or (1 if tr.tool == "PENCIL" else 8)
+
+
+def _long(tr: Trace) -> bool:
+    # Trazos con puntos suficientes para probarlos con NumPy
+    return isinstance(tr, (StrokeTrace, SprayTrace, CellTrace)) and len(tr.coords) >= 2 * VECTOR_MIN
+
+
+def hits_at(traces: list[Trace], x: int, y: int, r: float) -> np.ndarray:
+    # Qué trazos toca el disco de radio r en (x, y), con los núcleos de geometry.py: los
+    # trazos de cada herramienta se prueban todos juntos. Mismo resultado que
+    # EraserTool._hits trazo por trazo.
+    out = np.zeros(len(traces), dtype=bool)
+    groups: dict[str, list[int]] = {}
+    for i, tr in enumerate(traces):
+        # Lápiz, marcador y spray sin puntos no se tocan
+        if not isinstance(tr, (StrokeTrace, SprayTrace)) or tr.coords:
+            groups.setdefault("STROKE" if tr.tool in ("PENCIL", "MARKER") else tr.tool, []).append(i)
+    for t, idx in groups.items():
+        trs = [traces[i] for i in idx]
+        if t == "STROKE":
+            pts, starts = pack([tr.coords for tr in trs])
+            reach = np.array([r + _stroke_width(tr) / 2 for tr in trs])
+            hit = polyline_dist(pts, starts, x, y) <= reach
+        elif t == "SPRAY":
+            pts, starts = pack([tr.coords for tr in trs])
+            hit = disk_count(pts, starts, x, y, r) > 0
+        elif t == "CELL":
+            pts, starts = pack([tr.coords for tr in trs])
+            size = np.repeat([float(tr.size) for tr in trs], [len(tr) for tr in trs])
+            px, py = pts[:, 0], pts[:, 1]
+            hit = np.minimum.reduceat(rect_dist(x, y, px, px + size, py, py + size), starts) <= r
+        else:
+            x1, y1, x2, y2, w = np.array([(tr.x1, tr.y1, tr.x2, tr.y2, tr.width) for tr in trs], dtype=np.float64).T
+            if t == "LINE":
+                hit = seg_dist(x, y, x1, y1, x2, y2) <= r + w / 2
+            elif t == "RECT":
+                left, right = np.minimum(x1, x2), np.maximum(x1, x2)
+                bottom, top = np.minimum(y1, y2), np.maximum(y1, y2)
+                hit = (rect_dist(x, y, left - w, right + w, bottom - w, top + w) <= r) & \
+                    ~(rect_dist(x, y, left + w, right - w, bottom + w, top - w) <= r)
+            else:
+                hit = ring_dist(x1, y1, x2, y2, x, y) <= r + w / 2
+        out[idx] = hit
+    return out
+
+
+def hits_along(tr: Trace, segs: list[tuple[int, int, int, int]], r: float) -> bool:
+    # Si el barrido de radio r por los tramos segs (ax, ay, bx, by) toca al trazo de
+    # lápiz, marcador, spray o celdas, probando todos los pares de tramos juntos; los que
+    # están lejos en x o en y se descartan antes de medir. Mismo resultado que
+    # EraserTool._hits_segment tramo por tramo.
+    s = np.array(segs, dtype=np.float64)
+    ax, ay, bx, by = (s[:, i, None] for i in range(4))
+    pts = points(tr.coords)
+    reach = r if isinstance(tr, (SprayTrace, CellTrace)) else r + _stroke_width(tr) / 2
+    x0, x1 = np.minimum(ax, bx) - reach, np.maximum(ax, bx) + reach
+    y0, y1 = np.minimum(ay, by) - reach, np.maximum(ay, by) + reach
+    if isinstance(tr, CellTrace):
+        px, py, s = pts[:, 0], pts[:, 1], tr.size
+        k, i = np.nonzero((px <= x1) & (px + s >= x0) & (py <= y1) & (py + s >= y0))
+        px, py = px[i], py[i]
+        return bool((seg_rect_dist(ax[k, 0], ay[k, 0], bx[k, 0], by[k, 0], px, px + s, py, py + s) <= r).any())
+    if isinstance(tr, SprayTrace):
+        px, py = pts[:, 0], pts[:, 1]
+        k, i = np.nonzero((x0 <= px) & (px <= x1) & (y0 <= py) & (py <= y1))
+        return bool((seg_dist(px[i], py[i], ax[k, 0], ay[k, 0], bx[k, 0], by[k, 0]) <= r).any())
+    cx, cy, dx, dy = pts[:-1, 0], pts[:-1, 1], pts[1:, 0], pts[1:, 1]
+    far = ((cx < x0) & (dx < x0)) | ((cx > x1) & (dx > x1)) | ((cy < y0) & (dy < y0)) | ((cy > y1) & (dy > y1))
+    k, i = np.nonzero(~far)
+    d = segs_dist(ax[k, 0], ay[k, 0], bx[k, 0], by[k, 0], cx[i], cy[i], dx[i], dy[i])
+    return bool((d <= reach).any())
+
+
+def cells_at(tr: CellTrace, x: int, y: int, r: float) -> np.ndarray:
+    # Qué celdas del trazo toca el disco de radio r en (x, y)
+    pts = points(tr.coords)
+    px, py, s = pts[:, 0], pts[:, 1], tr.size
+    return rect_dist(x, y, px, px + s, py, py + s) <= r
+
+
+def cells_along(tr: CellTrace, segs: list[tuple[int, int, int, int]], r: float) -> np.ndarray:
+    # Qué celdas del trazo toca el barrido de radio r por los tramos segs, como hits_along
+    s = np.array(segs, dtype=np.float64)
+    ax, ay, bx, by = (s[:, i, None] for i in range(4))
+    pts = points(tr.coords)
+    px, py, size = pts[:, 0], pts[:, 1], tr.size
+    x0, x1 = np.minimum(ax, bx) - r, np.maximum(ax, bx) + r
+    y0, y1 = np.minimum(ay, by) - r, np.maximum(ay, by) + r
+    k, i = np.nonzero((px <= x1) & (px + size >= x0) & (py <= y1) & (py + size >= y0))
+    hit = seg_rect_dist(ax[k, 0], ay[k, 0], bx[k, 0], by[k, 0], px[i], px[i] + size, py[i], py[i] + size) <= r
+    out = np.zeros(len(pts), dtype=bool)
+    out[i[hit]] = True
+    return out
+
+
 class EraserTool(Tool):
     name = "ERASER"
 
@@ -87,56 +345,195 @@ class EraserTool(Tool):
         cy = min(max(py, bottom), top)
         return ((px - cx) ** 2 + (py - cy) ** 2) ** 0.5 <= self.radius
 
-    def erase_at(self, traces: list[dict], x: int, y: int) -> None:
-        keep: list[dict] = []
-        for tr in traces:
-            t = tr["tool"]
-            hit = False
-            if t in ("PENCIL", "MARKER") and tr.get("trace"):
-                seq = tr["trace"]
-                w = tr.get("width", 1 if t == "PENCIL" else 8)
-                for i in range(len(seq) - 1):
-                    x1, y1 = seq[i]
-                    x2, y2 = seq[i + 1]
-                    if self._dist_point_to_segment(x, y, x1, y1, x2, y2) <= self.radius + w / 2:
-                        hit = True
-                        break
-            elif t == "SPRAY":
-                for (px, py) in tr.get("points", []):
-                    if ((px - x) ** 2 + (py - y) ** 2) ** 0.5 <= self.radius:
-                        hit = True
-                        break
-            elif t == "LINE":
-                (x1, y1) = tr["start"]; (x2, y2) = tr["end"]
-                w = tr.get("width", 2)
-                if self._dist_point_to_segment(x, y, x1, y1, x2, y2) <= self.radius + w / 2:
+    def _hits(self, tr: Trace, x: int, y: int) -> bool:
+        t = tr.tool
+        hit = False
+        if t in ("PENCIL", "MARKER"):
+            c = tr.coords
+            w = tr.width or (1 if t == "PENCIL" else 8)
+            for i in range(0, len(c) - 2, 2):
+                if self._dist_point_to_segment(x, y, c[i], c[i + 1], c[i + 2], c[i + 3]) <= self.radius + w / 2:
                     hit = True
-            elif t == "RECT":
-                (x1, y1) = tr["start"]; (x2, y2) = tr["end"]
-                left, right = min(x1, x2), max(x1, x2)
-                bottom, top = min(y1, y2), max(y1, y2)
-                w = tr.get("width", 2)
-                if self._overlaps_rect(x, y, left - w, right + w, bottom - w, top + w):
-                    if not self._overlaps_rect(x, y, left + w, right - w, bottom + w, top - w):
-                        hit = True
-            elif t == "CIRCLE":
-                (cx, cy) = tr["start"]; (ex, ey) = tr["end"]
-                r = ((ex - cx) ** 2 + (ey - cy) ** 2) ** 0.5
-                w = tr.get("width", 2)
-                dist = ((x - cx) ** 2 + (y - cy) ** 2) ** 0.5
-                if abs(dist - r) <= self.radius + w / 2:
+                    break
+        elif t == "SPRAY":
+            c = tr.coords
+            for i in range(0, len(c), 2):
+                if ((c[i] - x) ** 2 + (c[i + 1] - y) ** 2) ** 0.5 <= self.radius:
                     hit = True
-            elif t == "CELL":
-                (rx, ry) = tr["xy"]; s = tr["size"]
-                if self._overlaps_rect(x, y, rx, rx + s, ry, ry + s):
+                    break
+        elif t == "LINE":
+            x1, y1, x2, y2 = tr.x1, tr.y1, tr.x2, tr.y2
+            w = tr.width
+            if self._dist_point_to_segment(x, y, x1, y1, x2, y2) <= self.radius + w / 2:
+                hit = True
+        elif t == "RECT":
+            x1, y1, x2, y2 = tr.x1, tr.y1, tr.x2, tr.y2
+            left, right = min(x1, x2), max(x1, x2)
+            bottom, top = min(y1, y2), max(y1, y2)
+            w = tr.width
+            if self._overlaps_rect(x, y, left - w, right + w, bottom - w, top + w):
+                if not self._overlaps_rect(x, y, left + w, right - w, bottom + w, top - w):
                     hit = True
-            if not hit:
-                keep.append(tr)
-        traces[:] = keep
-
-    def draw_traces(self, traces: list[dict]):
+        elif t == "CIRCLE":
+            cx, cy, ex, ey = tr.x1, tr.y1, tr.x2, tr.y2
+            r = ((ex - cx) ** 2 + (ey - cy) ** 2) ** 0.5
+            w = tr.width
+            dist = ((x - cx) ** 2 + (y - cy) ** 2) ** 0.5
+            if abs(dist - r) <= self.radius + w / 2:
+                hit = True
+        elif t == "CELL":
+            c, s = tr.coords, tr.size
+            hit = any(self._overlaps_rect(x, y, c[i], c[i] + s, c[i + 1], c[i + 1] + s) for i in range(0, len(c), 2))
+        return hit
+
+    def erase_at(self, traces: TraceStore, x: int, y: int, layers: Optional[Collection[int]] = None) -> Change:
+        # Devuelve el cambio: los trazos borrados y, de los de celdas, la copia sin las
+        # celdas tocadas (_erase). Los trazos largos se prueban juntos con los núcleos de
+        # NumPy (hits_at); los cortos, uno por uno, porque en ellos pesa más el costo fijo de
+        # armar los arreglos. Los transformados se prueban con la transformación aplicada.
+        # Con layers solo se borra en esas capas (las visibles y sin bloquear): los
+        # candidatos salen de sus índices.
+        near = traces.near(x, y, self.radius, layers)
+        flat = [flatten(tr) for tr in near]
+        big = [tr for tr in flat if _long(tr)]
+        found = {id(tr) for tr, hit in zip(big, hits_at(big, x, y, self.radius)) if hit} if big else set()
+        hits = [(tr, f, cells_at(f, x, y, self.radius) if isinstance(f, CellTrace) else None)
+                for tr, f in zip(near, flat) if (id(f) in found if _long(f) else self._hits(f, x, y))]
+        return self._erase(traces, hits)
+
+    def erase_along(self, traces: TraceStore, path: list[int], layers: Optional[Collection[int]] = None) -> Change:
+        # Borra lo que toca la cápsula que barre el borrador entre posiciones consecutivas
+        # de path (x0, y0, x1, y1, ...), en una sola pasada por los candidatos. Así un
+        # arrastre rápido no deja huecos entre un evento y el siguiente.
+        if len(path) <= 2:
+            return self.erase_at(traces, path[0], path[1], layers)
+        segs = [(path[i], path[i + 1], path[i + 2], path[i + 3]) for i in range(0, len(path) - 2, 2)]
+        hits = []
+        for tr, near in traces.near_segments(segs, self.radius, layers):
+            f, mine = flatten(tr), [segs[k] for k in near]
+            if self._hits_sweep(f, mine):
+                hits.append((tr, f, cells_along(f, mine, self.radius) if isinstance(f, CellTrace) else None))
+        return self._erase(traces, hits)
+
+    def _erase(self, traces: TraceStore, hits: list[tuple[Trace, Trace, Optional[np.ndarray]]]) -> Change:
+        # hits: (trazo, trazo con la transformación aplicada, celdas tocadas si es de celdas).
+        # Un trazo de celdas pierde solo las celdas tocadas: se reemplaza por una copia con
+        # el resto (cells.trim_cells, ya con la transformación aplicada), así borrar una
+        # celda de un relleno no se lleva el relleno entero.
+        added, removed = [], []
+        for tr, flat, mask in hits:
+            if mask is None:
+                removed.append((traces.remove(tr), tr))
+                continue
+            if not mask.any():
+                continue
+            rest = array("i")
+            rest.frombytes(points(flat.coords)[~mask].astype(np.int32).tobytes())
+            old, trimmed = trim_cells(traces, traces.seq_of(tr), rest, flat.size)
+            removed.append(old)
+            if trimmed:
+                added.append(trimmed)
+        return Change(added=added, removed=removed)
+
+    def _hits_sweep(self, tr: Trace, segs: list[tuple[int, int, int, int]]) -> bool:
+        if _long(tr):
+            return hits_along(tr, segs, self.radius)
+        return any(self._hits_segment(tr, *seg) for seg in segs)
+
+    def _dist_segments(self, ax: float, ay: float, bx: float, by: float,
+                       cx: float, cy: float, dx: float, dy: float) -> float:
+        # Distancia entre los segmentos ab y cd: 0 si se cruzan, si no la menor de un
+        # extremo al otro segmento
+        d1 = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+        d2 = (bx - ax) * (dy - ay) - (by - ay) * (dx - ax)
+        d3 = (dx - cx) * (ay - cy) - (dy - cy) * (ax - cx)
+        d4 = (dx - cx) * (by - cy) - (dy - cy) * (bx - cx)
+        if ((d1 > 0 > d2) or (d1 < 0 < d2)) and ((d3 > 0 > d4) or (d3 < 0 < d4)):
+            return 0.0
+        return min(self._dist_point_to_segment(ax, ay, cx, cy, dx, dy),
+                   self._dist_point_to_segment(bx, by, cx, cy, dx, dy),
+                   self._dist_point_to_segment(cx, cy, ax, ay, bx, by),
+                   self._dist_point_to_segment(dx, dy, ax, ay, bx, by))
+
+    def _dist_segment_rect(self, ax: float, ay: float, bx: float, by: float,
+                           left: float, right: float, bottom: float, top: float) -> float:
+        # Distancia del segmento ab al rectángulo: 0 si lo atraviesa (recorte de
+        # Liang–Barsky), si no la menor entre extremos, esquinas y el segmento
+        t0, t1 = 0.0, 1.0
+        vx, vy = bx - ax, by - ay
+        for p, q in ((-vx, ax - left), (vx, right - ax), (-vy, ay - bottom), (vy, top - ay)):
+            if p == 0:
+                if q < 0:
+                    t0, t1 = 1.0, 0.0
+                    break
+            elif p < 0:
+                t0 = max(t0, q / p)
+            else:
+                t1 = min(t1, q / p)
+        if t0 <= t1:
+            return 0.0
+        ends = [((px - min(max(px, left), right)) ** 2 + (py - min(max(py, bottom), top)) ** 2) ** 0.5
+                for px, py in ((ax, ay), (bx, by))]
+        return min(*ends,
+                   self._dist_point_to_segment(left, bottom, ax, ay, bx, by),
+                   self._dist_point_to_segment(left, top, ax, ay, bx, by),
+                   self._dist_point_to_segment(right, bottom, ax, ay, bx, by),
+                   self._dist_point_to_segment(right, top, ax, ay, bx, by))
+
+    def _hits_segment(self, tr: Trace, ax: int, ay: int, bx: int, by: int) -> bool:
+        # Como _hits, para el borrador barrido de (ax, ay) a (bx, by)
+        t = tr.tool
+        r = self.radius
+        if t in ("PENCIL", "MARKER"):
+            c = tr.coords
+            reach = r + (tr.width or (1 if t == "PENCIL" else 8)) / 2
+            # Los tramos del trazo lejos de la caja del barrido se descartan sin medir
+            x0, x1 = min(ax, bx) - reach, max(ax, bx) + reach
+            y0, y1 = min(ay, by) - reach, max(ay, by) + reach
+            for i in range(0, len(c) - 2, 2):
+                cx, cy, dx, dy = c[i], c[i + 1], c[i + 2], c[i + 3]
+                if (cx < x0 and dx < x0) or (cx > x1 and dx > x1) or (cy < y0 and dy < y0) or (cy > y1 and dy > y1):
+                    continue
+                if self._dist_segments(ax, ay, bx, by, cx, cy, dx, dy) <= reach:
+                    return True
+            return False
+        if t == "SPRAY":
+            c = tr.coords
+            x0, x1, y0, y1 = min(ax, bx) - r, max(ax, bx) + r, min(ay, by) - r, max(ay, by) + r
+            return any(x0 <= c[i] <= x1 and y0 <= c[i + 1] <= y1
+                       and self._dist_point_to_segment(c[i], c[i + 1], ax, ay, bx, by) <= r for i in range(0, len(c), 2))
+        if t == "LINE":
+            return self._dist_segments(ax, ay, bx, by, tr.x1, tr.y1, tr.x2, tr.y2) <= r + tr.width / 2
+        if t == "RECT":
+            x1, y1, x2, y2 = tr.x1, tr.y1, tr.x2, tr.y2
+            left, right = min(x1, x2), max(x1, x2)
+            bottom, top = min(y1, y2), max(y1, y2)
+            w = tr.width
+            if self._dist_segment_rect(ax, ay, bx, by, left - w, right + w, bottom - w, top + w) > r:
+                return False
+            # La zona que toca el interior es convexa: el barrido sale de ella salvo que
+            # ambos extremos estén adentro
+            inner = (left + w, right - w, bottom + w, top - w)
+            return not (self._overlaps_rect(ax, ay, *inner) and self._overlaps_rect(bx, by, *inner))
+        if t == "CIRCLE":
+            cx, cy, ex, ey = tr.x1, tr.y1, tr.x2, tr.y2
+            rad = ((ex - cx) ** 2 + (ey - cy) ** 2) ** 0.5
+            reach = r + tr.width / 2
+            near = self._dist_point_to_segment(cx, cy, ax, ay, bx, by)
+            far = max(((ax - cx) ** 2 + (ay - cy) ** 2) ** 0.5, ((bx - cx) ** 2 + (by - cy) ** 2) ** 0.5)
+            return near <= rad + reach and far >= rad - reach
+        if t == "CELL":
+            c, s = tr.coords, tr.size
+            return any(self._dist_segment_rect(ax, ay, bx, by, c[i], c[i] + s, c[i + 1], c[i + 1] + s) <= r
+                       for i in range(0, len(c), 2))
+        return False
+
+    def draw_traces(self, traces: list[Trace]):
         return
 
+    def create_shapes(self, trace: Trace) -> list[Shape]:
+        return []
+
     def get_name(self) -> str:
         return self.name
 
@@ -147,13 +544,15 @@ class LineTool(Tool):
     def __init__(self, width: int = 2):
         self.width = width
 
-    def draw_traces(self, traces: list[dict]):
+    def draw_traces(self, traces: list[ShapeTrace]):
         for tr in traces:
-            if tr["tool"] == self.name:
-                (x1, y1) = tr["start"]
-                (x2, y2) = tr["end"]
-                w = tr.get("width", self.width)
-                arcade.draw_line(x1, y1, x2, y2, tr["color"], w)
+            if tr.tool == self.name:
+                arcade.draw_line(tr.x1, tr.y1, tr.x2, tr.y2, tr.color, tr.width)
+
+    def create_shapes(self, trace: ShapeTrace) -> list[Shape]:
+        if (trace.x1, trace.y1) == (trace.x2, trace.y2):
+            return []
+        return [shape_list.create_line(trace.x1, trace.y1, trace.x2, trace.y2, trace.color, trace.width)]
 
     def get_name(self) -> str:
         return self.name
@@ -165,17 +564,20 @@ class RectTool(Tool):
     def __init__(self, width: int = 2):
         self.width = width
 
-    def draw_traces(self, traces: list[dict]):
+    def draw_traces(self, traces: list[ShapeTrace]):
         for tr in traces:
-            if tr["tool"] == self.name:
-                (x1, y1) = tr["start"]
-                (x2, y2) = tr["end"]
-                left = min(x1, x2)
-                right = max(x1, x2)
-                bottom = min(y1, y2)
-                top = max(y1, y2)
-                w = tr.get("width", self.width)
-                arcade.draw_lrbt_rectangle_outline(left, right, bottom, top, tr["color"], w)
+            if tr.tool == self.name:
+                left = min(tr.x1, tr.x2)
+                right = max(tr.x1, tr.x2)
+                bottom = min(tr.y1, tr.y2)
+                top = max(tr.y1, tr.y2)
+                arcade.draw_lrbt_rectangle_outline(left, right, bottom, top, tr.color, tr.width)
+
+    def create_shapes(self, trace: ShapeTrace) -> list[Shape]:
+        cx = (trace.x1 + trace.x2) / 2
+        cy = (trace.y1 + trace.y2) / 2
+        w, h = abs(trace.x2 - trace.x1), abs(trace.y2 - trace.y1)
+        return [shape_list.create_rectangle_outline(cx, cy, w, h, trace.color, trace.width)]
 
     def get_name(self) -> str:
         return self.name
@@ -187,14 +589,19 @@ class CircleTool(Tool):
     def __init__(self, width: int = 2):
         self.width = width
 
-    def draw_traces(self, traces: list[dict]):
+    def draw_traces(self, traces: list[ShapeTrace]):
         for tr in traces:
-            if tr["tool"] == self.name:
-                (cx, cy) = tr["start"]
-                (ex, ey) = tr["end"]
-                r = int(((ex - cx) ** 2 + (ey - cy) ** 2) ** 0.5)
-                w = tr.get("width", self.width)
-                arcade.draw_circle_outline(cx, cy, r, tr["color"], w)
+            if tr.tool == self.name:
+                r = int(((tr.x2 - tr.x1) ** 2 + (tr.y2 - tr.y1) ** 2) ** 0.5)
+                arcade.draw_circle_outline(tr.x1, tr.y1, r, tr.color, tr.width)
+
+    def create_shapes(self, trace: ShapeTrace) -> list[Shape]:
+        r = int(((trace.x2 - trace.x1) ** 2 + (trace.y2 - trace.y1) ** 2) ** 0.5)
+        return [ring_shape(trace.x1, trace.y1, r, trace.width, trace.color)]
+
+    def lod_shapes(self, trace: ShapeTrace, step: int) -> list[Shape]:
+        r = int(((trace.x2 - trace.x1) ** 2 + (trace.y2 - trace.y1) ** 2) ** 0.5)
+        return [ring_shape(trace.x1, trace.y1, r, trace.width, trace.color, step)]
 
     def get_name(self) -> str:
         return self.name
@@ -203,21 +610,248 @@ class CircleTool(Tool):
 class CellTool(Tool):
     name = "CELL"
 
-    def __init__(self, cell: int = 20):
+    def __init__(self, cell: int = 20, fill: bool = False):
         self.cell = cell
+        # Modo cubeta: el clic rellena las celdas conectadas del mismo color (cells.flood_fill)
+        self.fill = fill
 
     def _snap(self, x: int, y: int) -> tuple[int, int]:
         gx = (x // self.cell) * self.cell
         gy = (y // self.cell) * self.cell
         return int(gx), int(gy)
 
-    def draw_traces(self, traces: list[dict]):
+    def draw_traces(self, traces: list[CellTrace]):
         for tr in traces:
-            if tr["tool"] == self.name:
-                (x, y) = tr["xy"]
-                s = tr["size"]
-                arcade.draw_lrbt_rectangle_filled(x, x + s, y, y + s, tr["color"])
-                arcade.draw_lrbt_rectangle_outline(x, x + s, y, y + s, arcade.color.DARK_SLATE_GRAY, 1)
+            if tr.tool == self.name:
+                s = tr.size
+                for x, y in tr.points():
+                    arcade.draw_lrbt_rectangle_filled(x, x + s, y, y + s, tr.color)
+                    arcade.draw_lrbt_rectangle_outline(x, x + s, y, y + s, CELL_BORDER, 1)
+
+    def create_shapes(self, trace: CellTrace) -> list[Shape]:
+        return [_cells_shape(trace.coords, trace.size, trace.color)]
+
+    def lod_shapes(self, trace: CellTrace, step: int) -> list[Shape]:
+        # Vista alejada: el borde de 1 unidad queda por debajo del píxel, solo los rellenos
+        return [_cells_shape(trace.coords, trace.size, trace.color, border=False)]
+
+    def get_name(self) -> str:
+        return self.name
+
+
+SELECT_COLOR = (30, 144, 255)
+# Lado de las manijas y distancia de la de rotación al borde de la caja, en píxeles
+HANDLE = 8
+ROTATE_GAP = 24
+
+
+class SelectTool(Tool):
+    # Selección con rectángulo (o lazo con Shift) y transformación de lo seleccionado:
+    # arrastrar dentro de la caja mueve, desde una esquina escala y desde la manija de
+    # arriba rota. Las coordenadas no se reescriben: al soltar cada trazo vuelve al
+    # TraceStore (en su misma secuencia) como una copia con la transformación compuesta
+    # (records.transformed), y la operación entra al historial como un solo cambio.
+    # Durante el arrastre los trazos salen del TraceStore y se dibujan desde un solo
+    # ShapeElementList armado al levantarlos: por cuadro solo cambia la matriz.
+    name = "SELECT"
+
+    def __init__(self):
+        self.selected: list[int] = []
+        # Banda de selección: dos esquinas, o los puntos del lazo, en el mundo
+        self.band: list[int] = []
+        self.lasso = False
+        # Transformación en curso: "move", "scale" o "rotate", desde grab y alrededor del
+        # centro de la caja box que tenía la selección al empezar
+        self.mode: Optional[str] = None
+        self.grab = (0, 0)
+        self.box: Optional[Box] = None
+        self.matrix: Affine = IDENTITY
+        self.lifted: list[tuple[int, Trace]] = []
+        self.shapes: Optional[ShapeElementList] = None
+        # Capas donde se puede elegir (None: todas)
+        self.layers: Optional[Collection[int]] = None
+
+    def bounds(self, traces: TraceStore) -> Optional[Box]:
+        # Caja de lo seleccionado que sigue en el dibujo (el borrador, deshacer o la
+        # colaboración pueden haber sacado algo)
+        boxes = traces.index.boxes
+        self.selected = [seq for seq in self.selected if traces.get(seq) is not None]
+        found = [boxes[seq] for seq in self.selected if seq in boxes]
+        if not found:
+            return None
+        return (min(b[0] for b in found), min(b[1] for b in found), max(b[2] for b in found), max(b[3] for b in found))
+
+    def handle_at(self, traces: TraceStore, x: int, y: int, zoom: float) -> Optional[str]:
+        box = self.bounds(traces)
+        if box is None:
+            return None
+        left, bottom, right, top = box
+        h = HANDLE / zoom
+        if abs(x - (left + right) / 2) <= h and abs(y - top - ROTATE_GAP / zoom) <= h:
+            return "rotate"
+        if any(abs(x - cx) <= h and abs(y - cy) <= h for cx in (left, right) for cy in (bottom, top)):
+            return "scale"
+        if left <= x <= right and bottom <= y <= top:
+            return "move"
+        return None
+
+    def press(self, traces: TraceStore, x: int, y: int, zoom: float, lasso: bool = False,
+              layers: Optional[Collection[int]] = None):
+        self.layers = layers
+        self.mode = self.handle_at(traces, x, y, zoom)
+        if self.mode is not None:
+            self.grab = (x, y)
+            self.box = self.bounds(traces)
+            self.matrix = IDENTITY
+            return
+        self.selected = []
+        self.band = [x, y]
+        self.lasso = lasso
+
+    def drag(self, traces: TraceStore, tools: dict, path: list[int]):
+        # path: posiciones del mundo de los arrastres de un cuadro
+        x, y = path[-2], path[-1]
+        if self.mode is None:
+            if self.band and self.lasso:
+                self.band += path
+            elif self.band:
+                self.band[2:] = [x, y]
+            return
+        if self.shapes is None:
+            self._lift(traces, tools)
+        left, bottom, right, top = self.box
+        cx, cy = (left + right) / 2, (bottom + top) / 2
+        gx, gy = self.grab
+        if self.mode == "move":
+            self.matrix = translation(x - gx, y - gy)
+        elif self.mode == "scale":
+            d0 = math.hypot(gx - cx, gy - cy)
+            self.matrix = around(cx, cy, max(0.05, math.hypot(x - cx, y - cy) / d0) if d0 else 1.0)
+        else:
+            self.matrix = around(cx, cy, 1.0, math.atan2(y - cy, x - cx) - math.atan2(gy - cy, gx - cx))
+
+    def _lift(self, traces: TraceStore, tools: dict):
+        # Saca lo seleccionado del TraceStore (las cachés dejan de dibujarlo) y lo compila
+        # una sola vez, en orden cronológico, con su geometría actual
+        self.lifted = [(seq, traces.remove_seq(seq)) for seq in sorted(self.selected)]
+        self.shapes = ShapeElementList()
+        for _seq, tr in self.lifted:
+            for sh in trace_shapes(tools, tr, 0):
+                self.shapes.append(sh)
+
+    def finish(self, traces: TraceStore) -> Optional[Change]:
+        # Al soltar: elige lo que encierra la banda o devuelve lo levantado con su nueva
+        # transformación. Devuelve el cambio para el historial, si lo hubo.
+        change = None
+        if self.lifted:
+            m = self.matrix
+            # Las celdas vuelven a la cuadrícula: se guardan ya aplicadas
+            new = [(seq, tr if m == IDENTITY else flatten(transformed(tr, m)) if isinstance(tr, CellTrace)
+                    else transformed(tr, m)) for seq, tr in self.lifted]
+            for seq, tr in new:
+                traces.insert_seq(seq, tr)
+            if m != IDENTITY:
+                change = Change(added=new, removed=self.lifted)
+        elif len(self.band) >= 4:
+            self.selected = self._inside_lasso(traces) if self.lasso else self._inside_box(traces)
+        self.band = []
+        self.mode = None
+        self.matrix = IDENTITY
+        self.lifted = []
+        self.shapes = None
+        return change
+
+    def _contained(self, traces: TraceStore, left: float, bottom: float, right: float, top: float) -> list[int]:
+        # Trazos cuya caja queda entera dentro del rectángulo, en orden cronológico
+        boxes = traces.index.boxes
+        return sorted(seq for seq in traces.query(left, bottom, right, top, self.layers)
+                      if left <= boxes[seq][0] and boxes[seq][2] <= right and bottom <= boxes[seq][1] and boxes[seq][3] <= top)
+
+    def _inside_box(self, traces: TraceStore) -> list[int]:
+        x0, y0, x1, y1 = self.band[:4]
+        return self._contained(traces, min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+
+    def _inside_lasso(self, traces: TraceStore) -> list[int]:
+        # Trazos con todos sus puntos dentro del lazo (las figuras, las esquinas de su caja),
+        # probados juntos con geometry.inside_polygon
+        if len(self.band) < 6:
+            return []
+        poly = np.array(self.band, dtype=np.float64).reshape(-1, 2)
+        left, bottom = poly.min(axis=0)
+        right, top = poly.max(axis=0)
+        boxes = traces.index.boxes
+        seqs = self._contained(traces, left, bottom, right, top)
+        if not seqs:
+            return []
+        parts = []
+        for seq in seqs:
+            tr = flatten(traces.get(seq))
+            if isinstance(tr, ShapeTrace):
+                l, b, r, t = boxes[seq]
+                parts.append(np.array([(l, b), (r, b), (r, t), (l, t)], dtype=np.float64))
+            else:
+                parts.append(points(tr.coords))
+        starts = np.cumsum([0] + [len(p) for p in parts[:-1]])
+        keep = np.logical_and.reduceat(inside_polygon(np.concatenate(parts), poly), starts)
+        return [seq for seq, k in zip(seqs, keep) if k]
+
+    def delete(self, traces: TraceStore) -> Optional[Change]:
+        self.bounds(traces)
+        if not self.selected:
+            return None
+        removed = [(seq, traces.remove_seq(seq)) for seq in self.selected]
+        self.selected = []
+        return Change(removed=removed)
+
+    def flatten_selection(self, traces: TraceStore) -> Optional[Change]:
+        # Aplica las transformaciones a las coordenadas: de lo seleccionado o, sin
+        # selección, de todo el dibujo
+        self.bounds(traces)
+        items = [(seq, traces.get(seq)) for seq in self.selected] if self.selected else list(traces.items())
+        old = [(seq, tr) for seq, tr in items if tr.transform is not None]
+        if not old:
+            return None
+        change = Change(added=[(seq, flatten(tr)) for seq, tr in old], removed=old)
+        change.apply(traces)
+        return change
+
+    def draw_overlay(self, traces: TraceStore, zoom: float):
+        # Con la cámara del lienzo: lo levantado con la matriz en curso, la caja con sus
+        # manijas y la banda o el lazo
+        if self.shapes is not None:
+            ctx = arcade.get_window().ctx
+            view = ctx.view_matrix
+            a, b, c, d, e, f = self.matrix
+            ctx.view_matrix = view @ Mat4(a, b, 0, 0, c, d, 0, 0, 0, 0, 1, 0, e, f, 0, 1)
+            self.shapes.draw()
+            ctx.view_matrix = view
+        line = 1 / zoom
+        if len(self.band) >= 4:
+            if self.lasso:
+                arcade.draw_line_strip(list(zip(self.band[0::2], self.band[1::2])), SELECT_COLOR, line)
+            else:
+                x0, y0, x1, y1 = self.band[:4]
+                arcade.draw_lrbt_rectangle_outline(min(x0, x1), max(x0, x1), min(y0, y1), max(y0, y1), SELECT_COLOR, line)
+        box = self.box if self.mode is not None else self.bounds(traces)
+        if box is None:
+            return
+        left, bottom, right, top = box
+        corners = [apply(self.matrix, x, y) for x, y in ((left, bottom), (right, bottom), (right, top), (left, top))]
+        arcade.draw_polygon_outline(corners, SELECT_COLOR, line)
+        if self.mode is not None:
+            return
+        h = HANDLE / zoom / 2
+        mid, rot = (left + right) / 2, top + ROTATE_GAP / zoom
+        arcade.draw_line(mid, top, mid, rot, SELECT_COLOR, line)
+        arcade.draw_circle_filled(mid, rot, h, SELECT_COLOR)
+        for cx, cy in corners:
+            arcade.draw_lrbt_rectangle_filled(cx - h, cx + h, cy - h, cy + h, SELECT_COLOR)
+
+    def draw_traces(self, traces: list[Trace]):
+        return
+
+    def create_shapes(self, trace: Trace) -> list[Shape]:
+        return []
 
     def get_name(self) -> str:
         return self.name
@@ -0,0 +1,71 @@
+import math
+from typing import Callable, Hashable, Optional
+import arcade
+from arcade import shape_list
+from arcade.shape_list import Shape, ShapeElementList
+from pyglet.graphics import Batch
+
+
+class RetainedShapes:
+    # Figuras fijas de la interfaz compiladas en un ShapeElementList. Solo se vuelven a
+    # armar cuando cambia la clave de estado (hover, activo, color, herramienta).
+    def __init__(self, build: Callable[[], list[Shape]]):
+        self.build = build
+        self.builds = 0
+        self._key: Hashable = None
+        self._shapes: Optional[ShapeElementList] = None
+
+    def draw(self, key: Hashable):
+        if self._shapes is None or key != self._key:
+            self._shapes = ShapeElementList()
+            for sh in self.build():
+                self._shapes.append(sh)
+            self._key = key
+            self.builds += 1
+        self._shapes.draw()
+
+
+class TextLayer:
+    # Etiquetas creadas una sola vez (arcade.Text) y dibujadas juntas con un lote de pyglet
+    def __init__(self):
+        self.batch = Batch()
+
+    def text(self, text: str, x: float, y: float, color, size: float) -> arcade.Text:
+        return arcade.Text(text, x, y, color, size, batch=self.batch)
+
+    def draw(self):
+        self.batch.draw()
+
+
+class GridLayer:
+    # Cuadrícula de guía del lienzo, en coordenadas del mundo. Las líneas que cubren la
+    # vista (más una celda) se arman una vez por tamaño de celda y zoom; al mover la vista
+    # solo se corre la lista de a celdas enteras. Con celdas de menos de MIN_PX píxeles en
+    # pantalla no se dibuja.
+    MIN_PX = 4
+
+    def __init__(self, width: int, height: int, color):
+        self.width = width
+        self.height = height
+        self.color = color
+        self._key: Hashable = None
+        self._shapes: Optional[ShapeElementList] = None
+
+    def draw(self, cell: int, view: Optional[tuple[float, float, float, float]] = None, zoom: float = 1.0):
+        if cell * zoom < self.MIN_PX:
+            return
+        cols = math.ceil(self.width / zoom / cell) + 1
+        rows = math.ceil(self.height / zoom / cell) + 1
+        key = (cell, cols, rows, zoom)
+        if key != self._key:
+            # Líneas de un píxel de pantalla
+            w = 1 / zoom
+            self._shapes = ShapeElementList()
+            for i in range(cols + 1):
+                self._shapes.append(shape_list.create_line(i * cell, 0, i * cell, rows * cell, self.color, w))
+            for j in range(rows + 1):
+                self._shapes.append(shape_list.create_line(0, j * cell, cols * cell, j * cell, self.color, w))
+            self._key = key
+        left, bottom = (view[0], view[1]) if view else (0, 0)
+        self._shapes.position = (left // cell * cell, bottom // cell * cell)
+        self._shapes.draw()
@@ -0,0 +1,68 @@
+import math
+import arcade
+from arcade.types import LBWH
+from spatial import Box
+
+ZOOM_MIN = 1 / 64
+ZOOM_MAX = 16
+ZOOM_STEP = 1.25
+# Niveles de detalle: el nivel k se usa con zoom <= 1 / 2**k
+LOD_MAX = 5
+
+
+class Viewport:
+    # Cámara del lienzo infinito. Los trazos guardan coordenadas del mundo; (ox, oy) es el
+    # punto del mundo en la esquina inferior izquierda del lienzo. ox * zoom y oy * zoom se
+    # mantienen enteros, así los bordes del mundo caen siempre en bordes de píxel (con zoom 1
+    # y sin mover la vista, mundo y pantalla coinciden como antes).
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.zoom = 1.0
+        self.ox = 0.0
+        self.oy = 0.0
+        self.camera = arcade.Camera2D(viewport=LBWH(0, 0, width, height))
+        self._update()
+
+    def _update(self):
+        z = self.zoom
+        self.ox = round(self.ox * z) / z
+        self.oy = round(self.oy * z) / z
+        self.camera.position = (self.ox + self.width / 2 / z, self.oy + self.height / 2 / z)
+        self.camera.zoom = z
+
+    def box(self) -> Box:
+        # Parte del mundo visible (left, bottom, right, top)
+        z = self.zoom
+        return (self.ox, self.oy, self.ox + self.width / z, self.oy + self.height / z)
+
+    def to_world(self, x: float, y: float) -> tuple[int, int]:
+        return int(math.floor(self.ox + x / self.zoom)), int(math.floor(self.oy + y / self.zoom))
+
+    def pan(self, dx: float, dy: float):
+        # Desplazamiento en píxeles de pantalla (arrastrar el lienzo)
+        self.ox -= dx / self.zoom
+        self.oy -= dy / self.zoom
+        self._update()
+
+    def zoom_at(self, x: float, y: float, factor: float):
+        # Zoom dejando fijo el punto del mundo bajo el cursor
+        z = min(ZOOM_MAX, max(ZOOM_MIN, self.zoom * factor))
+        wx, wy = self.ox + x / self.zoom, self.oy + y / self.zoom
+        self.zoom = z
+        self.ox, self.oy = wx - x / z, wy - y / z
+        self._update()
+
+    def reset(self):
+        self.zoom = 1.0
+        self.ox = self.oy = 0.0
+        self._update()
+
+    def level(self) -> int:
+        return lod_level(self.zoom)
+
+
+def lod_level(zoom: float) -> int:
+    if zoom >= 1:
+        return 0
+    return min(LOD_MAX, int(math.floor(-math.log2(zoom) + 1e-9)))